@@ -1,9 +1,8 @@
-import pyshark  # Importing PyShark to analyze network packets from pcap files
-import matplotlib.pyplot as plt  # Importing Matplotlib for plotting graphs
-from collections import defaultdict  # Importing defaultdict to store IP statistics
+from packet_engine import analyze_capture, get_pcap_files, IPStatsAnalyzer  # Importing the shared single-pass packet engine
+from parallel_runner import analyze_files  # Importing the runner that spreads files over CPU cores
+from sketches import SKETCH_ENABLED, IPStatsSketchAnalyzer  # Importing the fixed-memory sketch counters
 from ipaddress import ip_address, ip_network  # Importing IP address utilities
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
 
 
 
@@ -13,27 +12,16 @@ def is_ip_in_range(ip, range):
 
 
 # Function to analyze a pcapng file and extract IP header statistics
-def analyze_pcap(pcap_file):
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False)  # Load the pcap file without storing packets in memory
-    ip_stats = defaultdict(int)  # Dictionary to store IP occurrences
-
-    for packet in cap:
-        try:
-            if 'IP' in packet:  # Check if the packet contains an IP layer
-                ip_src = packet.ip.src  # Extract source IP address
-                ip_dst = packet.ip.dst  # Extract destination IP address
-                ip_stats[ip_src] += 1  # Increment occurrence count for source IP
-                ip_stats[ip_dst] += 1  # Increment occurrence count for destination IP
-        except Exception as e:
-            continue  # Ignore errors and move to the next packet
-
-    cap.close()  # Close the pcap file to free resources
-
+# (with sketch=True, only the estimated counts of the most frequent IPs are kept, in fixed memory)
+def analyze_pcap(pcap_file, backend=None, sketch=SKETCH_ENABLED):
+    analyzer = IPStatsSketchAnalyzer() if sketch else IPStatsAnalyzer()
+    ip_stats = analyze_capture(pcap_file, [analyzer], backend)[0]  # Read the file once and count IP occurrences
     return ip_stats  # Return dictionary containing IP statistics
 
 
 # Function to plot IP statistics for a specific file
 def plot_ip_stats_for_file(ip_stats, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
     # Limit the number of IPs shown to avoid overcrowding the x-axis
     sorted_ips = sorted(ip_stats.items(), key=lambda x: x[1], reverse=True)[:10]  # Show top 10 IPs
     ips, counts = zip(*sorted_ips)  # Separate IP addresses and packet counts
@@ -52,17 +40,18 @@ def plot_ip_stats_for_file(ip_stats, pcap_file):
     plt.show()  # Display the plot
 
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
-
 # Directory containing PCAPNG files
 PCAP_DIR = 'pcapng_files'
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
 
-# Loop through each pcap file, analyze and plot the IP statistics
-for pcap_file in pcap_files:
-    ip_stats = analyze_pcap(pcap_file)  # Analyze network packets in the file
-    plot_ip_stats_for_file(ip_stats, pcap_file)  # Generate a plot for each file
+    # Loop through each pcap file, analyze and plot the IP statistics
+    analyzer_class = IPStatsSketchAnalyzer if SKETCH_ENABLED else IPStatsAnalyzer  # Exact or sketch counters
+    all_ip_stats = [analyzers[0].result() for analyzers in analyze_files(pcap_files, [analyzer_class])]  # Analyze files (and chunks of large files) in parallel
+    for pcap_file, ip_stats in zip(pcap_files, all_ip_stats):
+        plot_ip_stats_for_file(ip_stats, pcap_file)  # Generate a plot for each file
@@ -1,34 +1,20 @@
-import pyshark  # Importing PyShark for network packet capture analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for data visualization
-from collections import defaultdict  # Importing defaultdict to store TCP port statistics
+from packet_engine import analyze_capture, get_pcap_files, TCPPortAnalyzer  # Importing the shared single-pass packet engine
+from parallel_runner import analyze_files  # Importing the runner that spreads files over CPU cores
+from sketches import SKETCH_ENABLED, TCPPortSketchAnalyzer  # Importing the fixed-memory sketch counters
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
 
 
 # Function to analyze a pcapng file and extract TCP port statistics
-def analyze_tcp_pcap(pcap_file):
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False)  # Open the pcap file without storing packets in memory
-    tcp_stats = defaultdict(int)  # Dictionary to count occurrences of each TCP port
-
-    for packet in cap:
-        try:
-            if 'TCP' in packet:  # Ensure the packet contains a TCP layer
-                # Extract source and destination TCP ports
-                tcp_src_port = packet.tcp.srcport  # Source port
-                tcp_dst_port = packet.tcp.dstport  # Destination port
-
-                # Increment occurrence count for source and destination ports
-                tcp_stats[tcp_src_port] += 1
-                tcp_stats[tcp_dst_port] += 1
-        except Exception as e:
-            continue  # Ignore errors and proceed to the next packet
-
-    cap.close()  # Close the pcap file to release resources
+# (with sketch=True, only the estimated counts of the most frequent ports are kept, in fixed memory)
+def analyze_tcp_pcap(pcap_file, backend=None, sketch=SKETCH_ENABLED):
+    analyzer = TCPPortSketchAnalyzer() if sketch else TCPPortAnalyzer()
+    tcp_stats = analyze_capture(pcap_file, [analyzer], backend)[0]  # Read the file once and count TCP port occurrences
     return tcp_stats  # Return dictionary containing TCP port statistics
 
 
 # Function to plot TCP port statistics for a specific pcap file
 def plot_tcp_stats_for_file(tcp_stats, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
     # Limit the number of ports shown to avoid overcrowding the x-axis
     sorted_ports = sorted(tcp_stats.items(), key=lambda x: x[1], reverse=True)[:10]  # Show top 10 TCP ports
     ports, counts = zip(*sorted_ports)  # Unpack ports and packet counts
@@ -47,17 +33,18 @@ def plot_tcp_stats_for_file(tcp_stats, pcap_file):
     plt.show()  # Display the plot
 
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
-
 # Directory containing PCAPNG files
 PCAP_DIR = 'pcapng_files'
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
 
-# Loop through each pcap file, analyze and plot the TCP statistics
-for pcap_file in pcap_files:
-    tcp_stats = analyze_tcp_pcap(pcap_file)  # Analyze network packets in the file
-    plot_tcp_stats_for_file(tcp_stats, pcap_file)  # Generate a plot for each file
+    # Loop through each pcap file, analyze and plot the TCP statistics
+    analyzer_class = TCPPortSketchAnalyzer if SKETCH_ENABLED else TCPPortAnalyzer  # Exact or sketch counters
+    all_tcp_stats = [analyzers[0].result() for analyzers in analyze_files(pcap_files, [analyzer_class])]  # Analyze files (and chunks of large files) in parallel
+    for pcap_file, tcp_stats in zip(pcap_files, all_tcp_stats):
+        plot_tcp_stats_for_file(tcp_stats, pcap_file)  # Generate a plot for each file
@@ -1,31 +1,19 @@
-import pyshark  # Importing PyShark for network packet capture analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for data visualization
-from collections import defaultdict  # Importing defaultdict to store TLS version statistics
+from packet_engine import analyze_capture, get_pcap_files, TLSVersionAnalyzer  # Importing the shared single-pass packet engine
+from parallel_runner import map_files  # Importing the runner that spreads files over CPU cores
+from tls_sessions import analyze_tls_sessions, find_keylog_files, format_session_table  # Importing the keylog-aware TLS session analysis
+from accumulators import format_percentile_table  # Importing the percentile table formatting
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
 
 
 # Function to analyze a pcapng file and extract TLS version statistics
 def analyze_tls_pcap(pcap_file):
-    cap = pyshark.FileCapture(pcap_file, display_filter='tls', keep_packets=False)  # Open pcap file and filter TLS packets
-    tls_stats = defaultdict(int)  # Dictionary to count occurrences of each TLS version
-
-    for packet in cap:
-        try:
-            if 'TLS' in packet:  # Ensure the packet contains a TLS layer
-                # Check if the packet has a TLS record version
-                if hasattr(packet.tls, 'record_version'):
-                    tls_version = packet.tls.record_version  # Extract the TLS version
-                    tls_stats[tls_version] += 1  # Increment count for the TLS version
-        except Exception as e:
-            continue  # Ignore errors and proceed to the next packet
-
-    cap.close()  # Close the pcap file to release resources
+    tls_stats = analyze_capture(pcap_file, [TLSVersionAnalyzer()])[0]  # Read the file once and count TLS versions
     return tls_stats  # Return dictionary containing TLS version statistics
 
 
 # Function to plot TLS version statistics for a specific pcap file
 def plot_tls_stats_for_file(tls_stats, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
     # Check if we have any TLS data to plot
     if not tls_stats:
         print(f"No TLS data found in {os.path.basename(pcap_file)}")  # Print message if no TLS packets were detected
@@ -49,17 +37,50 @@ def plot_tls_stats_for_file(tls_stats, pcap_file):
     plt.show()  # Display the plot
 
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
+# Function to plot the distribution (CDF) of the TLS latencies of the connections of a pcap file
+def plot_tls_latencies(sessions, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    latencies = {
+        'ClientHello → ServerHello': 'server_hello_latency',
+        'ClientHello → client Finished': 'handshake_latency',
+        'ClientHello → first server application data': 'server_data_latency',
+    }
+    plt.figure(figsize=(12, 6))  # Set figure size for better readability
+    for label, field in latencies.items():
+        values = sorted(session[field] * 1000 for session in sessions if session[field] is not None)
+        if values:
+            fractions = [(index + 1) / len(values) for index in range(len(values))]
+            plt.step(values, fractions, where='post', label=label)  # Empirical CDF of the latency
+    if not plt.gca().lines:
+        plt.close()
+        print(f"No TLS handshakes found in {os.path.basename(pcap_file)}")  # Print message if no handshake was seen
+        return
+    plt.xlabel('Latency (ms)')  # Label for x-axis
+    plt.ylabel('Fraction of Connections')  # Label for y-axis
+    plt.title(f'TLS Handshake Latencies for {os.path.basename(pcap_file)}')  # Set title
+    plt.legend()
+    plt.grid(True, linestyle='--', alpha=0.5)
+    plt.tight_layout()  # Adjust layout to prevent overlapping labels
+    plt.show()  # Display the plot
+
 
 # Directory containing PCAPNG files
 PCAP_DIR = 'pcapng_files'
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
 
-# Loop through each pcap file, analyze and plot the TLS version statistics
-for pcap_file in pcap_files:
-    tls_stats = analyze_tls_pcap(pcap_file)  # Analyze network packets in the file
-    plot_tls_stats_for_file(tls_stats, pcap_file)  # Generate a plot for each file
+    # Follow the TLS connections of every file in one pass, decrypting the records whose secrets are in the key logs.
+    # The same pass counts the packets per TLS record version, so no tshark dissection is needed.
+    keylog_files = find_keylog_files()
+    all_sessions = map_files(analyze_tls_sessions, pcap_files, None, keylog_files)  # One worker per CPU core
+    for pcap_file, (sessions, record_sizes, record_versions) in zip(pcap_files, all_sessions):
+        plot_tls_stats_for_file(record_versions, pcap_file)  # Generate a plot for each file
+        print(f"\nTLS connections of {os.path.basename(pcap_file)}")
+        print(format_session_table(sessions))
+        print(format_percentile_table("Application record sizes", record_sizes.percentiles(), ' B'))
+        plot_tls_latencies(sessions, pcap_file)  # Plot the handshake latencies of the connections
@@ -1,38 +1,18 @@
-import pyshark  # Importing PyShark for network packet capture analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for data visualization
+from packet_engine import analyze_capture, get_pcap_files, AveragePacketSizeAnalyzer  # Importing the shared single-pass packet engine
+from parallel_runner import analyze_files  # Importing the runner that spreads files over CPU cores
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
 
 
 # Function to analyze a PCAP file and calculate the average packet size
-def analyze_average_packet_size(pcap_file):
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False)  # Open pcap file without storing packets in memory
-    total_size = 0  # Total size of all packets
-    packet_count = 0  # Total number of packets
-
-    for packet in cap:
-        try:
-            if 'IP' in packet:  # Ensure packet contains an IP layer
-                packet_size = int(packet.length)  # Extract packet size in bytes
-                total_size += packet_size  # Add packet size to total
-                packet_count += 1  # Increment packet count
-        except Exception as e:
-            continue  # Ignore errors and proceed to the next packet
-
-    cap.close()  # Close the pcap file to free resources
-
-    # Calculate the average packet size
-    if packet_count > 0:
-        average_size = total_size / packet_count  # Compute average size
-    else:
-        average_size = 0  # Default to 0 if no packets are present
-
+def analyze_average_packet_size(pcap_file, backend=None):
+    average_size = analyze_capture(pcap_file, [AveragePacketSizeAnalyzer()], backend)[0]  # Read the file once and compute the average packet size
     return average_size  # Return the computed average size
 
 
 
 # Function to plot a bar chart of the average packet size per PCAP file
 def plot_average_packet_size(average_sizes, pcap_files):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
     # Extract only the file names from the full paths
     file_names = [os.path.basename(file) for file in pcap_files]
     # Create a bar chart to visualize average packet size per file
@@ -54,21 +34,18 @@ def plot_average_packet_size(average_sizes, pcap_files):
 
 
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
-
 # Directory containing PCAPNG files
 PCAP_DIR = 'pcapng_files'
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
 
-# Compute the average packet size for each PCAP file
-average_sizes = []
-for pcap_file in pcap_files:
-    average_size = analyze_average_packet_size(pcap_file)  # Analyze packet size
-    average_sizes.append(average_size)  # Store the computed average
+    # Compute the average packet size for each PCAP file
+    average_sizes = [analyzers[0].result() for analyzers in analyze_files(pcap_files, [AveragePacketSizeAnalyzer])]  # Analyze files (and chunks of large files) in parallel
 
-# Display the plot
-plot_average_packet_size(average_sizes, pcap_files)  # Generate the plot
+    # Display the plot
+    plot_average_packet_size(average_sizes, pcap_files)  # Generate the plot
@@ -1,34 +1,18 @@
-import pyshark  # Importing PyShark for network packet capture analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for data visualization
+from packet_engine import analyze_capture, get_pcap_files, InterArrivalAnalyzer  # Importing the shared single-pass packet engine
+from parallel_runner import analyze_files  # Importing the runner that spreads files over CPU cores
+from accumulators import InterArrivalHistogramAnalyzer, format_percentile_table  # Importing the fixed-memory accumulators
+from packet_sampling import SAMPLING_REPORTS, inter_arrival_warning  # Importing the sampling reports of the analyzed files
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
 
 # Function to calculate inter-arrival times between packets
-def analyze_inter_arrival_times(pcap_file):
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False)  # Open pcap file without storing packets in memory
-    inter_arrival_times = []  # List to store inter-arrival times between packets
-
-    previous_timestamp = None  # Variable to store the timestamp of the previous packet
-
-    for packet in cap:
-        try:
-            timestamp = float(packet.sniff_time.timestamp())  # Extract arrival time of the packet
-
-            if previous_timestamp is not None:
-                inter_arrival_time = timestamp - previous_timestamp  # Compute time difference
-                inter_arrival_times.append(inter_arrival_time)  # Store the inter-arrival time
-
-            previous_timestamp = timestamp  # Update the last packet timestamp
-
-        except AttributeError:
-            continue  # Ignore packets with missing attributes and proceed
-
-    cap.close()  # Close the pcap file to release resources
+def analyze_inter_arrival_times(pcap_file, backend=None):
+    inter_arrival_times = analyze_capture(pcap_file, [InterArrivalAnalyzer()], backend)[0]  # Read the file once and collect inter-arrival times
     return inter_arrival_times  # Return the list of inter-arrival times
 
 
 # Function to plot a histogram of inter-arrival times with count labels
 def plot_inter_arrival_times(inter_arrival_times, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
     plt.figure(figsize=(12, 6))  # Set figure size for better readability
 
     # Create a histogram for inter-arrival times
@@ -48,18 +32,56 @@ def plot_inter_arrival_times(inter_arrival_times, pcap_file):
     plt.show()  # Display the plot
 
 
+# Function to compute the inter-arrival time distribution (histogram and percentiles) without keeping every value
+def analyze_inter_arrival_distribution(pcap_file, backend=None):
+    return analyze_capture(pcap_file, [InterArrivalHistogramAnalyzer()], backend)[0]  # Read the file once
+
+
+# Function to plot the logarithmic histogram of an inter-arrival time distribution with count labels.
+# The sampling report of the file (by default the one of its last analysis) adds a warning to the title
+# when the gaps come from 1-in-N packet sampling.
+def plot_inter_arrival_distribution(distribution, pcap_file, sampling_report=None):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    buckets = distribution.histogram.buckets()  # (lower edge, upper edge, count) of every non-empty bucket
+    plt.figure(figsize=(12, 6))  # Set figure size for better readability
+
+    # Create a histogram from the bucket counts (bucket widths grow with the time, so the x-axis is logarithmic)
+    plt.bar([low for low, _, _ in buckets], [count for _, _, count in buckets],
+            width=[high - low for low, high, _ in buckets], align='edge', alpha=0.7, color='blue', edgecolor='black')
+    plt.xscale('log')
+
+    # Add count labels above each bar in the histogram
+    for low, high, count in buckets:
+        plt.text((low * high) ** 0.5, count, f'{int(count)}',
+                 ha='center', va='bottom', fontsize=8, color='black', fontweight='bold')
+
+    # Times outside the histogram range (such as packets captured in the same microsecond) have no bar
+    under, over = distribution.histogram.counts[0], distribution.histogram.counts[-1]
+    if under or over:
+        plt.text(0.99, 0.97, f'{under} below {distribution.histogram.min_value:g} s, {over} above {distribution.histogram.max_value:g} s',
+                 transform=plt.gca().transAxes, ha='right', va='top')
+
+    plt.xlabel('Inter-Arrival Time (Seconds)')  # Label for x-axis
+    plt.ylabel('Frequency')  # Label for y-axis
+    title = f'Inter-Arrival Time Distribution for {os.path.basename(pcap_file)}'
+    warning = inter_arrival_warning(sampling_report or SAMPLING_REPORTS.get(pcap_file))
+    plt.title(f'{title}\n({warning})' if warning else title, color='darkred' if warning else 'black')  # Set title
+    plt.grid(axis='y', linestyle='--', alpha=0.7)  # Add grid for better readability
+    plt.show()  # Display the plot
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
 
 # Directory containing PCAPNG files
 PCAP_DIR = 'pcapng_files'
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
 
-# For each PCAP file, compute and plot inter-arrival times
-for pcap_file in pcap_files:
-    inter_arrival_times = analyze_inter_arrival_times(pcap_file)  # Analyze inter-arrival times
-    plot_inter_arrival_times(inter_arrival_times, pcap_file)  # Generate a plot for each file
+    # For each PCAP file, compute and plot the inter-arrival time distribution
+    all_distributions = [analyzers[0].result() for analyzers in analyze_files(pcap_files, [InterArrivalHistogramAnalyzer])]  # Analyze files (and chunks of large files) in parallel
+    for pcap_file, distribution in zip(pcap_files, all_distributions):
+        print(format_percentile_table(f'Inter-arrival times of {os.path.basename(pcap_file)}', distribution.percentiles(), ' s'))
+        plot_inter_arrival_distribution(distribution, pcap_file)  # Generate a plot for each file
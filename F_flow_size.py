@@ -1,27 +1,18 @@
-import pyshark  # Importing PyShark for network packet capture analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for data visualization
+from packet_engine import analyze_capture, get_pcap_files, PacketSizeDistributionAnalyzer  # Importing the shared single-pass packet engine
+from parallel_runner import analyze_files  # Importing the runner that spreads files over CPU cores
+from flow_table import FlowTableAnalyzer  # Importing the 5-tuple flow table
+from accumulators import PacketSizeHistogramAnalyzer, format_percentile_table  # Importing the fixed-memory accumulators
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
 
 # Function to analyze a PCAP file and extract packet size distribution
-def analyze_packet_size_distribution(pcap_file):
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False)  # Open pcap file without storing packets in memory
-    packet_sizes = []  # List to store packet sizes
-
-    for packet in cap:
-        try:
-            if 'IP' in packet:  # Ensure packet contains an IP layer
-                # Append the packet size to the list
-                packet_sizes.append(int(packet.length))
-        except AttributeError:
-            continue  # Ignore packets with missing attributes and proceed
-
-    cap.close()  # Close the pcap file to release resources
+def analyze_packet_size_distribution(pcap_file, backend=None):
+    packet_sizes = analyze_capture(pcap_file, [PacketSizeDistributionAnalyzer()], backend)[0]  # Read the file once and collect packet sizes
     return packet_sizes  # Return the list of packet sizes
 
 
 # Function to plot a histogram of packet size distribution
 def plot_packet_size_distribution(packet_sizes, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
     # Create a histogram for packet sizes
     plt.figure(figsize=(12, 6))  # Set figure size for better readability
     plt.hist(packet_sizes, bins=50, color='blue', edgecolor='black')  # Create histogram
@@ -32,19 +23,57 @@ def plot_packet_size_distribution(packet_sizes, pcap_file):
     plt.show()  # Display the plot
 
 
+# Function to count the packet sizes of a PCAP file without keeping every value
+def analyze_packet_size_counts(pcap_file, backend=None):
+    return analyze_capture(pcap_file, [PacketSizeHistogramAnalyzer()], backend)[0]  # Read the file once
+
+
+# Function to plot the packet size distribution from its counts (the same histogram as from the list of sizes)
+def plot_packet_size_counts(distribution, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    sizes, counts = distribution.values_and_counts()
+    plt.figure(figsize=(12, 6))  # Set figure size for better readability
+    plt.hist(sizes, bins=50, weights=counts, color='blue', edgecolor='black')  # Every size is weighted by its count
+    plt.xlabel('Packet Size (Bytes)')  # Label for x-axis
+    plt.ylabel('Frequency')  # Label for y-axis
+    plt.title(f'Packet Size Distribution for {os.path.basename(pcap_file)}')  # Set title
+    plt.tight_layout()  # Adjust layout to avoid overlapping labels
+    plt.show()  # Display the plot
+
+
+# Function to analyze a PCAP file and extract the size (number of packets) of every flow
+def analyze_flow_sizes(pcap_file, backend=None):
+    flows = analyze_capture(pcap_file, [FlowTableAnalyzer()], backend)[0]  # Build the bidirectional 5-tuple flow table
+    return list(flows.packets)  # Return the number of packets of every flow
+
+
+# Function to plot a histogram of the flow sizes
+def plot_flow_size_distribution(flow_sizes, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    plt.figure(figsize=(12, 6))  # Set figure size for better readability
+    plt.hist(flow_sizes, bins=50, color='orange', edgecolor='black')  # Create histogram
+    plt.yscale('log')  # Most flows are small, a few are very large
+    plt.xlabel('Flow Size (Packets per Flow)')  # Label for x-axis
+    plt.ylabel('Number of Flows')  # Label for y-axis
+    plt.title(f'Flow Size Distribution for {os.path.basename(pcap_file)}')  # Set title
+    plt.tight_layout()  # Adjust layout to avoid overlapping labels
+    plt.show()  # Display the plot
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
 
 # Directory containing PCAPNG files
 PCAP_DIR = 'pcapng_files'
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
 
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
 
-# For each PCAP file, analyze and plot the packet size distribution
-for pcap_file in pcap_files:
-    packet_sizes = analyze_packet_size_distribution(pcap_file)  # Analyze packet sizes
-    plot_packet_size_distribution(packet_sizes, pcap_file)  # Generate a plot for each file
+    # For each PCAP file, analyze and plot the packet size and flow size distributions
+    all_analyzers = analyze_files(pcap_files, [PacketSizeHistogramAnalyzer, FlowTableAnalyzer])  # Analyze files in parallel
+    for pcap_file, (size_analyzer, flow_analyzer) in zip(pcap_files, all_analyzers):
+        size_counts = size_analyzer.result()
+        print(format_percentile_table(f'Packet sizes of {os.path.basename(pcap_file)}', size_counts.percentiles(), ' B'))
+        plot_packet_size_counts(size_counts, pcap_file)  # Generate a plot for each file
+        plot_flow_size_distribution(list(flow_analyzer.result().packets), pcap_file)  # Packets per flow
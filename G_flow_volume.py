@@ -1,26 +1,17 @@
-import pyshark  # Importing PyShark for network packet capture analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for data visualization
+from packet_engine import analyze_capture, get_pcap_files, FlowVolumeAnalyzer  # Importing the shared single-pass packet engine
+from parallel_runner import analyze_files  # Importing the runner that spreads files over CPU cores
+from flow_table import FlowTableAnalyzer  # Importing the 5-tuple flow table
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
 
 # Function to calculate the total bytes transmitted in a PCAP file
-def analyze_flow_volume(pcap_file):
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False)  # Open pcap file without storing packets in memory
-    total_bytes = 0  # Variable to store total bytes transmitted
-
-    for packet in cap:
-        try:
-            if 'IP' in packet:  # Ensure the packet contains an IP layer
-                total_bytes += int(packet.length)  # Add packet size to total volume
-        except AttributeError:
-            continue  # Ignore packets with missing attributes and proceed
-
-    cap.close()  # Close the pcap file to release resources
+def analyze_flow_volume(pcap_file, backend=None):
+    total_bytes = analyze_capture(pcap_file, [FlowVolumeAnalyzer()], backend)[0]  # Read the file once and sum the transmitted bytes
     return total_bytes  # Return total transmitted bytes
 
 
 # Function to plot a bar chart for Flow Volume (total bytes transmitted per PCAP file)
 def plot_flow_volume(flow_volumes, pcap_files):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
     # Extract only the file names from the full paths
     file_names = [os.path.basename(file) for file in pcap_files]
     plt.figure(figsize=(12, 6))  # Set figure size for better readability
@@ -39,18 +30,42 @@ def plot_flow_volume(flow_volumes, pcap_files):
     plt.show()  # Display the plot
 
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
+# Function to analyze a PCAP file and extract the volume (number of bytes) of every flow
+def analyze_flow_volumes(pcap_file, backend=None):
+    flows = analyze_capture(pcap_file, [FlowTableAnalyzer()], backend)[0]  # Build the bidirectional 5-tuple flow table
+    return list(flows.bytes)  # Return the number of bytes of every flow
+
+
+# Function to plot a histogram of the flow volumes of a PCAP file
+def plot_flow_volume_distribution(flow_volumes, pcap_file):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    plt.figure(figsize=(12, 6))  # Set figure size for better readability
+    plt.hist(flow_volumes, bins=50, color='purple', edgecolor='black')  # Create histogram
+    plt.yscale('log')  # Most flows are small, a few are very large
+    plt.xlabel('Flow Volume (Bytes per Flow)')  # Label for x-axis
+    plt.ylabel('Number of Flows')  # Label for y-axis
+    plt.title(f'Flow Volume Distribution for {os.path.basename(pcap_file)}')  # Set title
+    plt.tight_layout()  # Adjust layout to avoid overlapping labels
+    plt.show()  # Display the plot
+
 
 # Directory containing PCAPNG files
 PCAP_DIR = 'pcapng_files'
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
+
+    # Compute total bytes transmitted and the per-flow volumes for each PCAP file
+    all_analyzers = analyze_files(pcap_files, [FlowVolumeAnalyzer, FlowTableAnalyzer])  # Analyze files in parallel
+    flow_volumes = [volume_analyzer.result() for volume_analyzer, _ in all_analyzers]
 
-# Compute total bytes transmitted for each PCAP file
-flow_volumes = [analyze_flow_volume(pcap_file) for pcap_file in pcap_files]
+    # Display the Flow Volume plot
+    plot_flow_volume(flow_volumes, pcap_files)
 
-# Display the Flow Volume plot
-plot_flow_volume(flow_volumes, pcap_files)
+    # Display the distribution of bytes per flow for each file
+    for pcap_file, (_, flow_analyzer) in zip(pcap_files, all_analyzers):
+        plot_flow_volume_distribution(list(flow_analyzer.result().bytes), pcap_file)
@@ -0,0 +1,280 @@
+import math  # Import math for the logarithmic bucket indexes
+from array import array  # Import array to store the bucket counts in fixed-size typed buffers
+
+
+# Default ranges and accuracies of the accumulators
+MIN_TIME = 1e-6  # Inter-arrival times below one microsecond (including 0) go to the underflow bucket
+MAX_TIME = 1e4  # Inter-arrival times from this many seconds go to the overflow bucket
+BINS_PER_DECADE = 10  # Logarithmic histogram resolution
+RELATIVE_ACCURACY = 0.01  # DDSketch quantiles are within 1% of the true value
+MAX_SKETCH_BINS = 2048  # Upper bound of DDSketch buckets (the lowest buckets are folded beyond it)
+MAX_PACKET_SIZE = 65535  # Sizes up to this value are counted in a flat array
+
+# Percentiles shown in the percentile tables
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+
+
+# Class to count values in logarithmic buckets (BINS_PER_DECADE buckets per power of ten),
+# plus an underflow bucket for values below min_value and an overflow bucket for values from max_value
+class LogHistogram:
+    def __init__(self, min_value=MIN_TIME, max_value=MAX_TIME, bins_per_decade=BINS_PER_DECADE):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.bins_per_decade = bins_per_decade
+        self.bins = math.ceil(math.log10(max_value / min_value) * bins_per_decade)
+        self.counts = array('Q', bytes(8 * (self.bins + 2)))  # [underflow, bucket 1..bins, overflow]
+
+    def add(self, value):
+        if value < self.min_value:
+            self.counts[0] += 1
+        elif value >= self.max_value:
+            self.counts[-1] += 1
+        else:
+            index = int(math.log10(value / self.min_value) * self.bins_per_decade)
+            self.counts[1 + min(index, self.bins - 1)] += 1
+
+    # Function to get the bucket edges (bins + 1 values from min_value to max_value)
+    def edges(self):
+        return [self.min_value * 10 ** (index / self.bins_per_decade) for index in range(self.bins)] + [self.max_value]
+
+    # Function to get (lower edge, upper edge, count) of every non-empty bucket, without the under/overflow
+    def buckets(self):
+        edges = self.edges()
+        return [(edges[index], edges[index + 1], count) for index, count in enumerate(self.counts[1:-1]) if count]
+
+    def merge(self, other):
+        if (self.min_value, self.max_value, self.bins_per_decade) != (other.min_value, other.max_value, other.bins_per_decade):
+            raise ValueError("Cannot merge histograms with different buckets")
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+
+
+# Class to estimate quantiles with DDSketch: values are counted in buckets whose bounds grow by a factor gamma,
+# so every quantile is within relative_accuracy of the true value, whatever the distribution
+class DDSketch:
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, max_bins=MAX_SKETCH_BINS):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.positive = {}  # Bucket index -> count, for positive values
+        self.negative = {}  # Bucket index of -value -> count, for negative values (out-of-order packets)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value == 0:
+            self.zero_count += 1
+            return
+        store = self.positive if value > 0 else self.negative
+        index = math.ceil(math.log(abs(value)) / self.log_gamma)
+        store[index] = store.get(index, 0) + 1
+        if len(store) > self.max_bins:
+            self.collapse(store)
+
+    # Fold the bucket of the smallest magnitudes into the next one, to keep the number of buckets bounded
+    def collapse(self, store):
+        lowest, second = sorted(store)[:2]
+        store[second] += store.pop(lowest)
+
+    # Function to get the value represented by a bucket
+    def bucket_value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    # Function to estimate the q-quantile (0 <= q <= 1)
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):  # Most negative values first
+            seen += self.negative[index]
+            if seen > rank:
+                return -self.bucket_value(index)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self.bucket_value(index)
+        return self.bucket_value(max(self.positive))
+
+    def merge(self, other):
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in other_store.items():
+                store[index] = store.get(index, 0) + count
+            while len(store) > self.max_bins:
+                self.collapse(store)
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+
+# Class to accumulate time values (such as inter-arrival times) in fixed memory:
+# a logarithmic histogram for plots and a DDSketch for percentiles
+class TimeDistribution:
+    def __init__(self):
+        self.histogram = LogHistogram()
+        self.quantiles = DDSketch()
+        self.count = 0
+        self.total = 0.0  # Sum of all values, for the mean
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        self.histogram.add(value)
+        self.quantiles.add(value)
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    # Function to get (percentile, estimated value) pairs
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        return [(percentile, self.quantiles.quantile(percentile / 100)) for percentile in percentiles]
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.quantiles.merge(other.quantiles)
+        self.count += other.count
+        self.total += other.total
+        for value in (other.minimum, other.maximum):
+            if value is not None:
+                self.minimum = value if self.minimum is None else min(self.minimum, value)
+                self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+
+# Class to count packet sizes exactly in fixed memory: one counter per size from 0 to 65535
+# (larger sizes, which only appear with segmentation offload, are counted in a small dictionary)
+class SizeDistribution:
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * (MAX_PACKET_SIZE + 1)))
+        self.large_counts = {}  # Size -> count, for sizes above MAX_PACKET_SIZE
+        self.count = 0
+        self.total = 0  # Sum of all sizes, for the mean
+
+    def add(self, size):
+        if size <= MAX_PACKET_SIZE:
+            self.counts[size] += 1
+        else:
+            self.large_counts[size] = self.large_counts.get(size, 0) + 1
+        self.count += 1
+        self.total += size
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    # Function to get the sizes that were seen and how often, in increasing order
+    def values_and_counts(self):
+        values = [size for size, count in enumerate(self.counts) if count]
+        counts = [self.counts[size] for size in values]
+        for size in sorted(self.large_counts):
+            values.append(size)
+            counts.append(self.large_counts[size])
+        return values, counts
+
+    # Function to get the exact value of a percentile (nearest rank)
+    def percentile(self, percentile):
+        if self.count == 0:
+            return None
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        seen = 0
+        for size, count in zip(*self.values_and_counts()):
+            seen += count
+            if seen >= rank:
+                return size
+
+    # Function to get (percentile, value) pairs
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        return [(percentile, self.percentile(percentile)) for percentile in percentiles]
+
+    def merge(self, other):
+        counts = self.counts
+        for size, count in enumerate(other.counts):
+            if count:
+                counts[size] += count
+        for size, count in other.large_counts.items():
+            self.large_counts[size] = self.large_counts.get(size, 0) + count
+        self.count += other.count
+        self.total += other.total
+
+    # Multiply every count by a factor (counts are rounded, so the totals are recomputed from them)
+    def scale(self, factor):
+        counts = self.counts
+        for size, count in enumerate(counts):
+            if count:
+                counts[size] = round(count * factor)
+        for size, count in self.large_counts.items():
+            self.large_counts[size] = round(count * factor)
+        values, counts = self.values_and_counts()
+        self.count = sum(counts)
+        self.total = sum(size * count for size, count in zip(values, counts))
+
+
+# Function to format a percentile table, one line per percentile
+def format_percentile_table(title, percentiles, unit=''):
+    lines = [title]
+    for percentile, value in percentiles:
+        lines.append(f"  p{percentile:<5g} {'-' if value is None else f'{value:.6g}'}{unit}")
+    return '\n'.join(lines)
+
+
+# Class to collect the distribution of the time between consecutive packets in fixed memory
+# (used by E_packets_inter_arrivals)
+class InterArrivalHistogramAnalyzer:
+    is_distribution = True  # Inter-arrival times of the sampled packets, which sampling does not scale (see packet_sampling)
+
+    def __init__(self):
+        self.distribution = TimeDistribution()
+        self.first_timestamp = None  # Timestamp of the first packet (needed to stitch chunks together)
+        self.previous_timestamp = None  # Timestamp of the previous packet
+
+    def process(self, packet):
+        if self.previous_timestamp is not None:
+            self.distribution.add(packet.timestamp - self.previous_timestamp)  # Count the time difference
+        else:
+            self.first_timestamp = packet.timestamp
+        self.previous_timestamp = packet.timestamp
+
+    def result(self):
+        return self.distribution
+
+    def merge(self, other):
+        self.distribution.merge(other.distribution)
+
+    # Append the next chunk of the same capture, adding the gap across the chunk boundary
+    def stitch(self, other):
+        if other.first_timestamp is None:
+            return  # The other chunk had no packets
+        if self.previous_timestamp is None:
+            self.first_timestamp = other.first_timestamp
+        else:
+            self.distribution.add(other.first_timestamp - self.previous_timestamp)
+        self.distribution.merge(other.distribution)
+        self.previous_timestamp = other.previous_timestamp
+
+
+# Class to count the size of every IP packet in fixed memory (used by F_flow_size)
+class PacketSizeHistogramAnalyzer:
+    def __init__(self):
+        self.distribution = SizeDistribution()
+
+    def process(self, packet):
+        if packet.ip_version == 4:  # Ensure packet contains an IP layer
+            self.distribution.add(packet.length)
+
+    def result(self):
+        return self.distribution
+
+    def merge(self, other):
+        self.distribution.merge(other.distribution)
+
+    # Multiply the counts by the sampling factor, to estimate the sizes of the whole capture (see packet_sampling)
+    def scale(self, factor):
+        self.distribution.scale(factor)
@@ -0,0 +1,88 @@
+from packet_engine import DEFAULT_ANALYZERS, get_pcap_files  # Importing the shared analyzers and pcap file lookup
+from flow_table import FlowTableAnalyzer  # Importing the 5-tuple flow table
+from sketches import SKETCH_ENABLED, IPStatsSketchAnalyzer, TCPPortSketchAnalyzer  # Importing the fixed-memory sketch counters
+from parallel_runner import analyze_files, analyzer_results, map_files  # Importing the runner that spreads files over CPU cores
+from tls_sessions import analyze_tls_sessions  # Importing the native TLS record pass, which counts the TLS versions
+from packet_sampling import SAMPLING_REPORTS  # Importing the sampling reports, which mark the plots of sampled gaps
+from instrumentation import stage  # Importing the opt-in stage timers
+from A_IP_header_fields import plot_ip_stats_for_file  # Importing the IP statistics plot
+from B_TCP_header_fields import plot_tcp_stats_for_file  # Importing the TCP port statistics plot
+from C_TLS_header_fields import plot_tls_stats_for_file  # Importing the TLS version statistics plot
+from D_packet_sizes import plot_average_packet_size  # Importing the average packet size plot
+from E_packets_inter_arrivals import plot_inter_arrival_distribution  # Importing the inter-arrival time plot
+from F_flow_size import plot_packet_size_counts, plot_flow_size_distribution  # Importing the size distribution plots
+from G_flow_volume import plot_flow_volume, plot_flow_volume_distribution  # Importing the flow volume plots
+
+
+# Function to get the analyzer classes of the header pass of compute_all_statistics, in the order A-G
+def statistics_analyzers():
+    analyzer_classes = DEFAULT_ANALYZERS + [FlowTableAnalyzer]
+    if SKETCH_ENABLED:
+        analyzer_classes[:2] = [IPStatsSketchAnalyzer, TCPPortSketchAnalyzer]  # Fixed-memory IP and port counters
+    return analyzer_classes
+
+
+# Function to count the packets per TLS record version of every file with the native TLS record pass
+# (no key logs are loaded: the versions are read from the record headers, which are never encrypted)
+def count_tls_versions(pcap_files, workers=None):
+    return [dict(record_versions) for _, _, record_versions in map_files(analyze_tls_sessions, pcap_files, workers, [])]
+
+
+# Function to read each pcap file a single time and compute the statistics of scripts A-G together,
+# with the files spread over one worker process per CPU core. Returns the results of every file.
+# TLS versions (C) are only counted with tls=True: the native TLS record pass of tls_sessions counts the packets per
+# record version, like C_TLS_header_fields and the report, so no tshark dissection is needed. Otherwise their result is None.
+def compute_all_statistics(pcap_files, backend=None, tls=False):
+    all_results = [analyzer_results(analyzers)
+                   for analyzers in analyze_files(pcap_files, statistics_analyzers(), backend=backend)]
+    all_tls = [None] * len(all_results)
+    if tls:
+        all_tls = count_tls_versions(pcap_files)
+    for results, tls_stats in zip(all_results, all_tls):
+        results.insert(2, tls_stats)  # In the order A-G
+    return all_results
+
+
+# Function to list the plots of the statistics as (file, plot function, arguments), in display order
+def statistics_plots(pcap_files, all_results):
+    plots = []
+    average_sizes = []  # Average packet size of every file (D)
+    flow_volumes = []  # Total bytes of every file (G)
+    for pcap_file, results in zip(pcap_files, all_results):
+        (ip_stats, tcp_stats, tls_stats, average_size,
+         inter_arrival_times, packet_sizes, total_bytes, flows) = results
+
+        plots.append((pcap_file, plot_ip_stats_for_file, (ip_stats, pcap_file)))  # A: IP header statistics
+        plots.append((pcap_file, plot_tcp_stats_for_file, (tcp_stats, pcap_file)))  # B: TCP port statistics
+        if tls_stats is not None:
+            plots.append((pcap_file, plot_tls_stats_for_file, (tls_stats, pcap_file)))  # C: TLS version statistics
+        plots.append((pcap_file, plot_inter_arrival_distribution,
+                      (inter_arrival_times, pcap_file, SAMPLING_REPORTS.get(pcap_file))))  # E: inter-arrival times
+        plots.append((pcap_file, plot_packet_size_counts, (packet_sizes, pcap_file)))  # F: packet size distribution
+        plots.append((pcap_file, plot_flow_size_distribution, (list(flows.packets), pcap_file)))  # F: packets per flow
+        plots.append((pcap_file, plot_flow_volume_distribution, (list(flows.bytes), pcap_file)))  # G: bytes per flow
+
+        average_sizes.append(average_size)  # Store the computed average
+        flow_volumes.append(total_bytes)  # Store the computed volume
+
+    # Plots that compare all the files
+    plots.append((None, plot_average_packet_size, (average_sizes, pcap_files)))  # D: average packet size per file
+    plots.append((None, plot_flow_volume, (flow_volumes, pcap_files)))  # G: flow volume per file
+    return plots
+
+
+# Directory containing PCAPNG files
+PCAP_DIR = 'pcapng_files'
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
+
+    # Compute the statistics of all the files, then show their plots one after the other
+    all_results = compute_all_statistics(pcap_files, tls=True)  # The TLS versions come from the native TLS record pass
+    for pcap_file, plot, args in statistics_plots(pcap_files, all_results):
+        with stage('plot', plot.__name__):
+            plot(*args)
@@ -1,33 +1,80 @@
-import pandas as pd  # Importing Pandas for data analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for visualization
-from collections import defaultdict  # Importing defaultdict for efficient counting
-import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
+from traffic_table import get_traffic_files, load_traffic_data  # Importing the CSV/Parquet traffic table loader
+from result_cache import cached_result  # Importing the on-disk result cache
+from instrumentation import stage  # Importing the opt-in stage timers
 
 
-CSV_DIR = 'csv_files'  # Directory where CSV files will be stored
+CSV_DIR = 'csv_files'  # Directory where CSV (and Parquet) files are stored
+STATISTICS_VERSION = 2  # Increase when compute_statistics changes, so cached results are recomputed
+HISTOGRAM_BINS = 50  # Bins of the inter-arrival time and packet size histograms
 
-def get_csv_files(directory):
-    return glob.glob(os.path.join(directory, "*.csv"))  # List all .cvs files in the directory
 
+# Function to count how often each value appears in two columns, interleaved row by row
+# (source, destination, source, ...) so that ties keep their first-seen order
+def count_pair_values(first, second):
+    import numpy as np  # NumPy is only loaded to compute the statistics
+    import pandas as pd  # Pandas is only loaded to compute the statistics
+    values = pd.Series(np.column_stack([first.to_numpy(), second.to_numpy()]).ravel())
+    return values.value_counts(sort=False).sort_values(ascending=False, kind="stable")
 
-# Detect and process all .csv files in the directory
-csv_files = get_csv_files(CSV_DIR)
 
-for file_path in csv_files:
-    df = pd.read_csv(file_path)  # Read CSV file into a DataFrame
+# Function to count packets per IP address (source and destination)
+def compute_ip_stats(df):
+    return count_pair_values(df["Source IP"], df["Destination IP"])
 
-    # Convert timestamp column to datetime format
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"], unit="s")
 
-    # Analyze IP addresses (count packets per IP)
-    ip_stats = defaultdict(int)
-    for _, row in df.iterrows():
-        ip_stats[row["Source IP"]] += 1  # Count packets from source IP
-        ip_stats[row["Destination IP"]] += 1  # Count packets to destination IP
+# Function to count packets per port, ignoring packets without ports ("Unknown")
+def compute_port_stats(df):
+    import pandas as pd  # Pandas is only loaded to compute the statistics
+    src_ports = pd.to_numeric(df["Source Port"], errors="coerce")  # "Unknown" becomes NaN
+    dst_ports = pd.to_numeric(df["Destination Port"], errors="coerce")
+    port_stats = count_pair_values(src_ports, dst_ports)
+    port_stats = port_stats[port_stats.index.notna()]  # Mask out the missing ports
+    port_stats.index = port_stats.index.astype("int64").astype(str)  # Ports are plotted as labels
+    return port_stats
 
-    sorted_ips = sorted(ip_stats.items(), key=lambda x: x[1], reverse=True)[:10]  # Get top 10 IPs
-    ips, counts = zip(*sorted_ips)
+
+# Function to compute all the statistics of one traffic table with columnar operations
+def compute_statistics(df):
+    timestamps = df["Timestamp"].astype("float64")  # Seconds since the epoch
+    sizes = df["Size"]
+    return {
+        "ip_stats": compute_ip_stats(df),
+        "port_stats": compute_port_stats(df),
+        "average_packet_size": sizes.mean(),
+        "inter_arrival_times": timestamps.diff().iloc[1:],  # Time between consecutive packets
+        "packet_sizes": sizes,
+        "flow_volume": sizes.sum(),
+    }
+
+
+# Function to count values in equal-width bins, as plt.hist does; returns (counts, bin edges)
+def compute_histogram(values, bins=HISTOGRAM_BINS):
+    import numpy as np  # NumPy is only loaded to compute the statistics
+    return np.histogram(np.asarray(values, dtype=np.float64), bins=bins)
+
+
+# Function to reduce the statistics to their aggregates: the per-row inter-arrival times and packet sizes
+# become histograms, so the stored statistics do not grow with the size of the table
+def aggregate_statistics(stats):
+    aggregated = dict(stats)
+    aggregated["inter_arrival_histogram"] = compute_histogram(aggregated.pop("inter_arrival_times"))
+    aggregated["packet_size_histogram"] = compute_histogram(aggregated.pop("packet_sizes"))
+    return aggregated
+
+
+# Function to draw a histogram from its counts and bin edges (the same bars as plt.hist of the values)
+def plot_histogram(histogram, **options):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    counts, edges = histogram
+    return plt.hist(edges[:-1], bins=edges, weights=counts, **options)
+
+
+# Function to plot the aggregated statistics of one traffic table
+def plot_statistics(stats):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    # Plot the top IP addresses
+    sorted_ips = stats["ip_stats"].head(10)  # Get top 10 IPs
+    ips, counts = sorted_ips.index.tolist(), sorted_ips.tolist()
 
     plt.figure(figsize=(12, 6))
     plt.bar(ips, counts, color='blue')
@@ -38,19 +85,10 @@ for file_path in csv_files:
     plt.tight_layout()
     plt.show()
 
-    # Analyze TCP port usage
-    tcp_stats = defaultdict(int)
-    for _, row in df.iterrows():
-        src_port = str(row["Source Port"]).strip()
-        dst_port = str(row["Destination Port"]).strip()
-        if src_port.isdigit():
-            tcp_stats[src_port] += 1
-        if dst_port.isdigit():
-            tcp_stats[dst_port] += 1
-
-    sorted_ports = sorted(tcp_stats.items(), key=lambda x: x[1], reverse=True)[:10]
-    if sorted_ports:
-        ports, counts = zip(*sorted_ports)
+    # Plot TCP port usage
+    sorted_ports = stats["port_stats"].head(10)
+    if len(sorted_ports):
+        ports, counts = sorted_ports.index.tolist(), sorted_ports.tolist()
         plt.figure(figsize=(12, 6))
         plt.bar(ports, counts, color='green')
         plt.xlabel("TCP Port")
@@ -60,8 +98,8 @@ for file_path in csv_files:
         plt.tight_layout()
         plt.show()
 
-    # Compute average packet size
-    average_packet_size = df["Size"].mean()
+    # Plot average packet size
+    average_packet_size = stats["average_packet_size"]
     plt.figure(figsize=(6, 6))
     bar = plt.bar("CSV Data", [average_packet_size], color='purple')
     plt.xlabel("Data Source")
@@ -72,10 +110,9 @@ for file_path in csv_files:
     plt.tight_layout()
     plt.show()
 
-    # Compute inter-arrival times between packets
-    df["Inter Arrival Time"] = df["Timestamp"].diff().dt.total_seconds().dropna()
+    # Plot inter-arrival time distribution
     plt.figure(figsize=(12, 6))
-    counts, bins, patches = plt.hist(df["Inter Arrival Time"], bins=50, alpha=0.7, color='blue', edgecolor='black')
+    counts, bins, patches = plot_histogram(stats["inter_arrival_histogram"], alpha=0.7, color='blue', edgecolor='black')
     for count, bin_patch in zip(counts, patches):
         if count > 0:
             plt.text(bin_patch.get_x() + bin_patch.get_width() / 2, count, f'{int(count)}',
@@ -87,17 +124,17 @@ for file_path in csv_files:
     plt.xticks(rotation=45)
     plt.show()
 
-    # Analyze packet size distribution
+    # Plot packet size distribution
     plt.figure(figsize=(12, 6))
-    plt.hist(df["Size"], bins=50, color='blue', edgecolor='black')
+    plot_histogram(stats["packet_size_histogram"], color='blue', edgecolor='black')
     plt.xlabel("Packet Size (Bytes)")
     plt.ylabel("Frequency")
     plt.title("Packet Size Distribution from CSV")
     plt.tight_layout()
     plt.show()
 
-    # Compute total bytes transmitted
-    flow_volume = df["Size"].sum()
+    # Plot total bytes transmitted
+    flow_volume = stats["flow_volume"]
     plt.figure(figsize=(6, 6))
     bar = plt.bar("CSV Data", [flow_volume], color='orange')
     plt.xlabel("Data Source")
@@ -106,4 +143,26 @@ for file_path in csv_files:
     plt.text(bar[0].get_x() + bar[0].get_width() / 2, bar[0].get_height() + 5,
              f'{flow_volume:,}', ha='center', va='bottom')
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+
+# Function to compute the aggregated statistics of a traffic file, or take them from the cache if the file has not changed
+def load_statistics(file_path):
+    def compute():
+        df = load_traffic_data(file_path)
+        with stage('analyze', 'atkr_part_A', items=len(df)):
+            return aggregate_statistics(compute_statistics(df))
+
+    return cached_result(file_path, ('atkr_part_A.compute_statistics', STATISTICS_VERSION), compute)
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .csv and .parquet files in the directory
+    csv_files = get_traffic_files(CSV_DIR)
+
+    for file_path in csv_files:
+        stats = load_statistics(file_path)
+        plot_statistics(stats)
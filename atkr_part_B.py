@@ -1,26 +1,32 @@
-import pandas as pd  # Importing Pandas for data analysis
-import matplotlib.pyplot as plt  # Importing Matplotlib for visualization
-import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
+from traffic_table import get_traffic_files, load_traffic_data  # Importing the CSV/Parquet traffic table loader
+from result_cache import cached_result  # Importing the on-disk result cache
+from instrumentation import stage  # Importing the opt-in stage timers
+from atkr_part_A import aggregate_statistics, plot_histogram  # Importing the histogram aggregates shared with part A
 
 
-CSV_DIR = 'csv_files'  # Directory where CSV files will be stored
+CSV_DIR = 'csv_files'  # Directory where CSV (and Parquet) files are stored
+STATISTICS_VERSION = 2  # Increase when compute_statistics changes, so cached results are recomputed
 
-def get_csv_files(directory):
-    return glob.glob(os.path.join(directory, "*.csv"))  # List all .cvs files in the directory
 
+# Function to compute the packet size, inter-arrival time and volume statistics of one traffic table
+def compute_statistics(df):
+    import pandas as pd  # Pandas is only loaded to compute the statistics
+    # Convert timestamp column to datetime format
+    timestamps = pd.to_datetime(df["Timestamp"], unit="s")
 
-# Detect and process all .csv files in the directory
-csv_files = get_csv_files(CSV_DIR)
-
-for file_path in csv_files:
-    df = pd.read_csv(file_path)  # Read CSV file into a DataFrame
+    return {
+        "average_packet_size": df["Size"].mean(),  # Compute the average packet size
+        "inter_arrival_times": timestamps.diff().dt.total_seconds().dropna(),  # Time between packets
+        "packet_sizes": df["Size"],
+        "flow_volume": df["Size"].sum(),  # Compute total bytes transmitted
+    }
 
-    # Convert timestamp column to datetime format
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"], unit="s")
 
-    # Compute the average packet size
-    average_packet_size = df["Size"].mean()
+# Function to plot the aggregated statistics of one traffic table
+def plot_statistics(stats):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    # Plot the average packet size
+    average_packet_size = stats["average_packet_size"]
 
     plt.figure(figsize=(6, 6))  # Set figure size for better visualization
     bar = plt.bar("CSV Data", [average_packet_size], color='purple')  # Create a bar chart
@@ -35,13 +41,11 @@ for file_path in csv_files:
     plt.tight_layout()  # Adjust layout for better readability
     plt.show()  # Display the plot
 
-    # Compute inter-arrival times between packets
-    df["Inter Arrival Time"] = df["Timestamp"].diff().dt.total_seconds().dropna()
-
+    # Plot the inter-arrival times between packets
     plt.figure(figsize=(12, 6))  # Set figure size for better visualization
 
     # Create a histogram of inter-arrival times
-    counts, bins, patches = plt.hist(df["Inter Arrival Time"], bins=50, alpha=0.7, color='blue', edgecolor='black')
+    counts, bins, patches = plot_histogram(stats["inter_arrival_histogram"], alpha=0.7, color='blue', edgecolor='black')
 
     # Add count labels above each bar in the histogram
     for count, bin_patch in zip(counts, patches):
@@ -58,15 +62,15 @@ for file_path in csv_files:
 
     # Plot packet size distribution
     plt.figure(figsize=(12, 6))  # Set figure size for better visualization
-    plt.hist(df["Size"], bins=50, color='blue', edgecolor='black')  # Create histogram
+    plot_histogram(stats["packet_size_histogram"], color='blue', edgecolor='black')  # Create histogram
     plt.xlabel("Packet Size (Bytes)")  # Label for x-axis
     plt.ylabel("Frequency")  # Label for y-axis
     plt.title("Packet Size Distribution from CSV")  # Set title
     plt.tight_layout()  # Adjust layout for better readability
     plt.show()  # Display the plot
 
-    # Compute and display Flow Volume (total bytes transmitted)
-    flow_volume = df["Size"].sum()  # Compute total bytes transmitted
+    # Display Flow Volume (total bytes transmitted)
+    flow_volume = stats["flow_volume"]
 
     plt.figure(figsize=(6, 6))  # Set figure size for better visualization
     bar = plt.bar("CSV Data", [flow_volume], color='orange')  # Create a bar chart
@@ -81,3 +85,25 @@ for file_path in csv_files:
 
     plt.tight_layout()  # Adjust layout for better readability
     plt.show()  # Display the plot
+
+
+# Function to compute the aggregated statistics of a traffic file, or take them from the cache if the file has not changed
+def load_statistics(file_path):
+    def compute():
+        df = load_traffic_data(file_path, ["Timestamp", "Size"])
+        with stage('analyze', 'atkr_part_B', items=len(df)):
+            return aggregate_statistics(compute_statistics(df))
+
+    return cached_result(file_path, ('atkr_part_B.compute_statistics', STATISTICS_VERSION), compute)
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    # Detect and process all .csv and .parquet files in the directory
+    csv_files = get_traffic_files(CSV_DIR)
+
+    for file_path in csv_files:
+        stats = load_statistics(file_path)
+        plot_statistics(stats)
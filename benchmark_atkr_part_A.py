@@ -0,0 +1,75 @@
+import time  # Import time to measure the run time of each implementation
+from collections import defaultdict  # Importing defaultdict for the row-by-row reference implementation
+import pandas as pd  # Importing Pandas for data analysis
+
+from atkr_part_A import compute_statistics  # Importing the columnar statistics of atkr_part_A
+from traffic_table import load_traffic_data  # Importing the CSV/Parquet traffic table loader
+
+
+# CSV files used for the benchmark
+BENCHMARK_FILES = ['csv_files/zoom_traffic_analysis.csv', 'csv_files/youtube_traffic_analysis.csv']
+REPEATS = 3  # Every implementation runs this many times, the best time is kept
+
+
+# Function with the previous row-by-row implementation (two iterrows loops), kept as the baseline
+def compute_statistics_iterrows(df):
+    df = df.copy()
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"], unit="s")
+
+    ip_stats = defaultdict(int)
+    for _, row in df.iterrows():
+        ip_stats[row["Source IP"]] += 1  # Count packets from source IP
+        ip_stats[row["Destination IP"]] += 1  # Count packets to destination IP
+
+    tcp_stats = defaultdict(int)
+    for _, row in df.iterrows():
+        src_port = str(row["Source Port"]).strip()
+        dst_port = str(row["Destination Port"]).strip()
+        if src_port.isdigit():
+            tcp_stats[src_port] += 1
+        if dst_port.isdigit():
+            tcp_stats[dst_port] += 1
+
+    return {
+        "ip_stats": sorted(ip_stats.items(), key=lambda x: x[1], reverse=True)[:10],
+        "port_stats": sorted(tcp_stats.items(), key=lambda x: x[1], reverse=True)[:10],
+        "average_packet_size": df["Size"].mean(),
+        "inter_arrival_times": df["Timestamp"].diff().dt.total_seconds().dropna(),
+        "packet_sizes": df["Size"],
+        "flow_volume": df["Size"].sum(),
+    }
+
+
+# Function to run an implementation several times and return the best time and the last result
+def time_function(function, df):
+    best = float('inf')
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# Function to check that both implementations give the same statistics
+def same_results(old, new):
+    return (old["ip_stats"] == list(new["ip_stats"].head(10).items())
+            and old["port_stats"] == list(new["port_stats"].head(10).items())
+            and old["average_packet_size"] == new["average_packet_size"]
+            and old["flow_volume"] == new["flow_volume"]
+            and len(old["inter_arrival_times"]) == len(new["inter_arrival_times"])
+            and abs(old["inter_arrival_times"].to_numpy() - new["inter_arrival_times"].to_numpy()).max() < 1e-6)
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    for file_path in BENCHMARK_FILES:
+        df = load_traffic_data(file_path)  # Read CSV file into a DataFrame
+        old_time, old_result = time_function(compute_statistics_iterrows, df)
+        new_time, new_result = time_function(compute_statistics, df)
+        print(f"{file_path}: {len(df):,} rows")
+        print(f"  iterrows:   {old_time * 1000:10.1f} ms")
+        print(f"  vectorized: {new_time * 1000:10.1f} ms  ({old_time / new_time:.0f}x faster)")
+        print(f"  same results: {same_results(old_result, new_result)}")
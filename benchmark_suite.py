@@ -0,0 +1,220 @@
+import argparse  # Import argparse to read the command-line options
+import importlib  # Import importlib to load the benchmarked scripts in the worker processes
+import json  # Import json to store the benchmark history
+import multiprocessing  # Import multiprocessing to run every benchmark in a fresh process
+import os  # Import os to interact with the filesystem
+import platform  # Import platform to describe the machine in the history
+import shutil  # Import shutil to check whether tshark is installed
+import subprocess  # Import subprocess to record the git commit of a run
+import time  # Import time to measure the wall time of every benchmark
+from concurrent.futures import ProcessPoolExecutor  # Importing a process pool to isolate every benchmark
+from datetime import datetime  # Import datetime to date the benchmark runs
+
+from result_cache import write_atomically  # Importing the atomic file writer
+from synthetic_capture import DEFAULT_FLOWS, DEFAULT_PACKETS, DEFAULT_PROTOCOL_MIX, DEFAULT_TLS_SHARE, \
+    parse_protocol_mix, write_synthetic_capture  # Importing the synthetic capture generator
+
+
+# Benchmark settings (can be overridden from the environment)
+BENCHMARK_DIR = os.environ.get('PCAP_BENCHMARK_DIR', 'benchmarks')  # Synthetic captures and the history
+HISTORY_FILE = 'history.json'
+REGRESSION_THRESHOLD = 0.10  # A throughput drop of more than 10% from the previous run is a regression
+
+# Benchmarks: name -> (module, function, input). 'pcap' benchmarks read the synthetic capture,
+# 'csv' benchmarks read the traffic table written by the converter benchmark (which must run before them)
+BENCHMARKS = {
+    'A_IP_header_fields': ('A_IP_header_fields', 'analyze_pcap', 'pcap'),
+    'B_TCP_header_fields': ('B_TCP_header_fields', 'analyze_tcp_pcap', 'pcap'),
+    'C_TLS_header_fields': ('C_TLS_header_fields', 'analyze_tls_pcap', 'pcap'),
+    'C_tls_sessions': ('tls_sessions', 'analyze_tls_sessions', 'pcap'),
+    'D_packet_sizes': ('D_packet_sizes', 'analyze_average_packet_size', 'pcap'),
+    'E_packets_inter_arrivals': ('E_packets_inter_arrivals', 'analyze_inter_arrival_distribution', 'pcap'),
+    'F_packet_sizes': ('F_flow_size', 'analyze_packet_size_counts', 'pcap'),
+    'F_flow_sizes': ('F_flow_size', 'analyze_flow_sizes', 'pcap'),
+    'G_flow_volume': ('G_flow_volume', 'analyze_flow_volume', 'pcap'),
+    'all_statistics': ('all_statistics', 'compute_all_statistics', 'pcap'),
+    'pcapng_to_CSV_for_atkr': ('pcapng_to_CSV_for_atkr', 'analyze_pcap', 'pcap'),
+    'atkr_part_A': ('atkr_part_A', 'compute_statistics', 'csv'),
+    'atkr_part_B': ('atkr_part_B', 'compute_statistics', 'csv'),
+    'traffic_classifier': ('traffic_classifier', 'extract_features', 'csv'),
+}
+TSHARK_BENCHMARKS = {'C_TLS_header_fields'}  # Always read with tshark (skipped when it is not installed)
+
+
+# Function to get the commit the benchmarks ran on (None outside a git checkout)
+def git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+# Function to run one benchmark in the current process and return (seconds, peak RSS in MB)
+def run_benchmark(name, input_path, csv_path, backend):
+    os.environ['PCAP_CACHE'] = '0'  # Measure the analysis, not the result cache
+    os.environ['PCAP_INCREMENTAL'] = '0'
+    module_name, function_name, kind = BENCHMARKS[name]
+    module = importlib.import_module(module_name)
+    function = getattr(module, function_name)
+    from pcapng_to_CSV_for_atkr import peak_rss_mb  # Importing the peak memory measurement
+
+    start = time.perf_counter()
+    if kind == 'csv':
+        from traffic_table import load_traffic_data  # Importing the CSV/Parquet traffic table loader
+        function(load_traffic_data(input_path))
+    elif name == 'pcapng_to_CSV_for_atkr':
+        function(input_path, csv_path, backend)
+    elif name == 'all_statistics':
+        function([input_path], backend, tls=False)  # TLS versions need tshark, they are measured by C_TLS_header_fields
+    elif name == 'C_tls_sessions':
+        function(input_path, [])  # No key logs for synthetic traffic
+    elif name in TSHARK_BENCHMARKS:
+        function(input_path)
+    else:
+        function(input_path, backend)
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+# Function to run a benchmark in a fresh process, so its peak RSS does not include the earlier benchmarks
+def run_isolated(name, input_path, csv_path, backend):
+    context = multiprocessing.get_context('spawn')  # A new interpreter, not a copy of this process
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_benchmark, name, input_path, csv_path, backend).result()
+
+
+# Function to get the synthetic capture of a configuration, writing it only the first time
+def prepare_capture(packets, flows, protocol_mix, tls_share, seed):
+    mix = '_'.join(f'{protocol}{share:g}' for protocol, share in sorted(protocol_mix.items()))
+    name = f'synthetic_{packets}p_{flows}f_{mix}_tls{tls_share:g}_seed{seed}'
+    path = os.path.join(BENCHMARK_DIR, 'captures', name + '.pcapng')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f"Writing {path}")
+        write_synthetic_capture(path + '.tmp', packets, flows, protocol_mix, tls_share, seed)
+        os.replace(path + '.tmp', path)
+    return name, path
+
+
+# Function to run the benchmarks on a capture and return one result per benchmark
+def run_benchmarks(names, capture_name, capture_path, packets, backend, repeat=1):
+    csv_path = os.path.join(BENCHMARK_DIR, 'captures', capture_name + '_analysis.csv')
+    results = []
+    for name in names:
+        if name in TSHARK_BENCHMARKS and shutil.which('tshark') is None:
+            print(f"  {name:<26} skipped (tshark is not installed)")
+            continue
+        input_path = csv_path if BENCHMARKS[name][2] == 'csv' else capture_path
+        if not os.path.exists(input_path):
+            print(f"  {name:<26} skipped (run pcapng_to_CSV_for_atkr first)")
+            continue
+        runs = [run_isolated(name, input_path, csv_path, backend) for _ in range(repeat)]
+        seconds = min(run[0] for run in runs)  # The best of the repeats
+        peak_rss = max((run[1] for run in runs if run[1] is not None), default=None)
+        input_bytes = os.path.getsize(input_path)
+        result = {
+            'benchmark': name,
+            'capture': capture_name,
+            'backend': 'pyshark' if name in TSHARK_BENCHMARKS else backend,
+            'packets': packets,
+            'input_bytes': input_bytes,
+            'seconds': seconds,
+            'packets_per_sec': packets / seconds if seconds > 0 else None,
+            'mb_per_sec': input_bytes / (1024 * 1024) / seconds if seconds > 0 else None,
+            'peak_rss_mb': peak_rss,
+        }
+        if name == 'all_statistics':
+            from all_statistics import statistics_analyzers  # Importing the analyzers of the benchmarked pass
+            result['analyzers'] = [analyzer_class.__name__ for analyzer_class in statistics_analyzers()]
+        print(format_result(result))
+        results.append(result)
+    return results
+
+
+# Function to format one result as a table line
+def format_result(result):
+    rss = f"{result['peak_rss_mb']:.1f} MB" if result['peak_rss_mb'] is not None else "n/a"
+    line = (f"  {result['benchmark']:<26} {result['seconds']:>8.3f} s {result['packets_per_sec'] or 0:>12,.0f} packets/s "
+            f"{result['mb_per_sec'] or 0:>8.1f} MB/s  peak RSS {rss}")
+    if result.get('analyzers'):
+        line += f"\n  {'':<26} analyzers: {', '.join(result['analyzers'])}"
+    return line
+
+
+# Function to load the benchmark history (a list of runs, oldest first)
+def load_history(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+# Function to get the key of a result in the history: runs are only compared with the same benchmark, capture,
+# backend and analyzers (a run that computed other analyzers is not a baseline)
+def result_key(result):
+    return result['benchmark'], result['capture'], result['backend'], tuple(result.get('analyzers') or ())
+
+
+# Function to find the results whose throughput dropped by more than the threshold since the last run
+# of the same benchmark, capture, backend and analyzers. Returns (result, previous result) pairs.
+def find_regressions(history, results, threshold=REGRESSION_THRESHOLD):
+    previous = {}
+    for run in history:
+        for result in run['results']:
+            previous[result_key(result)] = result
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before and before['packets_per_sec'] and result['packets_per_sec'] is not None \
+                and result['packets_per_sec'] < before['packets_per_sec'] * (1 - threshold):
+            regressions.append((result, before))
+    return regressions
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    parser = argparse.ArgumentParser(description="Measure the throughput of every analysis on synthetic captures.")
+    parser.add_argument('--packets', type=int, default=DEFAULT_PACKETS, help="packets of the synthetic capture")
+    parser.add_argument('--flows', type=int, default=DEFAULT_FLOWS, help="flows of the synthetic capture")
+    parser.add_argument('--protocol-mix', type=parse_protocol_mix, default=DEFAULT_PROTOCOL_MIX,
+                        help="share of the flows per protocol, such as TCP=0.8,UDP=0.2")
+    parser.add_argument('--tls-share', type=float, default=DEFAULT_TLS_SHARE, help="share of the TCP flows that use TLS")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the synthetic capture")
+    parser.add_argument('--backend', default='native', help="packet reading backend ('native', 'pyshark' or 'tshark')")
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="benchmarks to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per benchmark, the best time is kept")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="throughput drop reported as a regression (0.1 = 10%%)")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 when a regression is found")
+    options = parser.parse_args()
+
+    capture_name, capture_path = prepare_capture(options.packets, options.flows, options.protocol_mix,
+                                                 options.tls_share, options.seed)
+    print(f"Benchmarks on {capture_name} ({os.path.getsize(capture_path) / (1024 * 1024):.1f} MB, {options.backend} backend)")
+    names = sorted(options.benchmarks, key=lambda name: BENCHMARKS[name][2] == 'csv')  # The converter before atkr
+    results = run_benchmarks(names, capture_name, capture_path, options.packets, options.backend, options.repeat)
+
+    history_path = os.path.join(BENCHMARK_DIR, HISTORY_FILE)
+    history = load_history(history_path)
+    regressions = find_regressions(history, results, options.threshold)
+    for result, before in regressions:
+        print(f"Regression: {result['benchmark']} {result['packets_per_sec']:,.0f} packets/s "
+              f"(was {before['packets_per_sec']:,.0f} on {before.get('commit') or 'an earlier run'})")
+
+    commit = git_commit()
+    history.append({
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': f'{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs',
+        'results': [dict(result, commit=commit) for result in results],
+    })
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    write_atomically(history_path, json.dumps(history, indent=1).encode())
+    print(f"History saved to {history_path}")
+    if options.check and regressions:
+        raise SystemExit(1)
@@ -0,0 +1,121 @@
+import hashlib  # Import hashlib to recognise a capture that was rotated or rewritten
+import os  # Import os to interact with the filesystem
+import pickle  # Import pickle to store the reader and analyzer state
+from itertools import islice  # Import islice to skip the packets that were already analyzed
+
+from packet_engine import NATIVE_BACKEND, DEFAULT_ANALYZERS, analyze_packets, iter_packets, select_backend  # Importing the shared packet engine
+from result_cache import analyzer_signature, write_atomically  # Importing the helpers shared with the result cache
+from instrumentation import stage  # Importing the opt-in stage timers
+
+
+# Checkpoint location (can be overridden from the environment)
+CHECKPOINT_DIR = os.environ.get('PCAP_CHECKPOINT_DIR', '.analysis_checkpoints')
+INCREMENTAL_ENABLED = os.environ.get('PCAP_INCREMENTAL', '0') == '1'  # PCAP_INCREMENTAL=1 enables checkpoints
+
+HEAD_SIZE = 64 * 1024  # Number of bytes at the start of the file used to recognise the same capture
+TAIL_SIZE = 4 * 1024  # Number of bytes before the checkpoint offset that must be unchanged to resume
+
+
+# Function to hash a byte range of a file
+def hash_range(pcap_file, start, end):
+    with open(pcap_file, 'rb') as f:
+        f.seek(start)
+        return hashlib.blake2b(f.read(end - start), digest_size=16).hexdigest()
+
+
+# Class holding everything needed to continue the analysis of a capture after the last processed block:
+# the reader state (offset of the next block, byte order, interfaces), the packet count and the filled analyzers
+class Checkpoint:
+    def __init__(self, signature, backend, analyzers):
+        self.signature = signature  # Analyzer names and code hashes the state belongs to
+        self.backend = backend
+        self.analyzers = analyzers
+        self.reader_state = None  # pcapng_reader.ReaderState after the last processed block (native backend)
+        self.packet_count = 0  # Number of packets already analyzed
+        self.offset = 0  # Offset up to which the file was analyzed
+        self.head_hash = None  # Hash of the start of the file
+        self.tail_hash = None  # Hash of the bytes just before the offset
+
+    # Function to check whether the capture is still the one of the checkpoint, with packets only appended
+    def matches(self, pcap_file, signature, backend):
+        if self.signature != signature or self.backend != backend:
+            return False
+        if os.path.getsize(pcap_file) < self.offset:
+            return False  # The file was truncated or rotated
+        return (hash_range(pcap_file, 0, min(self.offset, HEAD_SIZE)) == self.head_hash
+                and hash_range(pcap_file, max(self.offset - TAIL_SIZE, 0), self.offset) == self.tail_hash)
+
+    # Function to record how far the capture was analyzed
+    def mark(self, pcap_file, offset):
+        self.offset = offset
+        self.head_hash = hash_range(pcap_file, 0, min(offset, HEAD_SIZE))
+        self.tail_hash = hash_range(pcap_file, max(offset - TAIL_SIZE, 0), offset)
+
+
+# Function to get the checkpoint file of a capture
+def checkpoint_path(pcap_file, checkpoint_dir=CHECKPOINT_DIR):
+    name = hashlib.sha256(os.path.abspath(pcap_file).encode()).hexdigest()
+    return os.path.join(checkpoint_dir, name + '.pkl')
+
+
+# Function to load the checkpoint of a capture, or None when there is none
+def load_checkpoint(pcap_file, checkpoint_dir=CHECKPOINT_DIR):
+    try:
+        with open(checkpoint_path(pcap_file, checkpoint_dir), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+# Function to store the checkpoint of a capture
+def save_checkpoint(pcap_file, checkpoint, checkpoint_dir=CHECKPOINT_DIR):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    with stage('serialize', 'checkpoint'):
+        write_atomically(checkpoint_path(pcap_file, checkpoint_dir),
+                         pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# Function to bring the analysis of a growing capture up to date and return the filled analyzers.
+# Only the packets appended since the last run are analyzed; when the capture was rotated or rewritten,
+# or the analyzers changed, the analysis starts again from the first packet.
+# With the native reader, the file is read from the offset of the first new block;
+# tshark can only read a file from the start, so the packets already analyzed are decoded again but skipped.
+def analyze_incrementally(pcap_file, analyzer_classes=DEFAULT_ANALYZERS, backend=None, checkpoint_dir=CHECKPOINT_DIR):
+    backend = select_backend(analyzer_classes, backend)
+    signature = analyzer_signature(analyzer_classes)
+
+    checkpoint = load_checkpoint(pcap_file, checkpoint_dir)
+    resumed = checkpoint is not None and checkpoint.matches(pcap_file, signature, backend)
+    if not resumed:
+        checkpoint = Checkpoint(signature, backend, [analyzer_class() for analyzer_class in analyzer_classes])
+
+    if backend == NATIVE_BACKEND:
+        import pcapng_reader
+        if checkpoint.reader_state is None:
+            checkpoint.reader_state = pcapng_reader.ReaderState()
+        state = checkpoint.reader_state  # Updated by the reader as blocks are read
+        packets = pcapng_reader.iter_packets(pcap_file, state)
+    else:
+        packets = islice(iter_packets(pcap_file, backend), checkpoint.packet_count, None)
+
+    new_packets = 0
+
+    # Function to count the new packets while they are passed to the analyzers
+    def count(packets):
+        nonlocal new_packets
+        for packet in packets:
+            new_packets += 1
+            yield packet
+
+    analyze_packets(count(packets), checkpoint.analyzers)
+    checkpoint.packet_count += new_packets
+
+    # A truncated block at the end of the file (still being written) is not consumed, so it is read next time
+    if backend == NATIVE_BACKEND:
+        checkpoint.mark(pcap_file, state.offset)
+    else:
+        checkpoint.mark(pcap_file, os.path.getsize(pcap_file))
+
+    if new_packets or not resumed:
+        save_checkpoint(pcap_file, checkpoint, checkpoint_dir)
+    return checkpoint.analyzers
@@ -0,0 +1,323 @@
+import argparse  # Import argparse to read the command-line options
+import hashlib  # Import hashlib to name the index files
+import io  # Import io to parse the selected CSV rows
+import mmap  # Import mmap to check whether a capture buffer must be closed
+import os  # Import os to interact with the filesystem
+import pickle  # Import pickle to store the indexes
+from array import array  # Import array for the compact offset and timestamp columns
+from bisect import bisect_left  # Import bisect_left to find the postings of a chunk
+from datetime import datetime, time as day_time  # Import datetime to read the query times
+
+import pcapng_reader  # Importing the native pcapng reader (block walking and header decoding)
+from packet_engine import analyze_packets  # Importing the shared packet engine
+from result_cache import write_atomically  # Importing the atomic file writer
+from instrumentation import stage  # Importing the opt-in stage timers
+
+
+# Index settings (can be overridden from the environment)
+INDEX_DIR = os.environ.get('PCAP_INDEX_DIR', '.analysis_index')
+CHUNK_SIZE = int(os.environ.get('PCAP_INDEX_CHUNK', 1024))  # Packets (or rows) per entry of the time index
+INDEX_VERSION = 1  # Increase when the index layout changes, so old indexes are rebuilt
+
+CAPTURE_KIND = 'capture'
+TABLE_KIND = 'table'
+
+
+# Class holding the index of a capture or of a CSV traffic table:
+# - a sparse time index: the file is cut into chunks of CHUNK_SIZE packets (rows), and every chunk keeps
+#   its start offset and the smallest and largest timestamp in it (so captures out of time order still work)
+# - posting lists: for every IP address and port, the offsets of the packets (rows) where it appears, in file order
+# For a capture, an offset is the reader position just before the packet (the packet is the next one read from there),
+# and every chunk also keeps the reader state (byte order and interfaces) of its packets.
+class CaptureIndex:
+    def __init__(self, path, kind):
+        self.version = INDEX_VERSION
+        self.path = os.path.abspath(path)
+        self.kind = kind
+        stat = os.stat(path)
+        self.file_size = stat.st_size  # The index is rebuilt when the file changes
+        self.file_mtime = stat.st_mtime_ns
+        self.end_offset = 0  # Offset after the last indexed packet (row)
+        self.count = 0  # Number of indexed packets (rows)
+        self.chunk_offsets = array('Q')
+        self.chunk_first_times = array('d')  # Smallest timestamp of every chunk
+        self.chunk_last_times = array('d')  # Largest timestamp of every chunk
+        self.chunk_states = []  # Reader state of the packets of every chunk (captures only)
+        self.ip_postings = {}  # IP address -> array of offsets
+        self.port_postings = {}  # Port -> array of offsets
+        self.header = b''  # Header line (CSV tables only)
+
+    # Function to check whether the index still describes the file
+    def matches(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return (self.version == INDEX_VERSION and stat.st_size == self.file_size
+                and stat.st_mtime_ns == self.file_mtime)
+
+    # Function to start a new chunk of the time index
+    def start_chunk(self, offset, timestamp, state=None):
+        self.chunk_offsets.append(offset)
+        self.chunk_first_times.append(timestamp)
+        self.chunk_last_times.append(timestamp)
+        if state is not None:
+            self.chunk_states.append(state)
+
+    # Function to add one packet (row) to the current chunk and to the posting lists
+    def add(self, offset, timestamp, ips, ports):
+        chunk = len(self.chunk_offsets) - 1
+        if timestamp < self.chunk_first_times[chunk]:
+            self.chunk_first_times[chunk] = timestamp
+        elif timestamp > self.chunk_last_times[chunk]:
+            self.chunk_last_times[chunk] = timestamp
+        for key in ips:
+            postings = self.ip_postings.get(key)
+            if postings is None:
+                postings = self.ip_postings[key] = array('Q')
+            postings.append(offset)
+        for key in ports:
+            postings = self.port_postings.get(key)
+            if postings is None:
+                postings = self.port_postings[key] = array('Q')
+            postings.append(offset)
+        self.count += 1
+
+    # Function to get the end offset of a chunk (the start of the next one)
+    def chunk_end(self, chunk):
+        return self.chunk_offsets[chunk + 1] if chunk + 1 < len(self.chunk_offsets) else self.end_offset
+
+    # Function to get the chunks that may hold packets between start and end (None for an open bound)
+    def chunks_between(self, start=None, end=None):
+        return [chunk for chunk in range(len(self.chunk_offsets))
+                if (start is None or self.chunk_last_times[chunk] >= start)
+                and (end is None or self.chunk_first_times[chunk] <= end)]
+
+    # Function to get, in file order, the offsets of the packets of an IP address and/or a port,
+    # restricted to the chunks that may hold packets between start and end
+    def postings(self, ip=None, port=None, start=None, end=None):
+        lists = []
+        if ip is not None:
+            lists.append(self.ip_postings.get(ip, array('Q')))
+        if port is not None:
+            lists.append(self.port_postings.get(port, array('Q')))
+        lists.sort(key=len)
+        offsets = lists[0]
+        for other in lists[1:]:  # Intersection: look up every offset of the shorter list in the longer one
+            offsets = [offset for offset in offsets
+                       if bisect_left(other, offset) < len(other) and other[bisect_left(other, offset)] == offset]
+        if start is None and end is None:
+            return offsets
+
+        selected = []
+        for chunk in self.chunks_between(start, end):
+            low = bisect_left(offsets, self.chunk_offsets[chunk])
+            high = bisect_left(offsets, self.chunk_end(chunk))
+            selected.extend(offsets[low:high])
+        return selected
+
+    # Function to get the chunk holding an offset
+    def chunk_of(self, offset):
+        return bisect_left(self.chunk_offsets, offset + 1) - 1
+
+
+# Function to get the index file of a capture or table
+def index_path(path, index_dir=INDEX_DIR):
+    name = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(index_dir, name + '.pkl')
+
+
+# Function to get the blocks (or records) reader of a capture buffer
+def block_reader(data):
+    return pcapng_reader.iter_pcap_records if pcapng_reader.is_classic_pcap(data) else pcapng_reader.iter_packet_blocks
+
+
+# Function to index a capture with a single pass over its blocks (only the headers of every packet are decoded)
+def build_capture_index(pcap_file):
+    index = CaptureIndex(pcap_file, CAPTURE_KIND)
+    data = pcapng_reader.open_capture_buffer(pcap_file)
+    try:
+        state = pcapng_reader.ReaderState()
+        blocks = block_reader(data)(data, state)
+        chunk_packets = CHUNK_SIZE
+        interfaces = state.interfaces
+        interface_count = 0
+        byte_order = state.byte_order
+        while True:
+            offset = state.offset  # The next packet is read from here
+            previous_timestamp = state.last_timestamp
+            raw_packet = next(blocks, None)
+            if raw_packet is None:
+                break
+            # A new chunk every CHUNK_SIZE packets, and whenever the byte order or the interfaces changed,
+            # since all the packets of a chunk are read with one state: the state after its first packet.
+            # Reading the chunk from its start reads the section and interface blocks before that packet again,
+            # which only appends copies after the interfaces already known, so the interface numbers stay valid.
+            if (chunk_packets >= CHUNK_SIZE or state.byte_order != byte_order
+                    or state.interfaces is not interfaces or len(state.interfaces) != interface_count):
+                chunk_state = state.copy()
+                chunk_state.offset = offset
+                chunk_state.last_timestamp = previous_timestamp
+                index.start_chunk(offset, raw_packet[0], chunk_state)
+                chunk_packets = 0
+                byte_order, interfaces, interface_count = state.byte_order, state.interfaces, len(state.interfaces)
+            chunk_packets += 1
+            packet = pcapng_reader.decode_raw_packet(raw_packet)
+            ips = () if packet.ip_src is None else {packet.ip_src, packet.ip_dst}
+            ports = () if packet.src_port is None else {packet.src_port, packet.dst_port}
+            index.add(offset, packet.timestamp, ips, ports)
+        index.end_offset = state.offset
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()  # Unmap the file to release resources
+    return index
+
+
+# Function to index a CSV traffic table with a single pass over its lines
+def build_table_index(csv_file):
+    index = CaptureIndex(csv_file, TABLE_KIND)
+    with open(csv_file, 'rb') as f:
+        index.header = f.readline()
+        offset = f.tell()
+        for row, line in enumerate(f):
+            # Columns: Timestamp, Size, Source IP, Destination IP, Source Port, Destination Port
+            timestamp, size, src_ip, dst_ip, src_port, dst_port = line.rstrip(b'\r\n').decode().split(',')
+            timestamp = float(timestamp)
+            if row % CHUNK_SIZE == 0:
+                index.start_chunk(offset, timestamp)
+            ports = () if src_port == 'Unknown' else {int(src_port), int(dst_port)}
+            index.add(offset, timestamp, {src_ip, dst_ip}, ports)
+            offset += len(line)
+        index.end_offset = offset
+    return index
+
+
+# Function to load the index of a capture (.pcapng/.pcap) or CSV traffic table, building and saving it
+# when it is missing or the file changed since it was built
+def load_index(path, index_dir=INDEX_DIR):
+    if path.endswith('.parquet'):
+        raise ValueError("Parquet tables are not indexed: their row groups already carry min/max statistics")
+    index_file = index_path(path, index_dir)
+    try:
+        with open(index_file, 'rb') as f:
+            index = pickle.load(f)
+        if index.matches(path):
+            return index
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    with stage('analyze', 'capture_index'):
+        index = build_table_index(path) if path.endswith('.csv') else build_capture_index(path)
+    os.makedirs(index_dir, exist_ok=True)
+    with stage('serialize', 'capture_index'):
+        write_atomically(index_file, pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+    return index
+
+
+# Function to read the packets of a capture that match a query, reading only the chunks or packets the index selects.
+# ip and port select the packets where the address or port appears (as source or destination);
+# start and end (seconds since the epoch) bound the timestamps. Yields PacketInfo records in file order.
+def query_capture(pcap_file, start=None, end=None, ip=None, port=None, index=None):
+    index = index or load_index(pcap_file)
+    data = pcapng_reader.open_capture_buffer(pcap_file)
+    blocks = block_reader(data)
+    try:
+        if ip is None and port is None:
+            # Time range only: read the selected chunks from their start
+            raw_packets = (raw_packet for chunk in index.chunks_between(start, end)
+                           for raw_packet in blocks(data, index.chunk_states[chunk].copy(), index.chunk_end(chunk)))
+        else:
+            # Seek to every selected packet, with the reader state of its chunk
+            def read_packet(offset):
+                state = index.chunk_states[index.chunk_of(offset)].copy()
+                state.offset = offset
+                return next(blocks(data, state))
+            raw_packets = map(read_packet, index.postings(ip, port, start, end))
+
+        for packet in pcapng_reader.decode_raw_packets(raw_packets):
+            if (start is None or packet.timestamp >= start) and (end is None or packet.timestamp <= end):
+                yield packet
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()  # Unmap the file to release resources
+
+
+# Function to read the rows of a CSV traffic table that match a query (same options as query_capture)
+# into a DataFrame with the columns of the table
+def query_table(csv_file, start=None, end=None, ip=None, port=None, index=None):
+    import pandas as pd  # Pandas is only loaded to build the DataFrame
+    index = index or load_index(csv_file)
+    lines = [index.header]
+    with open(csv_file, 'rb') as f:
+        if ip is None and port is None:
+            for chunk in index.chunks_between(start, end):
+                f.seek(index.chunk_offsets[chunk])
+                lines.append(f.read(index.chunk_end(chunk) - index.chunk_offsets[chunk]))
+        else:
+            for offset in index.postings(ip, port, start, end):
+                f.seek(offset)
+                lines.append(f.readline())
+    df = pd.read_csv(io.BytesIO(b''.join(lines)))
+    if start is not None:
+        df = df[df["Timestamp"] >= start]
+    if end is not None:
+        df = df[df["Timestamp"] <= end]
+    return df.reset_index(drop=True)
+
+
+# Function to compute the statistics of the packets of a capture that match a query: the analyzers are
+# filled with the selected packets only, so the results are those of scripts A-G restricted to the query
+def query_statistics(pcap_file, analyzer_classes, start=None, end=None, ip=None, port=None):
+    analyzers = [analyzer_class() for analyzer_class in analyzer_classes]
+    return analyze_packets(query_capture(pcap_file, start, end, ip, port), analyzers)
+
+
+# Function to read a query time: seconds since the epoch, an ISO date and time, or a time of day
+# (HH:MM[:SS], local time) on the day of the given reference timestamp
+def parse_time(text, reference=None):
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        clock = day_time.fromisoformat(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+    day = datetime.fromtimestamp(reference).date() if reference is not None else datetime.now().date()
+    return datetime.combine(day, clock).timestamp()
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    from pcap_analysis import ANALYZERS, DEFAULT_ANALYZER_NAMES, format_text, summarize_result  # Importing the CLI output
+
+    parser = argparse.ArgumentParser(description="Statistics of the packets of a capture (or rows of a CSV table) "
+                                                 "in a time range and/or of an IP address or port, using an index.")
+    parser.add_argument('file', help="capture (.pcapng/.pcap) or CSV traffic table")
+    parser.add_argument('--ip', help="IP address (source or destination)")
+    parser.add_argument('--port', type=int, help="port (source or destination)")
+    parser.add_argument('--start', help="start time: epoch seconds, ISO date and time, or HH:MM[:SS] on the capture day")
+    parser.add_argument('--end', help="end time, in the same formats")
+    parser.add_argument('-a', '--analyzers', nargs='+', choices=DEFAULT_ANALYZER_NAMES, default=DEFAULT_ANALYZER_NAMES,
+                        help="analyzers to run on the selected packets of a capture")
+    options = parser.parse_args()
+
+    file_index = load_index(options.file)
+    first_time = min(file_index.chunk_first_times) if file_index.count else None
+    start_time = parse_time(options.start, first_time) if options.start else None
+    end_time = parse_time(options.end, first_time) if options.end else None
+
+    if file_index.kind == TABLE_KIND:
+        import atkr_part_A  # Importing the statistics of the traffic tables
+        rows = query_table(options.file, start_time, end_time, options.ip, options.port, file_index)
+        statistics = atkr_part_A.compute_statistics(rows)
+        print(f"{len(rows):,} rows of {file_index.count:,}")
+        print(statistics["ip_stats"].head(10).to_string())
+        print(statistics["port_stats"].head(10).to_string())
+        print(f"Average packet size: {statistics['average_packet_size']:.2f}, flow volume: {statistics['flow_volume']:,}")
+    else:
+        results = query_statistics(options.file, [ANALYZERS[name][0] for name in options.analyzers],
+                                   start_time, end_time, options.ip, options.port)
+        summaries = {name: summarize_result(name, result) for name, result in zip(options.analyzers, results)}
+        print(format_text(options.file, summaries))
@@ -0,0 +1,238 @@
+import argparse  # Import argparse to read the command-line options
+import io  # Import io to write the summary table into memory before saving it
+import os  # Import os to interact with the filesystem
+
+from packet_engine import get_pcap_files  # Importing the pcap file lookup
+from traffic_table import get_traffic_files, load_traffic_data  # Importing the CSV/Parquet traffic table loader
+from parallel_runner import map_files  # Importing the runner that spreads files over CPU cores
+from result_cache import write_atomically  # Importing the atomic file writer
+from instrumentation import stage  # Importing the opt-in stage timers
+
+
+# Summary settings (can be overridden from the environment)
+SUMMARY_FILE = os.environ.get('PCAP_SUMMARY_FILE', 'traffic_summary.csv')  # One row per capture or traffic table
+SUMMARY_VERSION = 1  # Increase when summarize_traffic changes, so stored summaries are recomputed
+CSV_DIR = 'csv_files'  # Directory where CSV (and Parquet) files are stored
+
+PERCENTILES = [50, 90, 99]  # Percentiles of the packet sizes and inter-arrival times
+TOP_PORTS = 5  # Ports kept per source
+# Inter-arrival times are summarized as the share of gaps per decade: below 1 us, 1-10 us, ..., 10-100 s, from 100 s
+INTER_ARRIVAL_EDGES = [1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0, 100.0]
+INTER_ARRIVAL_COLUMNS = [f'inter_arrival_share_lt_{edge:g}' for edge in INTER_ARRIVAL_EDGES] + \
+                        [f'inter_arrival_share_ge_{INTER_ARRIVAL_EDGES[-1]:g}']
+
+# Columns of the summary table: the file fingerprint, then the statistics
+FILE_COLUMNS = ['source', 'path', 'file_size', 'file_mtime_ns', 'version']
+STATISTIC_COLUMNS = (['packets', 'bytes', 'duration', 'mean_size'] + [f'size_p{p}' for p in PERCENTILES]
+                     + ['mean_inter_arrival'] + [f'inter_arrival_p{p}' for p in PERCENTILES]
+                     + INTER_ARRIVAL_COLUMNS + ['top_ports'])
+SUMMARY_COLUMNS = FILE_COLUMNS + STATISTIC_COLUMNS
+
+
+# Function to get the name of the traffic source of a file (zoom_analysis.csv and zoom.pcapng are both 'zoom')
+def source_name(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[:-len('_analysis')] if name.endswith('_analysis') else name
+
+
+# Function to summarize the IP packets of one source with whole-column operations:
+# volume, packet size and inter-arrival percentiles, inter-arrival shares per decade, and the top ports
+# (source and destination ports together, as in atkr_part_A). Percentiles are nearest-rank values.
+def summarize_traffic(df):
+    import numpy as np  # NumPy is only loaded to compute the summaries
+    timestamps = df["Timestamp"].to_numpy(np.float64)
+    sizes = df["Size"].to_numpy(np.int64)
+    summary = {'packets': len(sizes), 'bytes': int(sizes.sum()),
+               'duration': float(timestamps.max() - timestamps.min()) if len(sizes) else 0.0,
+               'mean_size': float(sizes.mean()) if len(sizes) else None}
+    for p in PERCENTILES:
+        summary[f'size_p{p}'] = float(np.percentile(sizes, p, method='inverted_cdf')) if len(sizes) else None
+
+    gaps = np.diff(timestamps)  # Time between consecutive packets, in file order
+    summary['mean_inter_arrival'] = float(gaps.mean()) if len(gaps) else None
+    for p in PERCENTILES:
+        summary[f'inter_arrival_p{p}'] = float(np.percentile(gaps, p, method='inverted_cdf')) if len(gaps) else None
+    counts = np.bincount(np.searchsorted(INTER_ARRIVAL_EDGES, gaps, side='right'), minlength=len(INTER_ARRIVAL_COLUMNS))
+    for column, count in zip(INTER_ARRIVAL_COLUMNS, counts):
+        summary[column] = count / len(gaps) if len(gaps) else 0.0
+
+    import pandas as pd  # Ports may be "Unknown" (CSV) or <NA> (Parquet, captures) when there is no transport layer
+    ports = np.concatenate([pd.to_numeric(df[column], errors="coerce").to_numpy(np.float64, na_value=np.nan)
+                            for column in ("Source Port", "Destination Port")])
+    port_counts = np.bincount(ports[~np.isnan(ports)].astype(np.int64), minlength=65536)
+    top = np.argsort(-port_counts, kind='stable')[:TOP_PORTS]  # Most used first, lowest port first on ties
+    summary['top_ports'] = ' '.join(f'{port}:{port_counts[port]}' for port in top if port_counts[port])
+    return summary
+
+
+# Function to compute the summary row of one capture or traffic table (captures are read into a packet store,
+# so a capture and its converted table give the same summary)
+def summarize_file(path):
+    df = load_traffic_data(path, ["Timestamp", "Size", "Source Port", "Destination Port"])
+    with stage('analyze', 'comparative_summary', items=len(df)):
+        summary = summarize_traffic(df)
+    stat = os.stat(path)
+    return dict(source=source_name(path), path=os.path.abspath(path), file_size=stat.st_size,
+                file_mtime_ns=stat.st_mtime_ns, version=SUMMARY_VERSION, **summary)
+
+
+# Function to read the stored summary table (an empty table when there is none yet)
+def load_summary_table(summary_file=SUMMARY_FILE):
+    import pandas as pd  # Pandas is only loaded to read the summary table
+    if not os.path.exists(summary_file):
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    return pd.read_csv(summary_file, keep_default_na=False, na_values=[''], dtype={'top_ports': str})
+
+
+# Function to check whether a stored summary row still describes the file (same size, mtime and summary version)
+def is_current(row):
+    try:
+        stat = os.stat(row['path'])
+    except OSError:
+        return False
+    return (row['file_size'] == stat.st_size and row['file_mtime_ns'] == stat.st_mtime_ns
+            and row['version'] == SUMMARY_VERSION)
+
+
+# Function to get the summaries of the given files, in their order. Only the files that are new or changed
+# since the last run are read (in parallel); the others come from the stored table, which is then updated.
+def update_summaries(paths, summary_file=SUMMARY_FILE, workers=None):
+    import pandas as pd  # Pandas is only loaded to build the summary table
+    table = load_summary_table(summary_file)
+    rows = {row['path']: row for row in table.to_dict('records') if is_current(row)}  # Rows of deleted files are dropped
+    paths = [os.path.abspath(path) for path in paths]
+    missing = [path for path in dict.fromkeys(paths) if path not in rows]
+    for path, row in zip(missing, map_files(summarize_file, missing, workers)):
+        rows[path] = row
+    if missing or len(rows) != len(table):
+        buffer = io.StringIO()
+        pd.DataFrame(list(rows.values()), columns=SUMMARY_COLUMNS).to_csv(buffer, index=False)
+        directory = os.path.dirname(os.path.abspath(summary_file))
+        os.makedirs(directory, exist_ok=True)
+        write_atomically(os.path.join(directory, os.path.basename(summary_file)), buffer.getvalue().encode())
+    print(f"{len(missing)} of {len(paths)} sources summarized, the others taken from {summary_file}")
+    return pd.DataFrame([rows[path] for path in paths], columns=SUMMARY_COLUMNS)
+
+
+# Function to format the summaries as a text table, one column per source
+def format_comparison(summary):
+    names = list(summary['source'])
+    width = max([12] + [len(name) for name in names])
+    lines = [f"{'':<22}" + ''.join(f"{name:>{width + 2}}" for name in names)]
+    for column in STATISTIC_COLUMNS:
+        values = []
+        for value in summary[column]:
+            if isinstance(value, str) or value is None or value != value:  # Text, or missing (NaN)
+                values.append(value.split(' ')[0] if isinstance(value, str) and value else '-')  # Top port only
+            elif column in ('packets', 'bytes'):
+                values.append(f'{int(value):,}')
+            else:
+                values.append(f'{value:.4g}')
+        label = 'top_port' if column == 'top_ports' else \
+            column.replace('inter_arrival_share_lt_', 'gaps < ').replace('inter_arrival_share_ge_', 'gaps >= ')
+        lines.append(f"{label:<22}" + ''.join(f"{value:>{width + 2}}" for value in values))
+    return '\n'.join(lines)
+
+
+# Function to get the port counts of a 'top_ports' value ('443:1200 53:80' -> {'443': 1200, '53': 80})
+def parse_top_ports(value):
+    if not isinstance(value, str) or not value:
+        return {}
+    return {port: int(count) for port, count in (item.split(':') for item in value.split(' '))}
+
+
+# Function to plot the sources side by side: packet sizes, volume, inter-arrival distribution and top ports
+def plot_comparison(summary):
+    import matplotlib.pyplot as plt  # Matplotlib is only loaded when plotting
+    import numpy as np  # NumPy is only loaded to place the grouped bars
+    names = list(summary['source'])
+    positions = np.arange(len(names))
+
+    # Packet size statistics, grouped per source
+    columns = ['mean_size'] + [f'size_p{p}' for p in PERCENTILES]
+    width = 0.8 / len(columns)
+    plt.figure(figsize=(12, 6))
+    for index, column in enumerate(columns):
+        plt.bar(positions + index * width, summary[column].fillna(0), width, label=column.replace('size_', ''))
+    plt.xticks(positions + width * (len(columns) - 1) / 2, names, rotation=45, ha="right")
+    plt.ylabel("Packet Size (bytes)")
+    plt.title("Packet Sizes per Source")
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
+
+    # Total bytes, with the packet count on top of every bar
+    plt.figure(figsize=(12, 6))
+    bars = plt.bar(names, summary['bytes'], color='purple')
+    for bar, packets in zip(bars, summary['packets']):
+        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), f'{int(packets):,} packets',
+                 ha='center', va='bottom')
+    plt.xticks(rotation=45, ha="right")
+    plt.ylabel("Total Bytes Transmitted")
+    plt.title("Flow Volume per Source")
+    plt.tight_layout()
+    plt.show()
+
+    # Share of inter-arrival times per decade, one line per source
+    labels = [f'<{edge:g}' for edge in INTER_ARRIVAL_EDGES] + [f'>={INTER_ARRIVAL_EDGES[-1]:g}']
+    plt.figure(figsize=(12, 6))
+    for name, (_, row) in zip(names, summary[INTER_ARRIVAL_COLUMNS].iterrows()):
+        plt.plot(labels, row.to_numpy(float) * 100, marker='o', label=name)
+    plt.xlabel("Inter-Arrival Time (Seconds)")
+    plt.ylabel("Share of Gaps (%)")
+    plt.title("Inter-Arrival Time Distribution per Source")
+    plt.grid(axis="y", linestyle="--", alpha=0.7)
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
+
+    # Share of port occurrences of the top ports of all sources, grouped per port
+    port_counts = [parse_top_ports(value) for value in summary['top_ports']]
+    ports = sorted({port for counts in port_counts for port in counts}, key=int)
+    if ports:
+        width = 0.8 / len(names)
+        port_positions = np.arange(len(ports))
+        plt.figure(figsize=(12, 6))
+        for index, (name, counts, packets) in enumerate(zip(names, port_counts, summary['packets'])):
+            shares = [counts.get(port, 0) / (2 * packets) * 100 if packets else 0 for port in ports]
+            plt.bar(port_positions + index * width, shares, width, label=name)
+        plt.xticks(port_positions + width * (len(names) - 1) / 2, ports, rotation=45, ha="right")
+        plt.xlabel("Port")
+        plt.ylabel("Share of Port Occurrences (%)")
+        plt.title("Top Ports per Source")
+        plt.legend()
+        plt.tight_layout()
+        plt.show()
+
+
+# Function to turn the inputs (captures, traffic tables or directories of them) into a list of files
+def expand_inputs(inputs):
+    paths = []
+    for path in inputs:
+        paths.extend(sorted(get_pcap_files(path) + get_traffic_files(path)) if os.path.isdir(path) else [path])
+    return paths
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    parser = argparse.ArgumentParser(description="Compare traffic sources side by side from a stored summary table.")
+    parser.add_argument('inputs', nargs='*', default=[CSV_DIR], help="captures, traffic tables or directories")
+    parser.add_argument('--summary-file', default=SUMMARY_FILE, help="stored summary table")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU core)")
+    parser.add_argument('--output', help="directory to save the comparison figures in, instead of showing them")
+    parser.add_argument('--no-plot', action='store_true', help="only print the comparison table")
+    options = parser.parse_args()
+
+    summary = update_summaries(expand_inputs(options.inputs), options.summary_file, options.workers)
+    print(format_comparison(summary))
+    if options.no_plot or summary.empty:
+        raise SystemExit
+    if options.output:
+        from report_renderer import render_plots  # Importing the headless figure renderer
+        os.makedirs(options.output, exist_ok=True)
+        images, messages, seconds = render_plots([('Comparison', plot_comparison, (summary,))], options.output)[0]
+        print(f"{len(images)} figures saved to {options.output}")
+    else:
+        plot_comparison(summary)
@@ -0,0 +1,184 @@
+import socket  # Import socket to pack IP addresses into bytes
+from array import array  # Import array to store the flow counters in compact typed columns
+
+
+# Flow timeouts in seconds: a flow ends after this long without packets (idle)
+# or once it has lasted this long (active), like NetFlow/IPFIX exporters
+DEFAULT_IDLE_TIMEOUT = 15.0
+DEFAULT_ACTIVE_TIMEOUT = 1800.0
+
+# IP protocol numbers of the transport layers in PacketInfo (0 = no transport layer with ports)
+PROTOCOL_NUMBERS = {'TCP': 6, 'UDP': 17, 'DCCP': 33, 'SCTP': 132}
+
+
+# Function to pack an IP address and port into bytes (4 + 2 bytes for IPv4, 16 + 2 bytes for IPv6)
+def pack_endpoint(ip, port):
+    family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+    return socket.inet_pton(family, ip) + (port or 0).to_bytes(2, 'big')
+
+
+# Function to build the bidirectional 5-tuple key of a packet as a compact bytes object.
+# Both directions of a conversation get the same key because the endpoints are sorted.
+def flow_key(packet):
+    endpoint_a = pack_endpoint(packet.ip_src, packet.src_port)
+    endpoint_b = pack_endpoint(packet.ip_dst, packet.dst_port)
+    if endpoint_a > endpoint_b:
+        endpoint_a, endpoint_b = endpoint_b, endpoint_a
+    return bytes([PROTOCOL_NUMBERS.get(packet.transport, 0)]) + endpoint_a + endpoint_b
+
+
+# Function to turn a flow key back into (protocol, ip_a, port_a, ip_b, port_b)
+def unpack_flow_key(key):
+    protocol = key[0]
+    address_length = 4 if len(key) == 13 else 16
+    family = socket.AF_INET if address_length == 4 else socket.AF_INET6
+    endpoint_length = address_length + 2
+    endpoints = []
+    for start in (1, 1 + endpoint_length):
+        ip = socket.inet_ntop(family, key[start:start + address_length])
+        port = int.from_bytes(key[start + address_length:start + endpoint_length], 'big')
+        endpoints.append((ip, port))
+    (ip_a, port_a), (ip_b, port_b) = endpoints
+    return protocol, ip_a, port_a, ip_b, port_b
+
+
+# Class to store finished flows in parallel typed columns (about 40 bytes per flow plus its key)
+class FlowRecords:
+    def __init__(self):
+        self.keys = []  # Flow keys (see flow_key)
+        self.packets = array('Q')  # Number of packets of every flow
+        self.bytes = array('Q')  # Number of bytes of every flow
+        self.first_timestamps = array('d')  # Timestamp of the first packet
+        self.last_timestamps = array('d')  # Timestamp of the last packet
+
+    def __len__(self):
+        return len(self.keys)
+
+    def append(self, key, packets, total_bytes, first_timestamp, last_timestamp):
+        self.keys.append(key)
+        self.packets.append(packets)
+        self.bytes.append(total_bytes)
+        self.first_timestamps.append(first_timestamp)
+        self.last_timestamps.append(last_timestamp)
+
+    def extend(self, other):
+        self.keys.extend(other.keys)
+        self.packets.extend(other.packets)
+        self.bytes.extend(other.bytes)
+        self.first_timestamps.extend(other.first_timestamps)
+        self.last_timestamps.extend(other.last_timestamps)
+
+    def copy(self):
+        records = FlowRecords()
+        records.extend(self)
+        return records
+
+    # Duration of every flow in seconds
+    def durations(self):
+        return array('d', (last - first for first, last in zip(self.first_timestamps, self.last_timestamps)))
+
+    # Function to iterate over the flows as (protocol, ip_a, port_a, ip_b, port_b, packets, bytes, first, last, duration)
+    def rows(self):
+        for index, key in enumerate(self.keys):
+            first, last = self.first_timestamps[index], self.last_timestamps[index]
+            yield unpack_flow_key(key) + (self.packets[index], self.bytes[index], first, last, last - first)
+
+
+# Class to aggregate packets into flows incrementally.
+# Active flows live in typed columns indexed by a slot number; a dictionary maps each flow key to its slot,
+# and the slots of finished flows are reused, so memory only depends on the number of concurrent flows.
+class FlowTable:
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, active_timeout=DEFAULT_ACTIVE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.slots = {}  # Flow key -> slot of the active flow
+        self.keys = []  # Flow key of every slot (None for a free slot)
+        self.packets = array('Q')
+        self.bytes = array('Q')
+        self.first_timestamps = array('d')
+        self.last_timestamps = array('d')
+        self.free_slots = []  # Slots of finished flows, ready to be reused
+        self.finished = FlowRecords()  # Flows that ended because of a timeout
+        self.next_sweep = None  # Capture time of the next scan for idle flows
+
+    def __len__(self):
+        return len(self.slots)  # Number of active flows
+
+    # Add one packet to its flow
+    def add(self, key, timestamp, length):
+        slot = self.slots.get(key)
+        if slot is not None:
+            if (timestamp - self.last_timestamps[slot] > self.idle_timeout
+                    or timestamp - self.first_timestamps[slot] > self.active_timeout):
+                self.expire(slot)  # The packet starts a new flow with the same key
+            else:
+                self.packets[slot] += 1
+                self.bytes[slot] += length
+                self.last_timestamps[slot] = timestamp
+                return
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.keys[slot] = key
+            self.packets[slot] = 1
+            self.bytes[slot] = length
+            self.first_timestamps[slot] = timestamp
+            self.last_timestamps[slot] = timestamp
+        else:
+            slot = len(self.keys)
+            self.keys.append(key)
+            self.packets.append(1)
+            self.bytes.append(length)
+            self.first_timestamps.append(timestamp)
+            self.last_timestamps.append(timestamp)
+        self.slots[key] = slot
+
+        # Regularly end the flows that have been idle for too long
+        if self.next_sweep is None:
+            self.next_sweep = timestamp + self.idle_timeout
+        elif timestamp >= self.next_sweep:
+            self.sweep(timestamp)
+            self.next_sweep = timestamp + self.idle_timeout
+
+    # Move the flow of a slot to the finished flows and free the slot
+    def expire(self, slot):
+        key = self.keys[slot]
+        self.finished.append(key, self.packets[slot], self.bytes[slot],
+                             self.first_timestamps[slot], self.last_timestamps[slot])
+        del self.slots[key]
+        self.keys[slot] = None
+        self.free_slots.append(slot)
+
+    # End every flow without packets since more than the idle timeout
+    def sweep(self, now):
+        keys = self.keys
+        last_timestamps = self.last_timestamps
+        for slot in range(len(keys)):
+            if keys[slot] is not None and now - last_timestamps[slot] > self.idle_timeout:
+                self.expire(slot)
+
+    # Get all flows: the finished ones followed by the ones that are still active
+    def records(self):
+        records = self.finished.copy()
+        for key, slot in self.slots.items():
+            records.append(key, self.packets[slot], self.bytes[slot],
+                           self.first_timestamps[slot], self.last_timestamps[slot])
+        return records
+
+
+# Class to build the flow table of a capture (used by F_flow_size and G_flow_volume)
+class FlowTableAnalyzer:
+    sequential = True  # A flow can span a chunk boundary, so the capture must be read in one piece
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, active_timeout=DEFAULT_ACTIVE_TIMEOUT):
+        self.table = FlowTable(idle_timeout, active_timeout)
+
+    def process(self, packet):
+        if packet.ip_version is not None:  # Only IP packets belong to a flow
+            self.table.add(flow_key(packet), packet.timestamp, packet.length)
+
+    def result(self):
+        return self.table.records()
+
+    def merge(self, other):
+        self.table.finished.extend(other.table.records())  # Flows of different files are never joined
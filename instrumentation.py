@@ -0,0 +1,268 @@
+import atexit  # Import atexit to write the metrics when a run ends
+import itertools  # Import itertools to number the profiles of a process
+import json  # Import json to export the metrics summary
+import multiprocessing  # Import multiprocessing to tell the main process from the workers
+import os  # Import os to read the settings from the environment
+import sys  # Import sys to sample the stacks of the running threads
+import threading  # Import threading to run the stack sampler next to the analysis
+import time  # Import time for the stage timers
+from collections import Counter, defaultdict  # Importing containers for the counters and stack samples
+from contextlib import contextmanager  # Import contextmanager to time a stage with a with-block
+
+
+# Instrumentation settings (can be overridden from the environment)
+METRICS_ENABLED = os.environ.get('PCAP_METRICS', '0') == '1'  # PCAP_METRICS=1 times every stage of a run
+PROFILE_MODE = os.environ.get('PCAP_PROFILE', '')  # 'cprofile' or 'sample' (also enables the metrics)
+METRICS_DIR = os.environ.get('PCAP_METRICS_DIR', 'metrics')  # Where the summaries and profiles are written
+SAMPLE_INTERVAL = float(os.environ.get('PCAP_SAMPLE_INTERVAL', 0.001))  # Seconds between two stack samples
+METRICS_ENABLED = METRICS_ENABLED or PROFILE_MODE in ('cprofile', 'sample')
+
+RUN_ID_VARIABLE = 'PCAP_RUN_ID'  # Environment variable holding the run identifier, set by start_run
+
+# Stages of a run, in pipeline order
+STAGES = ('read', 'decode', 'analyze', 'aggregate', 'serialize', 'plot')
+
+PROFILE_NUMBERS = itertools.count()  # A worker can profile several calls, each one gets its own file
+RUN_STARTED = []  # The profiler of the run once start_run was called in this process
+
+
+# Class to accumulate the time, calls and items of every stage (and of the parts of a stage, such as each analyzer)
+class StageMetrics:
+    def __init__(self):
+        self.seconds = defaultdict(float)  # (stage, detail) -> seconds
+        self.calls = defaultdict(int)  # (stage, detail) -> number of timed calls
+        self.items = defaultdict(int)  # (stage, detail) -> packets, rows or figures handled
+
+    def add(self, stage, detail, seconds, calls=1, items=0):
+        key = (stage, detail)
+        self.seconds[key] += seconds
+        self.calls[key] += calls
+        self.items[key] += items
+
+    def merge(self, other):
+        for key in other.seconds:
+            self.add(key[0], key[1], other.seconds[key], other.calls[key], other.items[key])
+
+    def clear(self):
+        self.seconds.clear()
+        self.calls.clear()
+        self.items.clear()
+
+    # Function to get the metrics as a list of rows, in stage order
+    def rows(self):
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        keys = sorted(self.seconds, key=lambda key: (order.get(key[0], len(STAGES)), key[0], key[1]))
+        return [{'stage': stage, 'detail': detail, 'seconds': self.seconds[(stage, detail)],
+                 'calls': self.calls[(stage, detail)], 'items': self.items[(stage, detail)]}
+                for stage, detail in keys]
+
+    # Function to export the metrics in the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = []
+        for name, values, help_text in (
+                ('pcap_stage_seconds_total', self.seconds, 'Time spent in each stage of the analysis'),
+                ('pcap_stage_calls_total', self.calls, 'Timed calls of each stage'),
+                ('pcap_stage_items_total', self.items, 'Packets, rows or figures handled by each stage')):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for row in self.rows():
+                key = (row['stage'], row['detail'])
+                lines.append(f'{name}{{stage="{row["stage"]}",detail="{row["detail"]}"}} {values[key]}')
+        return '\n'.join(lines) + '\n'
+
+    # Function to format the metrics as a table, with every stage's share of the total time
+    def format_table(self):
+        rows = self.rows()
+        total = sum(row['seconds'] for row in rows)  # Every measured interval belongs to exactly one row
+        lines = [f"{'stage':<10} {'detail':<32} {'seconds':>9} {'share':>6} {'calls':>9} {'items':>11}"]
+        for row in rows:
+            share = row['seconds'] / total * 100 if total else 0.0
+            lines.append(f"{row['stage']:<10} {row['detail'][:32]:<32} {row['seconds']:>9.3f} {share:>5.1f}% "
+                         f"{row['calls']:>9,} {row['items']:>11,}")
+        return '\n'.join(lines)
+
+
+METRICS = StageMetrics()  # Metrics of this process
+
+
+# Context manager to time a block of code as one call of a stage
+@contextmanager
+def stage(name, detail='', items=0):
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.add(name, detail, time.perf_counter() - start, items=items)
+
+
+# Function to iterate over a source (of raw packets) and convert every item, timing both steps separately.
+# Items for which convert raises one of the 'skip' exceptions are dropped. The times are added once at the end,
+# so the per-item cost is two clock reads.
+def timed_conversion(source, convert, source_stage='read', convert_stage='decode', detail='', skip=()):
+    source = iter(source)
+    clock = time.perf_counter
+    source_seconds = convert_seconds = 0.0
+    count = 0
+    try:
+        while True:
+            start = clock()
+            try:
+                item = next(source)
+            except StopIteration:
+                source_seconds += clock() - start
+                return
+            middle = clock()
+            try:
+                converted = convert(item)
+            except skip:
+                converted = None
+            end = clock()
+            source_seconds += middle - start
+            convert_seconds += end - middle
+            count += 1
+            if converted is not None:
+                yield converted
+    finally:
+        METRICS.add(source_stage, detail, source_seconds, items=count)
+        METRICS.add(convert_stage, detail, convert_seconds, items=count)
+
+
+# Class to sample the stacks of a thread at a fixed interval and count them in the folded format
+# of flamegraph.pl and speedscope ("outer;inner;innermost count")
+class StackSampler:
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.stacks
+
+
+# Function to start the profiler of this process for the configured mode (None when profiling is off)
+def start_profiler():
+    if PROFILE_MODE == 'cprofile':
+        import cProfile  # Imported here because profiling is opt-in
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if PROFILE_MODE == 'sample':
+        return StackSampler().start()
+    return None
+
+
+# Function to stop a profiler; returns the folded stack counts of a sampler (None for cProfile,
+# whose statistics are written to a .prof file of this process)
+def stop_profiler(profiler):
+    if profiler is None:
+        return None
+    if isinstance(profiler, StackSampler):
+        return profiler.stop()
+    profiler.disable()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(METRICS_DIR, f'{run_id()}_{os.getpid()}_{next(PROFILE_NUMBERS)}.prof'))
+    return None
+
+
+# Function run in a worker process: call function(*args) and return its result with the metrics
+# (and stack samples) of the call, so the main process can add them to the metrics of the run
+def run_measured(function, *args):
+    METRICS.clear()
+    profiler = start_profiler()
+    try:
+        result = function(*args)
+    finally:
+        stacks = stop_profiler(profiler)
+    metrics = StageMetrics()
+    metrics.merge(METRICS)
+    return result, metrics, stacks
+
+
+SAMPLED_STACKS = Counter()  # Stack samples of the run (main process and workers)
+
+
+# Function to add the metrics and stack samples returned by run_measured to those of this process
+def collect_measured(metrics, stacks):
+    METRICS.merge(metrics)
+    if stacks:
+        SAMPLED_STACKS.update(stacks)
+
+
+# Function to write the metrics of the run as JSON and Prometheus text (and the folded stacks of the sampler)
+def write_metrics(directory=METRICS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, run_id())
+    summary = {
+        'run': run_id(),
+        'command': ' '.join(sys.argv),
+        'stages': METRICS.rows(),
+    }
+    with open(base + '.json', 'w') as f:
+        json.dump(summary, f, indent=1)
+    with open(base + '.prom', 'w') as f:
+        f.write(METRICS.to_prometheus())
+    if SAMPLED_STACKS:
+        with open(base + '.folded', 'w') as f:
+            for stack, count in SAMPLED_STACKS.most_common():
+                f.write(f'{stack} {count}\n')
+    return base
+
+
+# Function called when the main process exits: stop its profiler, print the stage table and write the files
+def finish_run(profiler):
+    stacks = stop_profiler(profiler)
+    if stacks:
+        SAMPLED_STACKS.update(stacks)
+    if not METRICS.seconds and not SAMPLED_STACKS:
+        return  # Nothing was measured (the script did not analyze anything)
+    base = write_metrics()
+    print(METRICS.format_table(), file=sys.stderr)
+    print(f"Metrics written to {base}.json and {base}.prom"
+          f"{f' (stacks in {base}.folded)' if SAMPLED_STACKS else ''}", file=sys.stderr)
+
+
+# Function to create a new run identifier (start time and process ID)
+def new_run_id():
+    return time.strftime('%Y%m%d_%H%M%S') + f'_{os.getpid()}'
+
+
+PROCESS_RUN_ID = new_run_id()  # Identifier used when no run was started (a library caller that did not call start_run)
+
+
+# Function to get the identifier of the run. Worker processes inherit it from the environment set by start_run,
+# so their profiles are written next to the ones of the main process.
+def run_id():
+    return os.environ.get(RUN_ID_VARIABLE) or PROCESS_RUN_ID
+
+
+# Function called by the command-line entry points (never on import): with PCAP_METRICS or PCAP_PROFILE,
+# the main process gets a new run identifier and profiles itself until it exits, then writes the metrics.
+# Calling it again in the same process (a tool run through pcap_analysis) has no effect.
+def start_run():
+    if not METRICS_ENABLED or RUN_STARTED or multiprocessing.parent_process() is not None:
+        return
+    os.environ.setdefault(RUN_ID_VARIABLE, new_run_id())  # Unless it was chosen in the environment
+    RUN_STARTED.append(start_profiler())
+    atexit.register(finish_run, RUN_STARTED[0])
@@ -0,0 +1,223 @@
+import argparse  # Import argparse to read the command line options
+import json  # Import json to print the statistics as JSON lines
+import queue  # Import queue to hand the packets from the reader thread to the statistics
+import subprocess  # Import subprocess to capture from a network interface with dumpcap
+import sys  # Import sys to read the capture pipe from stdin
+import threading  # Import threading to read the packets while waiting for them with a timeout
+import time  # Import time to move the capture clock on while no packet arrives
+from collections import deque  # Import deque to keep the time buckets in order
+
+from packet_engine import (IPStatsAnalyzer, TCPPortAnalyzer, TLSVersionAnalyzer, AveragePacketSizeAnalyzer,
+                           FlowVolumeAnalyzer, iter_pyshark_live)  # Importing the analyzers shared with scripts A-G
+from accumulators import InterArrivalHistogramAnalyzer  # Importing the fixed-memory inter-arrival time analyzer
+from parallel_runner import stitch_analyzers  # Importing the function that joins consecutive parts of a capture
+
+
+# Sliding windows (in seconds) and how often the statistics are printed (in seconds of capture time)
+DEFAULT_WINDOWS = [10, 60, 300]
+DEFAULT_INTERVAL = 5.0
+BUCKET_WIDTH = 1.0  # Packets are grouped into buckets of this many seconds; windows are made of whole buckets
+TOP_COUNT = 5  # Number of IP addresses and ports shown per window
+PACKET_QUEUE_SIZE = 10000  # Packets read ahead by the reader thread
+
+# Analyzers used in live mode; TLS needs a tshark dissection and is only added with --tls
+LIVE_ANALYZERS = [IPStatsAnalyzer, TCPPortAnalyzer, AveragePacketSizeAnalyzer, InterArrivalHistogramAnalyzer,
+                  FlowVolumeAnalyzer]
+
+
+# Class to keep the statistics of the last few minutes of a packet stream.
+# Every bucket of BUCKET_WIDTH seconds has its own analyzers; a window joins the buckets it covers,
+# and buckets older than the largest window are dropped; as inter-arrival times are kept in a
+# fixed-memory accumulator, memory only depends on the number of buckets and endpoints.
+class RollingStatistics:
+    def __init__(self, analyzer_classes=LIVE_ANALYZERS, windows=DEFAULT_WINDOWS, bucket_width=BUCKET_WIDTH):
+        self.analyzer_classes = analyzer_classes
+        self.windows = sorted(windows)
+        self.bucket_width = bucket_width
+        self.buckets = deque()  # (bucket start time, analyzers), oldest first
+        self.now = None  # Timestamp of the latest packet
+
+    def process(self, packet):
+        bucket_start = packet.timestamp - packet.timestamp % self.bucket_width
+        if not self.buckets or bucket_start > self.buckets[-1][0]:
+            self.buckets.append((bucket_start, [analyzer_class() for analyzer_class in self.analyzer_classes]))
+            self.expire(bucket_start)
+        for analyzer in self.buckets[-1][1]:  # Late packets are counted in the latest bucket
+            analyzer.process(packet)
+        self.now = packet.timestamp if self.now is None else max(self.now, packet.timestamp)
+
+    # Move the clock on to 'now' without a packet (on an idle interface), so the windows empty out
+    def advance(self, now):
+        self.now = now if self.now is None else max(self.now, now)
+        self.expire(self.now)
+
+    # Drop the buckets that no window covers any more
+    def expire(self, now):
+        oldest = now - self.windows[-1]
+        while self.buckets and self.buckets[0][0] + self.bucket_width <= oldest:
+            self.buckets.popleft()
+
+    # Function to get the analyzers of the last 'seconds' seconds, joined in time order
+    def window(self, seconds):
+        analyzers = [analyzer_class() for analyzer_class in self.analyzer_classes]
+        if self.now is None:
+            return analyzers
+        start = self.now - seconds
+        parts = [bucket for bucket_start, bucket in self.buckets if bucket_start + self.bucket_width > start]
+        return stitch_analyzers([analyzers] + parts)  # The fresh analyzers collect the buckets
+
+    # Function to get a summary of every window
+    def summaries(self):
+        return [summarize_window(seconds, self.window(seconds)) for seconds in self.windows]
+
+
+# Function to get the most frequent keys of a counter dictionary
+def top_items(counts, count=TOP_COUNT):
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+# Function to build a summary of the analyzers of one window
+def summarize_window(seconds, analyzers):
+    summary = {'window': seconds}
+    for analyzer in analyzers:
+        if isinstance(analyzer, IPStatsAnalyzer):
+            summary['top_ips'] = top_items(analyzer.ip_stats)
+        elif isinstance(analyzer, TCPPortAnalyzer):
+            summary['top_ports'] = top_items(analyzer.tcp_stats)
+        elif isinstance(analyzer, TLSVersionAnalyzer):
+            summary['tls_versions'] = dict(analyzer.tls_stats)
+        elif isinstance(analyzer, AveragePacketSizeAnalyzer):
+            summary['packets'] = analyzer.packet_count
+            summary['average_packet_size'] = round(analyzer.result(), 1)
+        elif isinstance(analyzer, InterArrivalHistogramAnalyzer):
+            summary['mean_inter_arrival'] = analyzer.distribution.mean()
+            summary['p99_inter_arrival'] = analyzer.distribution.quantiles.quantile(0.99)
+        elif isinstance(analyzer, FlowVolumeAnalyzer):
+            summary['bytes'] = analyzer.total_bytes
+            summary['bytes_per_second'] = round(analyzer.total_bytes / seconds, 1)
+    return summary
+
+
+# Function to format a window summary as one line of text
+def format_summary(summary):
+    parts = [f"last {summary['window']:g}s"]
+    if 'packets' in summary:
+        parts.append(f"{summary['packets']} IP packets, avg {summary['average_packet_size']} B")
+    if 'bytes' in summary:
+        parts.append(f"{summary['bytes']} bytes ({summary['bytes_per_second']} B/s)")
+    if summary.get('mean_inter_arrival') is not None:
+        parts.append(f"mean gap {summary['mean_inter_arrival'] * 1000:.2f} ms, p99 {summary['p99_inter_arrival'] * 1000:.2f} ms")
+    if 'top_ips' in summary:
+        parts.append("top IPs " + ", ".join(f"{ip} ({count})" for ip, count in summary['top_ips']))
+    if 'top_ports' in summary:
+        parts.append("top ports " + ", ".join(f"{port} ({count})" for port, count in summary['top_ports']))
+    if 'tls_versions' in summary:
+        parts.append(f"TLS {summary['tls_versions']}")
+    return " | ".join(parts)
+
+
+# Function to read a packet stream in a background thread and yield its packets, or None every time no packet
+# arrived for 'timeout' seconds of wall-clock time. Errors of the stream are raised in the caller.
+def iter_with_timeout(packets, timeout):
+    items = queue.Queue(PACKET_QUEUE_SIZE)
+
+    def read():
+        try:
+            for packet in packets:
+                items.put((packet, None))
+            items.put((None, StopIteration()))
+        except BaseException as error:
+            items.put((None, error))
+
+    threading.Thread(target=read, daemon=True).start()  # A daemon, so Ctrl+C does not wait for the next packet
+    while True:
+        try:
+            packet, error = items.get(timeout=timeout)
+        except queue.Empty:
+            yield None
+            continue
+        if isinstance(error, StopIteration):
+            return
+        if error is not None:
+            raise error
+        yield packet
+
+
+# Function to feed a packet stream into the rolling statistics and print them every 'interval' seconds
+# of capture time (so a replay at a higher speed prints them more often in wall-clock time).
+# A None in the stream means no packet arrived for a while: the capture clock then moves on with the wall clock
+# from the latest packet, so reports keep coming and the windows empty out on an idle interface.
+def run_live(packets, rolling, interval=DEFAULT_INTERVAL, as_json=False, output=sys.stdout):
+    next_report = None
+    latest = None  # (capture time, wall-clock time) of the latest packet
+    for packet in packets:
+        if packet is None:
+            if latest is None:
+                report(rolling, as_json, output)  # No traffic yet: empty windows
+                continue
+            now = latest[0] + time.monotonic() - latest[1]
+            rolling.advance(now)
+        else:
+            rolling.process(packet)
+            now = packet.timestamp
+            latest = (now, time.monotonic())
+        if next_report is None:
+            next_report = now + interval
+        elif now >= next_report:
+            report(rolling, as_json, output)
+            next_report += interval * ((now - next_report) // interval + 1)  # Skip silent intervals
+    report(rolling, as_json, output)  # Final statistics when the stream ends
+
+
+# Function to print the summaries of all windows
+def report(rolling, as_json, output):
+    for summary in rolling.summaries():
+        summary['time'] = rolling.now
+        print(json.dumps(summary) if as_json else format_summary(summary), file=output)
+    if not as_json:
+        print(file=output)  # Blank line between reports
+    output.flush()
+
+
+# Function to start dumpcap on a network interface, writing pcapng to its stdout
+def open_interface_stream(interface):
+    return subprocess.Popen(['dumpcap', '-q', '-i', interface, '-w', '-'], stdout=subprocess.PIPE)
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    parser = argparse.ArgumentParser(description="Rolling-window statistics of live traffic")
+    parser.add_argument('source', help="network interface, or - to read a pcap/pcapng stream from stdin")
+    parser.add_argument('--windows', type=float, nargs='+', default=DEFAULT_WINDOWS, help="window sizes in seconds")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help="seconds between reports")
+    parser.add_argument('--tls', action='store_true', help="also count TLS versions (requires tshark)")
+    parser.add_argument('--json', action='store_true', help="print one JSON object per window")
+    args = parser.parse_args()
+
+    analyzer_classes = LIVE_ANALYZERS + [TLSVersionAnalyzer] if args.tls else LIVE_ANALYZERS
+    rolling = RollingStatistics(analyzer_classes, args.windows)
+
+    process = None
+    if args.tls:
+        # tshark dissects the traffic (the TLS layer is not decoded by the native reader)
+        if args.source == '-':
+            packets = iter_pyshark_live(pipe=sys.stdin)
+        else:
+            packets = iter_pyshark_live(interface=args.source)
+    else:
+        import pcapng_reader  # Native reader, decodes the header fields without tshark
+        if args.source == '-':
+            packets = pcapng_reader.iter_stream_packets(sys.stdin.buffer)
+        else:
+            process = open_interface_stream(args.source)
+            packets = pcapng_reader.iter_stream_packets(process.stdout)
+
+    try:
+        run_live(iter_with_timeout(packets, args.interval), rolling, args.interval, args.json)
+    except KeyboardInterrupt:
+        pass  # Stop capturing on Ctrl+C
+    finally:
+        if process is not None:
+            process.terminate()
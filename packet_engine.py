@@ -0,0 +1,347 @@
+from collections import defaultdict, namedtuple  # Importing containers for packet records and statistics
+import os  # Import os to interact with the filesystem
+import glob  # Import glob to find files matching a pattern
+import time  # Import time for the per-analyzer timers of the instrumented loop
+
+from accumulators import InterArrivalHistogramAnalyzer, PacketSizeHistogramAnalyzer  # Importing the fixed-memory distribution analyzers
+from instrumentation import METRICS, METRICS_ENABLED, timed_conversion  # Importing the opt-in stage timers
+
+
+# Packet reading backends: 'native' parses the pcapng blocks directly (header fields only),
+# 'pyshark' runs a full tshark dissection (needed for TLS fields),
+# 'tshark' runs the same dissection but reads only the needed fields from tshark, without PyShark
+PYSHARK_BACKEND = 'pyshark'
+NATIVE_BACKEND = 'native'
+TSHARK_BACKEND = 'tshark'
+DEFAULT_BACKEND = os.environ.get('PCAP_BACKEND', NATIVE_BACKEND)  # Can be overridden from the environment
+
+
+# Lightweight record holding only the packet fields the analyzers need.
+# Fields that are not present in a packet (no IP layer, no TCP/UDP layer, no TLS layer) are None.
+PacketInfo = namedtuple('PacketInfo', [
+    'timestamp',  # Arrival time of the packet (seconds since the epoch)
+    'length',  # Packet size in bytes
+    'ip_version',  # 4 for IPv4, 6 for IPv6
+    'ip_src',  # Source IP address
+    'ip_dst',  # Destination IP address
+    'transport',  # Transport layer name ('TCP' or 'UDP')
+    'src_port',  # Source port
+    'dst_port',  # Destination port
+    'tls_version',  # TLS record version
+])
+
+
+# Function to convert a PyShark packet into a PacketInfo record (each layer is decoded only once)
+def decode_pyshark_packet(packet):
+    timestamp = float(packet.sniff_time.timestamp())  # Extract arrival time of the packet
+    length = int(packet.length)  # Extract packet size in bytes
+
+    ip_version = ip_src = ip_dst = None
+    try:
+        if 'IP' in packet:  # Check if the packet contains an IP layer
+            ip_version = 4
+            ip_src = packet.ip.src  # Extract source IP address
+            ip_dst = packet.ip.dst  # Extract destination IP address
+        elif 'IPV6' in packet:  # Check if the packet contains an IPv6 layer
+            ip_version = 6
+            ip_src = packet.ipv6.src
+            ip_dst = packet.ipv6.dst
+    except AttributeError:
+        ip_version = ip_src = ip_dst = None  # Keep the IP fields empty if they are missing
+
+    transport = src_port = dst_port = None
+    try:
+        if 'TCP' in packet:  # Check if the packet contains a TCP layer
+            transport = 'TCP'
+            src_port = int(packet.tcp.srcport)  # Source port
+            dst_port = int(packet.tcp.dstport)  # Destination port
+        elif 'UDP' in packet:  # Check if the packet contains a UDP layer
+            transport = 'UDP'
+            src_port = int(packet.udp.srcport)  # Source port
+            dst_port = int(packet.udp.dstport)  # Destination port
+    except AttributeError:
+        transport = src_port = dst_port = None  # Ignore incomplete transport layers
+
+    tls_version = None
+    try:
+        if 'TLS' in packet and hasattr(packet.tls, 'record_version'):  # Check for a TLS record version
+            tls_version = packet.tls.record_version  # Extract the TLS version
+    except AttributeError:
+        pass  # Keep the TLS version empty if it is missing
+
+    return PacketInfo(timestamp, length, ip_version, ip_src, ip_dst, transport, src_port, dst_port, tls_version)
+
+
+# Function to read a pcap file with tshark and yield a PacketInfo record for every packet
+def iter_pyshark_packets(pcap_file):
+    import pyshark  # Imported here so the native backend works without PyShark and tshark
+    cap = pyshark.FileCapture(pcap_file, keep_packets=False)  # Open pcap file without storing packets in memory
+    try:
+        if METRICS_ENABLED:
+            # tshark dissection and PyShark object construction ('read') are timed apart from the field extraction
+            yield from timed_conversion(cap, decode_pyshark_packet, detail='pyshark', skip=(AttributeError, ValueError))
+            return
+        for packet in cap:
+            try:
+                yield decode_pyshark_packet(packet)
+            except (AttributeError, ValueError):
+                continue  # Ignore packets with missing attributes and proceed
+    finally:
+        cap.close()  # Close the pcap file to release resources
+
+
+# Function to dissect live traffic with tshark, from a network interface or from a capture pipe (such as stdin)
+def iter_pyshark_live(interface=None, pipe=None):
+    import pyshark  # Imported here so the native backend works without PyShark and tshark
+    if pipe is not None:
+        from pyshark.capture.pipe_capture import PipeCapture
+        cap = PipeCapture(pipe=pipe)
+    else:
+        cap = pyshark.LiveCapture(interface=interface)
+    try:
+        for packet in cap._packets_from_tshark_sync():  # What LiveCapture.sniff_continuously returns
+            try:
+                yield decode_pyshark_packet(packet)
+            except (AttributeError, ValueError):
+                continue  # Ignore packets with missing attributes and proceed
+    finally:
+        cap.close()  # Stop tshark
+
+
+# Function to read a pcap file once with the chosen backend and yield a PacketInfo record for every packet
+def iter_packets(pcap_file, backend=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend == PYSHARK_BACKEND:
+        return iter_pyshark_packets(pcap_file)
+    if backend == NATIVE_BACKEND:
+        import pcapng_reader  # Imported here because the reader itself depends on PacketInfo
+        return pcapng_reader.iter_packets(pcap_file)
+    if backend == TSHARK_BACKEND:
+        import tshark_pipeline  # Imported here because the pipeline itself depends on PacketInfo
+        return tshark_pipeline.iter_tshark_packets(pcap_file)
+    raise ValueError(f"Unknown packet backend: {backend}")
+
+
+# Class to count packets per IP address (used by A_IP_header_fields)
+class IPStatsAnalyzer:
+    def __init__(self):
+        self.ip_stats = defaultdict(int)  # Dictionary to store IP occurrences
+
+    def process(self, packet):
+        if packet.ip_version == 4:  # Only packets with an IP layer are counted
+            self.ip_stats[packet.ip_src] += 1  # Increment occurrence count for source IP
+            self.ip_stats[packet.ip_dst] += 1  # Increment occurrence count for destination IP
+
+    def result(self):
+        return self.ip_stats
+
+    def merge(self, other):
+        for ip, count in other.ip_stats.items():
+            self.ip_stats[ip] += count  # Add the counts of the other analyzer
+
+    # Multiply the counts by the sampling factor, to estimate the counts of the whole capture (see packet_sampling)
+    def scale(self, factor):
+        for ip, count in self.ip_stats.items():
+            self.ip_stats[ip] = round(count * factor)
+
+
+# Class to count packets per TCP port (used by B_TCP_header_fields)
+class TCPPortAnalyzer:
+    def __init__(self):
+        self.tcp_stats = defaultdict(int)  # Dictionary to count occurrences of each TCP port
+
+    def process(self, packet):
+        if packet.transport == 'TCP':  # Only TCP packets are counted
+            self.tcp_stats[str(packet.src_port)] += 1  # Ports are kept as strings so they plot as labels
+            self.tcp_stats[str(packet.dst_port)] += 1
+
+    def result(self):
+        return self.tcp_stats
+
+    def merge(self, other):
+        for port, count in other.tcp_stats.items():
+            self.tcp_stats[port] += count
+
+    def scale(self, factor):
+        for port, count in self.tcp_stats.items():
+            self.tcp_stats[port] = round(count * factor)
+
+
+# Class to count packets per TLS record version (used by C_TLS_header_fields)
+class TLSVersionAnalyzer:
+    requires_dissection = True  # TLS fields are only available from the tshark dissection
+
+    def __init__(self):
+        self.tls_stats = defaultdict(int)  # Dictionary to count occurrences of each TLS version
+
+    def process(self, packet):
+        if packet.tls_version is not None:
+            self.tls_stats[packet.tls_version] += 1  # Increment count for the TLS version
+
+    def result(self):
+        return self.tls_stats
+
+    def merge(self, other):
+        for tls_version, count in other.tls_stats.items():
+            self.tls_stats[tls_version] += count
+
+    def scale(self, factor):
+        for tls_version, count in self.tls_stats.items():
+            self.tls_stats[tls_version] = round(count * factor)
+
+
+# Class to compute the average size of IP packets (used by D_packet_sizes)
+class AveragePacketSizeAnalyzer:
+    def __init__(self):
+        self.total_size = 0  # Total size of all packets
+        self.packet_count = 0  # Total number of packets
+
+    def process(self, packet):
+        if packet.ip_version == 4:  # Ensure packet contains an IP layer
+            self.total_size += packet.length  # Add packet size to total
+            self.packet_count += 1  # Increment packet count
+
+    def result(self):
+        if self.packet_count > 0:
+            return self.total_size / self.packet_count  # Compute average size
+        return 0  # Default to 0 if no packets are present
+
+    def merge(self, other):
+        self.total_size += other.total_size
+        self.packet_count += other.packet_count
+
+    # The average is unchanged, only the totals behind it are estimated
+    def scale(self, factor):
+        self.total_size = round(self.total_size * factor)
+        self.packet_count = round(self.packet_count * factor)
+
+
+# Class to collect the time between consecutive packets (used by E_packets_inter_arrivals)
+class InterArrivalAnalyzer:
+    is_distribution = True  # Inter-arrival times of the sampled packets, which sampling does not scale (see packet_sampling)
+
+    def __init__(self):
+        self.inter_arrival_times = []  # List to store inter-arrival times between packets
+        self.first_timestamp = None  # Timestamp of the first packet (needed to stitch chunks together)
+        self.previous_timestamp = None  # Timestamp of the previous packet
+
+    def process(self, packet):
+        if self.previous_timestamp is not None:
+            self.inter_arrival_times.append(packet.timestamp - self.previous_timestamp)  # Store the time difference
+        else:
+            self.first_timestamp = packet.timestamp
+        self.previous_timestamp = packet.timestamp  # Update the last packet timestamp
+
+    def result(self):
+        return self.inter_arrival_times
+
+    def merge(self, other):
+        self.inter_arrival_times.extend(other.inter_arrival_times)
+
+    # Append the next chunk of the same capture, adding the gap across the chunk boundary
+    def stitch(self, other):
+        if other.first_timestamp is None:
+            return  # The other chunk had no packets
+        if self.previous_timestamp is None:
+            self.first_timestamp = other.first_timestamp
+        else:
+            self.inter_arrival_times.append(other.first_timestamp - self.previous_timestamp)
+        self.inter_arrival_times.extend(other.inter_arrival_times)
+        self.previous_timestamp = other.previous_timestamp
+
+
+# Class to collect the size of every IP packet (used by F_flow_size)
+class PacketSizeDistributionAnalyzer:
+    def __init__(self):
+        self.packet_sizes = []  # List to store packet sizes
+
+    def process(self, packet):
+        if packet.ip_version == 4:  # Ensure packet contains an IP layer
+            self.packet_sizes.append(packet.length)
+
+    def result(self):
+        return self.packet_sizes
+
+    def merge(self, other):
+        self.packet_sizes.extend(other.packet_sizes)
+
+
+# Class to sum the bytes of all IP packets (used by G_flow_volume)
+class FlowVolumeAnalyzer:
+    def __init__(self):
+        self.total_bytes = 0  # Variable to store total bytes transmitted
+
+    def process(self, packet):
+        if packet.ip_version == 4:  # Ensure the packet contains an IP layer
+            self.total_bytes += packet.length  # Add packet size to total volume
+
+    def result(self):
+        return self.total_bytes
+
+    def merge(self, other):
+        self.total_bytes += other.total_bytes
+
+    def scale(self, factor):
+        self.total_bytes = round(self.total_bytes * factor)
+
+
+# Analyzers of the header fields, in the order A-G (the distributions of E and F are kept in fixed-memory
+# accumulators). TLS versions (C) need a tshark dissection, so they are only counted when asked for (see all_statistics).
+DEFAULT_ANALYZERS = [IPStatsAnalyzer, TCPPortAnalyzer, AveragePacketSizeAnalyzer,
+                     InterArrivalHistogramAnalyzer, PacketSizeHistogramAnalyzer, FlowVolumeAnalyzer]
+
+
+# Function to create one analyzer of every default kind, in the order A-G
+def create_default_analyzers():
+    return [analyzer_class() for analyzer_class in DEFAULT_ANALYZERS]
+
+
+# Function to choose the backend for a set of analyzers: tshark only if one of them needs a full dissection.
+# The native reader does not decode TLS, so asking for it with such an analyzer is an error.
+def select_backend(analyzers, backend=None):
+    dissection = [getattr(analyzer, '__name__', type(analyzer).__name__)  # Analyzer classes or instances
+                  for analyzer in analyzers if getattr(analyzer, 'requires_dissection', False)]
+    if backend:
+        if backend == NATIVE_BACKEND and dissection:
+            raise ValueError(f"The native backend cannot run {', '.join(dissection)}: it needs the 'pyshark' "
+                             f"or 'tshark' backend")
+        return backend
+    if dissection:
+        return TSHARK_BACKEND if DEFAULT_BACKEND == TSHARK_BACKEND else PYSHARK_BACKEND  # Both run a full dissection
+    return DEFAULT_BACKEND
+
+
+# Function to feed every packet of a packet stream to all the given analyzers, timing each analyzer
+def analyze_packets_timed(packets, analyzers):
+    clock = time.perf_counter
+    seconds = [0.0] * len(analyzers)
+    count = 0
+    for packet in packets:
+        for index, analyzer in enumerate(analyzers):
+            start = clock()
+            analyzer.process(packet)
+            seconds[index] += clock() - start
+        count += 1
+    for analyzer, analyzer_seconds in zip(analyzers, seconds):
+        METRICS.add('analyze', type(analyzer).__name__, analyzer_seconds, items=count)
+    return [analyzer.result() for analyzer in analyzers]
+
+
+# Function to feed every packet of a packet stream to all the given analyzers
+def analyze_packets(packets, analyzers):
+    if METRICS_ENABLED:
+        return analyze_packets_timed(packets, analyzers)
+    for packet in packets:
+        for analyzer in analyzers:
+            analyzer.process(packet)  # Every analyzer sees the same decoded packet
+    return [analyzer.result() for analyzer in analyzers]  # Return the results in the analyzers' order
+
+
+# Function to read a pcap file a single time and feed every packet to all the given analyzers
+def analyze_capture(pcap_file, analyzers, backend=None):
+    return analyze_packets(iter_packets(pcap_file, select_backend(analyzers, backend)), analyzers)
+
+
+# Function to get all .pcapng files in the folder
+def get_pcap_files(directory):
+    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
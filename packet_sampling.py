@@ -0,0 +1,276 @@
+import hashlib  # Import hashlib for a flow hash that is the same in every process (unlike hash())
+import math  # Import math for the confidence intervals
+import os  # Import os to read the settings from the environment
+import time  # Import time for the time-bounded reading
+from collections import defaultdict, namedtuple  # Importing containers for the sampling plan and the variances
+
+from packet_engine import DEFAULT_BACKEND, NATIVE_BACKEND, analyze_packets, iter_packets  # Importing the shared packet engine
+from flow_table import flow_key  # Importing the bidirectional 5-tuple key
+
+
+# Sampling methods: 'packet' keeps every N-th packet, 'flow' keeps every packet of 1 in N flows (chosen by a hash
+# of the 5-tuple, so a flow is kept whole, in both directions)
+PACKET_SAMPLING = 'packet'
+FLOW_SAMPLING = 'flow'
+
+# Sampling settings (can be overridden from the environment; sampling is off unless one of them is set)
+SAMPLING_METHOD = os.environ.get('PCAP_SAMPLING') or None  # 'packet' or 'flow'
+SAMPLING_RATE = int(os.environ.get('PCAP_SAMPLING_RATE', 100))  # Keep 1 in this many packets or flows
+MAX_PACKETS = int(os.environ.get('PCAP_MAX_PACKETS', 0))  # Stop after reading this many packets (0 = no limit)
+MAX_SECONDS = float(os.environ.get('PCAP_MAX_SECONDS', 0))  # Stop after reading for this long (0 = no limit)
+
+CONFIDENCE_Z = 1.96  # Confidence intervals are 95% (normal approximation)
+TIME_CHECK_INTERVAL = 1024  # Packets read between two clock checks of the time limit
+TOP_COUNT = 10  # IP addresses and ports reported with their confidence intervals
+
+# What to sample and when to stop reading; rate 1 with a limit only stops early
+SamplingPlan = namedtuple('SamplingPlan', ['method', 'rate', 'max_packets', 'max_seconds'])
+
+# An estimated total with its confidence interval (low and high are None when there is no valid interval)
+Estimate = namedtuple('Estimate', ['value', 'low', 'high'])
+
+# Sampling reports of the analyzed files (file -> report), filled by parallel_runner.analyze_files
+SAMPLING_REPORTS = {}
+
+
+# Function to build a sampling plan, or None when nothing is sampled and nothing limits the reading
+def sampling_plan(method=SAMPLING_METHOD, rate=SAMPLING_RATE, max_packets=MAX_PACKETS, max_seconds=MAX_SECONDS):
+    if method not in (None, PACKET_SAMPLING, FLOW_SAMPLING):
+        raise ValueError(f"Unknown sampling method: {method}")
+    if method is None and not max_packets and not max_seconds:
+        return None
+    return SamplingPlan(method, rate if method else 1, max_packets, max_seconds)
+
+
+DEFAULT_SAMPLING = sampling_plan()  # The plan of the environment settings
+
+
+# Function to get the flow hash of a packet (a cryptographic hash, so that the chosen flows do not follow
+# patterns of the addresses and ports). Packets without an IP layer have no flow, so they are sampled by position.
+def flow_hash(packet, index):
+    if packet.ip_src is None:
+        return index
+    return int.from_bytes(hashlib.blake2b(flow_key(packet), digest_size=8).digest(), 'little')
+
+
+# Function to read a capture and yield the sampled packets, stopping at the packet or time limit.
+# progress gets the number of packets read and the share of the capture that was read (None when it is unknown).
+# With the native reader, packets left out by 1-in-N sampling are skipped before their headers are decoded.
+def iter_sampled_packets(pcap_file, plan, backend=None, progress=None):
+    progress = {} if progress is None else progress
+    data = state = decode = None
+    if (backend or DEFAULT_BACKEND) == NATIVE_BACKEND:
+        import pcapng_reader  # Imported here because the reader itself depends on PacketInfo
+        data = pcapng_reader.open_capture_buffer(pcap_file)
+        state = pcapng_reader.ReaderState()
+        blocks = pcapng_reader.iter_pcap_records if pcapng_reader.is_classic_pcap(data) else pcapng_reader.iter_packet_blocks
+        records, decode = blocks(data, state), pcapng_reader.decode_raw_packet
+    else:
+        records = iter_packets(pcap_file, backend)
+
+    deadline = time.perf_counter() + plan.max_seconds if plan.max_seconds else None
+    read = 0
+    consumed = 0  # File offset after the last packet that was read (the reader is already past the next one)
+    stopped = False
+    try:
+        for record in records:
+            if (plan.max_packets and read >= plan.max_packets) or \
+                    (deadline and read % TIME_CHECK_INTERVAL == 0 and time.perf_counter() >= deadline):
+                stopped = True
+                break
+            if state is not None:
+                consumed = state.offset
+            index = read
+            read += 1
+            if plan.method == PACKET_SAMPLING and index % plan.rate:
+                continue  # Not sampled (skipped before decoding)
+            packet = decode(record) if decode else record
+            if plan.method == FLOW_SAMPLING and flow_hash(packet, index) % plan.rate:
+                continue  # Not a sampled flow
+            yield packet
+    finally:
+        progress['packets_read'] = read
+        progress['stopped_early'] = stopped
+        progress['coverage'] = 1.0
+        if stopped:
+            progress['coverage'] = consumed / len(data) if data else None  # tshark gives no file position
+        records.close()  # Stop the reader (and its tshark process)
+        if data is not None and not isinstance(data, bytes):
+            data.close()  # Unmap the file
+
+
+# Function to list what a packet adds to the estimated totals: (packets, bytes, IP and TCP port counts and TLS
+# versions), counted like the analyzers of scripts A, B, C, D and G
+def packet_contributions(packet):
+    contributions = defaultdict(int)
+    if packet.ip_version == 4:
+        contributions['packets'] += 1
+        contributions['bytes'] += packet.length
+        contributions[('ip', packet.ip_src)] += 1
+        contributions[('ip', packet.ip_dst)] += 1
+    if packet.transport == 'TCP':
+        contributions[('port', str(packet.src_port))] += 1
+        contributions[('port', str(packet.dst_port))] += 1
+    if packet.tls_version is not None:
+        contributions[('tls', packet.tls_version)] += 1
+    return contributions
+
+
+# Class to count the sampled totals behind the estimates, and what their confidence intervals need: the sum of
+# the squared contributions of the sampled units (packets, or whole flows with flow sampling). Used as an extra analyzer.
+class SampledTotalsAnalyzer:
+    def __init__(self, per_flow=False):
+        self.totals = defaultdict(int)  # Total -> sampled value
+        self.squares = defaultdict(float)  # Total -> sum of the squared contributions of the units
+        self.flows = {} if per_flow else None  # Flow key -> contributions of the flow, squared at the end
+        self.kept = 0  # Sampled packets
+
+    # Add the squared contributions of one unit (the product of its packets and bytes is kept for the mean size)
+    def add_unit(self, contributions):
+        for key, value in contributions.items():
+            self.squares[key] += value * value
+        self.squares['packets_bytes'] += contributions.get('packets', 0) * contributions.get('bytes', 0)
+
+    def process(self, packet):
+        self.kept += 1
+        contributions = packet_contributions(packet)
+        for key, value in contributions.items():
+            self.totals[key] += value
+        if self.flows is None or packet.ip_src is None:
+            self.add_unit(contributions)  # Every packet is a unit
+            return
+        flow = self.flows.setdefault(flow_key(packet), defaultdict(int))
+        for key, value in contributions.items():
+            flow[key] += value
+
+    # The sampled totals and the sums of squares
+    def result(self):
+        if self.flows:
+            for contributions in self.flows.values():
+                self.add_unit(contributions)
+            self.flows = {}
+        return self.totals, self.squares
+
+
+# Function to check whether estimates are extrapolated from the start of the file (the reading stopped early at a
+# known position). The packets read are then not a random sample of the file, so there is no confidence interval.
+def is_extrapolated(coverage):
+    return coverage is not None and coverage < 1.0
+
+
+# Function to estimate a total and its confidence interval from the sampled total (Horvitz-Thompson estimator:
+# every unit kept with probability 1/rate counts rate times; its variance is rate * (rate - 1) * sum of squares).
+# When the reading stopped early, the total is extrapolated to the whole file, without an interval.
+# With an unknown coverage (tshark), the estimate and its interval only cover the packets read.
+def estimate_total(sampled, squares, rate, coverage):
+    value = sampled * rate
+    if is_extrapolated(coverage):
+        return Estimate(value / coverage, None, None)
+    margin = CONFIDENCE_Z * math.sqrt(rate * (rate - 1) * squares)
+    return Estimate(value, max(value - margin, 0.0), value + margin)
+
+
+# Function to estimate the average packet size (a ratio of two totals) and its confidence interval.
+# When the reading stopped early, the average of the start of the file is returned without an interval.
+def estimate_mean(packets, total_bytes, squares, rate, coverage):
+    if not packets:
+        return Estimate(None, None, None)
+    mean = total_bytes / packets
+    if is_extrapolated(coverage):
+        return Estimate(mean, None, None)
+    residuals = squares['bytes'] - 2 * mean * squares['packets_bytes'] + mean * mean * squares['packets']
+    margin = CONFIDENCE_Z * math.sqrt(max(rate * (rate - 1) * residuals, 0.0)) / (packets * rate)
+    return Estimate(mean, mean - margin, mean + margin)
+
+
+# Function to check whether an analyzer holds a distribution of the sampled packets (its class is marked with
+# is_distribution; the marker is read from the class so that an instance attribute cannot shadow it)
+def is_distribution(analyzer):
+    return getattr(type(analyzer), 'is_distribution', False) is True
+
+
+# Function to sample one capture with a fresh set of analyzers. The results of the analyzers that can be scaled
+# (counts and totals) are multiplied up to estimates for the whole capture; the inter-arrival times of the sampled
+# packets and the other results (packet size lists, flow tables) are left as they are.
+# Returns the analyzers and the sampling report.
+def sample_file(pcap_file, analyzer_classes, plan, backend=None):
+    start = time.perf_counter()
+    analyzers = [analyzer_class() for analyzer_class in analyzer_classes]
+    sampled = SampledTotalsAnalyzer(per_flow=plan.method == FLOW_SAMPLING)
+    progress = {}
+    analyze_packets(iter_sampled_packets(pcap_file, plan, backend, progress), analyzers + [sampled])
+    totals, squares = sampled.result()
+
+    factor = plan.rate / (progress['coverage'] or 1.0)
+    if factor != 1:
+        for analyzer in analyzers:
+            if hasattr(analyzer, 'scale'):
+                analyzer.scale(factor)
+
+    rate, coverage = plan.rate, progress['coverage']
+    estimates = {
+        'packets': estimate_total(totals['packets'], squares['packets'], rate, coverage),
+        'bytes': estimate_total(totals['bytes'], squares['bytes'], rate, coverage),
+        'mean_size': estimate_mean(totals['packets'], totals['bytes'], squares, rate, coverage),
+    }
+    for kind, name in (('ip', 'ips'), ('port', 'tcp_ports'), ('tls', 'tls_versions')):
+        counts = sorted(((key[1], count) for key, count in totals.items() if isinstance(key, tuple) and key[0] == kind),
+                        key=lambda item: item[1], reverse=True)[:TOP_COUNT]
+        estimates[name] = {value: estimate_total(count, squares[(kind, value)], rate, coverage) for value, count in counts}
+
+    report = {
+        'method': plan.method or 'none', 'rate': rate, 'packets_read': progress['packets_read'],
+        'packets_kept': sampled.kept, 'stopped_early': progress['stopped_early'], 'coverage': coverage,
+        'seconds': time.perf_counter() - start, 'estimates': estimates,
+        'distributions': [type(analyzer).__name__ for analyzer in analyzers if is_distribution(analyzer)],
+        'not_scaled': [type(analyzer).__name__ for analyzer in analyzers
+                       if not hasattr(analyzer, 'scale') and not is_distribution(analyzer)],
+    }
+    return analyzers, report
+
+
+# Function to get the warning of an inter-arrival time plot of a sampled capture, or None. With 1-in-N packet
+# sampling, the gaps between the kept packets are about N times the real ones; flow sampling keeps whole flows,
+# so the gaps within the flows stay valid.
+def inter_arrival_warning(report):
+    if report is None or report['method'] != PACKET_SAMPLING or report['rate'] <= 1:
+        return None
+    return f"1 in {report['rate']} packets sampled: gaps are about {report['rate']} times the real ones"
+
+
+# Function to format an estimate as 'value (95% CI: low - high)'; exact values (every packet read) have no interval
+def format_estimate(estimate, digits=0):
+    if estimate.value is None:
+        return '-'
+    if estimate.low is None:
+        return f'~{estimate.value:,.{digits}f} (extrapolated, no confidence interval)'
+    if estimate.low == estimate.high:
+        return f'{estimate.value:,.{digits}f}'
+    return f'{estimate.value:,.{digits}f} (95% CI {estimate.low:,.{digits}f} - {estimate.high:,.{digits}f})'
+
+
+# Function to format the sampling report of a file as text
+def format_report(pcap_file, report):
+    method = {PACKET_SAMPLING: f"1 in {report['rate']} packets", FLOW_SAMPLING: f"1 in {report['rate']} flows"}.get(
+        report['method'], "all packets")
+    lines = [f"Sampling of {pcap_file}: {method}, {report['packets_kept']:,} of {report['packets_read']:,} "
+             f"packets read kept in {report['seconds']:.2f} s"]
+    if report['stopped_early']:
+        coverage = report['coverage']
+        lines.append(f"  stopped early after {coverage:.1%} of the file, totals are extrapolated to the whole file "
+                     f"(the start of a file is not a random sample, so they have no confidence interval)"
+                     if coverage else "  stopped early, totals only cover the packets read")
+    estimates = report['estimates']
+    lines.append(f"  packets: {format_estimate(estimates['packets'])}")
+    lines.append(f"  bytes: {format_estimate(estimates['bytes'])}")
+    lines.append(f"  mean packet size: {format_estimate(estimates['mean_size'], 2)}")
+    for name, title in (('ips', 'IP address'), ('tcp_ports', 'TCP port'), ('tls_versions', 'TLS version')):
+        for value, estimate in estimates[name].items():
+            lines.append(f"  {title} {value}: {format_estimate(estimate)}")
+    if report['distributions']:
+        lines.append(f"  inter-arrival times of the sampled packets (not scaled): {', '.join(report['distributions'])}")
+        if inter_arrival_warning(report):
+            lines.append(f"    {inter_arrival_warning(report)}")
+    if report['not_scaled']:
+        lines.append(f"  not scaled (only the sampled packets or flows): {', '.join(report['not_scaled'])}")
+    return '\n'.join(lines)
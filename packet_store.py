@@ -0,0 +1,123 @@
+from array import array  # Import array for the typed columns of the store
+
+from packet_engine import iter_packets  # Importing the shared packet reader (native pcapng or PyShark backend)
+from traffic_table import TRAFFIC_COLUMNS, IP_COLUMNS, ip_to_int  # Importing the traffic table columns
+
+
+# Column types: 8-byte timestamps, 4-byte sizes (a packet can exceed 65535 bytes with segmentation offload),
+# 4-byte endpoint codes and 2-byte ports, so a packet takes 26 bytes instead of a list of six Python objects
+TIMESTAMP_TYPE = 'd'
+SIZE_TYPE = 'I'
+ENDPOINT_TYPE = 'I'
+PORT_TYPE = 'H'
+
+
+# Class to store the traffic rows of the atkr scripts (timestamp, size, IPs and ports) in parallel typed columns.
+# IP addresses are interned: every distinct address (IPv4 or IPv6) is stored once, and the rows hold its 32-bit code.
+# The columns grow like Python lists (amortized over-allocation); missing ports are marked in a byte mask.
+# The views returned by column() share the memory of the store, so the store cannot grow while a view is alive.
+class PacketStore:
+    def __init__(self):
+        self.timestamps = array(TIMESTAMP_TYPE)
+        self.sizes = array(SIZE_TYPE)
+        self.src_endpoints = array(ENDPOINT_TYPE)  # Codes of the source IPs
+        self.dst_endpoints = array(ENDPOINT_TYPE)  # Codes of the destination IPs
+        self.src_ports = array(PORT_TYPE)
+        self.dst_ports = array(PORT_TYPE)
+        self.src_port_missing = bytearray()  # 1 when the packet has no transport layer
+        self.dst_port_missing = bytearray()
+        self.endpoints = []  # Code -> IP address
+        self.endpoint_codes = {}  # IP address -> code
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    # Function to get the code of an IP address, adding it to the endpoints the first time
+    def intern(self, ip):
+        code = self.endpoint_codes.get(ip)
+        if code is None:
+            code = self.endpoint_codes[ip] = len(self.endpoints)
+            self.endpoints.append(ip)
+        return code
+
+    # Add one packet (ports may be None); same arguments as the write_row of the traffic table writers
+    def write_row(self, timestamp, size, src_ip, dst_ip, src_port, dst_port):
+        self.timestamps.append(timestamp)
+        self.sizes.append(size)
+        self.src_endpoints.append(self.intern(src_ip))
+        self.dst_endpoints.append(self.intern(dst_ip))
+        self.src_ports.append(src_port or 0)
+        self.dst_ports.append(dst_port or 0)
+        self.src_port_missing.append(src_port is None)
+        self.dst_port_missing.append(dst_port is None)
+
+    # Add the IPv4 packets of a packet iterator (packet_engine.iter_packets)
+    def add_packets(self, packets):
+        for pkt in packets:
+            if pkt.ip_version == 4:  # Keep only IP packets, like pcapng_to_CSV_for_atkr
+                self.write_row(pkt.timestamp, pkt.length, pkt.ip_src, pkt.ip_dst, pkt.src_port, pkt.dst_port)
+
+    # Append the rows of another store, translating its endpoint codes into the codes of this store
+    def extend(self, other):
+        codes = array(ENDPOINT_TYPE, (self.intern(ip) for ip in other.endpoints))
+        self.timestamps.extend(other.timestamps)
+        self.sizes.extend(other.sizes)
+        self.src_endpoints.extend(codes[code] for code in other.src_endpoints)
+        self.dst_endpoints.extend(codes[code] for code in other.dst_endpoints)
+        self.src_ports.extend(other.src_ports)
+        self.dst_ports.extend(other.dst_ports)
+        self.src_port_missing.extend(other.src_port_missing)
+        self.dst_port_missing.extend(other.dst_port_missing)
+
+    # Memory used by the rows and the endpoint table, in bytes
+    def nbytes(self):
+        columns = (self.timestamps, self.sizes, self.src_endpoints, self.dst_endpoints, self.src_ports, self.dst_ports)
+        return (sum(column.itemsize * len(column) for column in columns)
+                + len(self.src_port_missing) + len(self.dst_port_missing)
+                + sum(len(ip) for ip in self.endpoints) * 2)  # Rough size of the address strings and their keys
+
+    # Function to get a NumPy view of a column (no copy): 'Timestamp', 'Size', 'Source IP'/'Destination IP'
+    # (endpoint codes), 'Source Port'/'Destination Port' (0 when missing, see port_missing)
+    def column(self, name):
+        import numpy as np  # NumPy is only loaded for the views
+        values = {
+            "Timestamp": self.timestamps, "Size": self.sizes,
+            "Source IP": self.src_endpoints, "Destination IP": self.dst_endpoints,
+            "Source Port": self.src_ports, "Destination Port": self.dst_ports,
+        }[name]
+        return np.frombuffer(values, dtype=values.typecode)
+
+    # Function to get a NumPy view of the missing-port mask of a port column
+    def port_missing(self, name):
+        import numpy as np  # NumPy is only loaded for the views
+        mask = self.src_port_missing if name == "Source Port" else self.dst_port_missing
+        return np.frombuffer(mask, dtype=np.bool_)
+
+    # Function to get the packed IPv4 integers of an IP column (converted once per distinct address)
+    def ip_integers(self, name):
+        import numpy as np  # NumPy is only loaded for the views
+        addresses = np.array([ip_to_int(ip) for ip in self.endpoints], dtype=np.uint32)
+        return addresses[self.column(name)]
+
+    # Function to build a DataFrame with the columns of the traffic tables. The timestamp, size and port columns
+    # share the memory of the store (ports are nullable integers with <NA> for missing ports, as in the Parquet
+    # tables); IPs are categorical, with the addresses as categories (Pandas narrows the codes to the smallest type)
+    def to_dataframe(self, columns=None):
+        import pandas as pd  # Pandas is only loaded to build the DataFrame
+        data = {}
+        for name in columns or TRAFFIC_COLUMNS:
+            if name in IP_COLUMNS:
+                data[name] = pd.Categorical.from_codes(self.column(name).view('int32'), categories=self.endpoints,
+                                                       validate=False)
+            elif name in ("Source Port", "Destination Port"):
+                data[name] = pd.arrays.IntegerArray(self.column(name), self.port_missing(name))
+            else:
+                data[name] = self.column(name)
+        return pd.DataFrame(data, copy=False)
+
+
+# Function to read the IP packets of a capture into a packet store
+def load_packet_store(pcap_file, backend=None):
+    store = PacketStore()
+    store.add_packets(iter_packets(pcap_file, backend))
+    return store
@@ -0,0 +1,157 @@
+from concurrent.futures import ProcessPoolExecutor  # Importing a process pool to use every CPU core
+from itertools import repeat  # Import repeat to pass the same arguments to every task
+import os  # Import os to read the environment and count CPU cores
+import sys  # Import sys to print the sampling reports on stderr
+
+from packet_engine import DEFAULT_ANALYZERS, NATIVE_BACKEND, TSHARK_BACKEND, analyze_capture, analyze_packets, select_backend  # Importing the shared single-pass packet engine
+from result_cache import analyzer_signature, open_default_cache  # Importing the on-disk result cache
+from capture_checkpoint import INCREMENTAL_ENABLED, analyze_incrementally  # Importing the checkpoints of growing captures
+from instrumentation import METRICS_ENABLED, collect_measured, run_measured, stage  # Importing the opt-in stage timers
+from packet_sampling import DEFAULT_SAMPLING, SAMPLING_REPORTS, format_report, sample_file  # Importing the sampling mode
+
+
+# Number of worker processes (defaults to one per CPU core, can be overridden from the environment)
+DEFAULT_WORKERS = int(os.environ.get('PCAP_WORKERS', os.cpu_count() or 1))
+
+# Files are only split into chunks of at least this many bytes, smaller files are read by a single worker
+MIN_CHUNK_SIZE = 32 * 1024 * 1024
+
+
+# Function to run a per-file function on every file, spread over worker processes.
+# The results are returned in the same order as the files.
+def map_files(function, files, workers=None, *args):
+    files = list(files)
+    workers = min(workers or DEFAULT_WORKERS, len(files))
+    if workers <= 1:
+        return [function(file, *args) for file in files]  # No pool needed for a single worker or file
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if not METRICS_ENABLED:
+            return list(pool.map(function, files, *[repeat(arg) for arg in args]))
+        results = []
+        for result, metrics, stacks in pool.map(run_measured, repeat(function), files, *[repeat(arg) for arg in args]):
+            collect_measured(metrics, stacks)  # Add the stage times of the worker to those of the run
+            results.append(result)
+        return results
+
+
+# Function to run a fresh set of analyzers over one pcap file and return the filled analyzers
+def analyze_file(pcap_file, analyzer_classes=DEFAULT_ANALYZERS, backend=None):
+    analyzers = [analyzer_class() for analyzer_class in analyzer_classes]
+    analyze_capture(pcap_file, analyzers, backend)  # Read the file once and feed every analyzer
+    return analyzers
+
+
+# Function to run a fresh set of analyzers over one chunk of a pcap file (task = (file, reader state, end offset))
+def analyze_chunk(task, analyzer_classes=DEFAULT_ANALYZERS, backend=None):
+    pcap_file, state, end_offset = task
+    if state is None:
+        return analyze_file(pcap_file, analyzer_classes, backend)  # The file is not split
+
+    import pcapng_reader  # Chunks are only used with the native reader
+    analyzers = [analyzer_class() for analyzer_class in analyzer_classes]
+    analyze_packets(pcapng_reader.iter_packets(pcap_file, state, end_offset), analyzers)
+    return analyzers
+
+
+# Function to split a pcap file into chunk tasks, so that one large file can use several workers
+def split_file(pcap_file, workers, backend, analyzer_classes=DEFAULT_ANALYZERS):
+    if backend != NATIVE_BACKEND:
+        return [(pcap_file, None, None)]  # tshark can only read a file from the start
+    if any(getattr(analyzer_class, 'sequential', False) for analyzer_class in analyzer_classes):
+        return [(pcap_file, None, None)]  # Some analyzers (such as flow tables) need the whole file in order
+
+    import pcapng_reader
+    chunk_count = min(workers, os.path.getsize(pcap_file) // MIN_CHUNK_SIZE)
+    if chunk_count <= 1:
+        return [(pcap_file, None, None)]
+    return [(pcap_file, state, end_offset) for state, end_offset in pcapng_reader.split_capture(pcap_file, chunk_count)]
+
+
+# Function to analyze many pcap files in parallel, returning one list of analyzers per file.
+# Large files are also split into chunks that are analyzed in parallel and stitched back in order,
+# so the results are identical to reading each file sequentially.
+# Results of unchanged files are taken from the on-disk result cache (see result_cache).
+# In incremental mode, every file is resumed from its checkpoint and only newly appended packets are analyzed.
+# With a sampling plan, only a sample of every file is read and the counts are scaled into estimates
+# (see packet_sampling); the sampling reports, with confidence intervals, are printed on stderr.
+def analyze_files(pcap_files, analyzer_classes=DEFAULT_ANALYZERS, workers=None, backend=None, use_cache=True,
+                  incremental=INCREMENTAL_ENABLED, sampling=DEFAULT_SAMPLING):
+    workers = workers or DEFAULT_WORKERS
+    backend = select_backend(analyzer_classes, backend)
+    pcap_files = list(pcap_files)
+
+    if incremental:
+        return map_files(analyze_incrementally, pcap_files, workers, analyzer_classes, backend)
+
+    if sampling is not None:
+        results = []
+        for pcap_file, (analyzers, report) in zip(pcap_files, map_files(sample_file, pcap_files, workers,
+                                                                         analyzer_classes, sampling, backend)):
+            SAMPLING_REPORTS[pcap_file] = report
+            print(format_report(pcap_file, report), file=sys.stderr)
+            results.append(analyzers)
+        return results  # Estimates are not stored in the result cache
+
+    cache = open_default_cache() if use_cache else None
+    results = [None] * len(pcap_files)
+    keys = [None] * len(pcap_files)
+    if cache is not None:
+        for index, pcap_file in enumerate(pcap_files):
+            keys[index] = cache.key_for(pcap_file, backend, analyzer_signature(analyzer_classes))
+            with stage('read', 'result_cache'):
+                results[index] = cache.get(keys[index])
+    missing = [index for index, result in enumerate(results) if result is None]
+
+    if backend == TSHARK_BACKEND:
+        # tshark processes do the dissection, so the files run concurrently in one process (see tshark_pipeline)
+        from tshark_pipeline import analyze_captures
+        chunk_results = analyze_captures([pcap_files[index] for index in missing], analyzer_classes, workers)
+        task_counts = [1] * len(missing)
+    else:
+        tasks = []  # Chunk tasks of all the files, so files and chunks share the same pool
+        task_counts = []  # Number of chunks of every file
+        for index in missing:
+            file_tasks = split_file(pcap_files[index], workers, backend, analyzer_classes)
+            tasks.extend(file_tasks)
+            task_counts.append(len(file_tasks))
+
+        chunk_results = map_files(analyze_chunk, tasks, workers, analyzer_classes, backend)
+
+    position = 0
+    for index, count in zip(missing, task_counts):
+        with stage('aggregate', 'stitch', items=count):
+            results[index] = stitch_analyzers(chunk_results[position:position + count])  # Chunks are in file order
+        position += count
+        if cache is not None:
+            with stage('serialize', 'result_cache'):
+                cache.put(keys[index], results[index])
+    return results
+
+
+# Function to combine the analyzers of several files (or parts of a file) into a single set of analyzers
+def merge_analyzers(analyzer_lists):
+    analyzer_lists = list(analyzer_lists)
+    merged = analyzer_lists[0]
+    for analyzers in analyzer_lists[1:]:
+        for total, partial in zip(merged, analyzers):
+            total.merge(partial)  # Counters are added, lists are extended, totals are summed
+    return merged
+
+
+# Function to join the analyzers of consecutive chunks of the same file.
+# Order-dependent analyzers (such as inter-arrival times) stitch the chunk boundaries, the others merge.
+def stitch_analyzers(analyzer_lists):
+    merged = analyzer_lists[0]
+    for analyzers in analyzer_lists[1:]:
+        for total, partial in zip(merged, analyzers):
+            if hasattr(total, 'stitch'):
+                total.stitch(partial)
+            else:
+                total.merge(partial)
+    return merged
+
+
+# Function to get the results of a list of analyzers, in the structures the plot functions take
+def analyzer_results(analyzers):
+    return [analyzer.result() for analyzer in analyzers]
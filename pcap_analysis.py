@@ -0,0 +1,176 @@
+import argparse  # Import argparse to read the command-line options
+import importlib  # Import importlib to load the plot functions only when plotting
+import json  # Import json for the JSON output
+import os  # Import os to interact with the filesystem
+import runpy  # Import runpy to run the other tools as subcommands
+import sys  # Import sys to pass the remaining arguments to the tools
+
+from packet_engine import (IPStatsAnalyzer, TCPPortAnalyzer, TLSVersionAnalyzer, AveragePacketSizeAnalyzer,
+                           FlowVolumeAnalyzer, InterArrivalHistogramAnalyzer, PacketSizeHistogramAnalyzer,
+                           get_pcap_files)  # Importing the analyzers of the shared packet engine
+from flow_table import FlowTableAnalyzer  # Importing the 5-tuple flow table
+from sketches import IPStatsSketchAnalyzer, TCPPortSketchAnalyzer  # Importing the fixed-memory sketch counters
+from parallel_runner import analyze_files, analyzer_results  # Importing the runner that spreads files over CPU cores
+from packet_sampling import (SAMPLING_METHOD, SAMPLING_RATE, MAX_PACKETS, MAX_SECONDS, SAMPLING_REPORTS,
+                             sampling_plan)  # Importing the sampling mode
+
+
+# Analyzers that can be chosen on the command line: name -> (analyzer class, sketch version or None,
+# plot module and function). Only the modules of the chosen plots are imported, and only with --plot.
+ANALYZERS = {
+    'ip': (IPStatsAnalyzer, IPStatsSketchAnalyzer, ('A_IP_header_fields', 'plot_ip_stats_for_file')),
+    'tcp': (TCPPortAnalyzer, TCPPortSketchAnalyzer, ('B_TCP_header_fields', 'plot_tcp_stats_for_file')),
+    'tls': (TLSVersionAnalyzer, None, ('C_TLS_header_fields', 'plot_tls_stats_for_file')),
+    'average-size': (AveragePacketSizeAnalyzer, None, None),
+    'inter-arrival': (InterArrivalHistogramAnalyzer, None, ('E_packets_inter_arrivals', 'plot_inter_arrival_distribution')),
+    'packet-sizes': (PacketSizeHistogramAnalyzer, None, ('F_flow_size', 'plot_packet_size_counts')),
+    'volume': (FlowVolumeAnalyzer, None, None),
+    'flows': (FlowTableAnalyzer, None, ('F_flow_size', 'plot_flow_size_distribution')),
+}
+DEFAULT_ANALYZER_NAMES = [name for name in ANALYZERS if name != 'tls']  # TLS versions need tshark
+
+# The other tools, run as subcommands with their own options: name -> (module, description)
+TOOLS = {
+    'report': ('report_renderer', "render every plot into an HTML/PNG/SVG report"),
+    'tls': ('tls_sessions', "TLS connections with handshake latencies (uses the key logs)"),
+    'query': ('capture_index', "statistics of a time range, IP address or port, read through an index"),
+    'compare': ('comparative_summary', "side-by-side comparison of traffic sources from a stored summary table"),
+    'classify': ('traffic_classifier', "train an application classifier on labeled tables, or classify traffic"),
+    'convert': ('pcapng_to_CSV_for_atkr', "convert the captures into CSV/Parquet traffic tables"),
+    'live': ('live_statistics', "rolling-window statistics of live traffic"),
+    'replay': ('replay_capture', "replay a capture to stdout"),
+    'benchmark': ('benchmark_suite', "throughput of every analysis on synthetic captures"),
+    'synthetic': ('synthetic_capture', "write a synthetic capture"),
+}
+
+TOP_COUNT = 10  # Entries shown for the IP, port and flow tables
+
+
+# Function to turn the inputs (capture files or directories of captures) into a list of capture files
+def expand_inputs(inputs):
+    pcap_files = []
+    for path in inputs:
+        pcap_files.extend(sorted(get_pcap_files(path)) if os.path.isdir(path) else [path])
+    return pcap_files
+
+
+# Function to turn the result of an analyzer into plain values that can be printed or written as JSON
+def summarize_result(name, result):
+    if name in ('ip', 'tcp', 'tls'):
+        top = sorted(result.items(), key=lambda item: item[1], reverse=True)[:TOP_COUNT]
+        return {'distinct': len(result), 'top': [[key, count] for key, count in top]}
+    if name == 'inter-arrival':
+        return {'count': result.count, 'mean': result.mean(), 'min': result.minimum, 'max': result.maximum,
+                'percentiles': {f'p{percentile:g}': value for percentile, value in result.percentiles()}}
+    if name == 'packet-sizes':
+        return {'count': result.count, 'mean': result.mean(),
+                'percentiles': {f'p{percentile:g}': value for percentile, value in result.percentiles()}}
+    if name == 'flows':
+        largest = sorted(result.rows(), key=lambda row: row[6], reverse=True)[:TOP_COUNT]  # By bytes
+        return {'count': len(result), 'largest': [
+            {'protocol': row[0], 'a': f'{row[1]}:{row[2]}', 'b': f'{row[3]}:{row[4]}', 'packets': row[5],
+             'bytes': row[6], 'duration': row[9]} for row in largest]}
+    return result  # Average size and volume are plain numbers
+
+
+# Function to format the summaries of one file as text
+def format_text(pcap_file, summaries):
+    lines = [f"== {pcap_file}"]
+    for name, summary in summaries.items():
+        if not isinstance(summary, dict):
+            lines.append(f"{name}: {summary:,.2f}" if isinstance(summary, float) else f"{name}: {summary:,}")
+        elif 'top' in summary:
+            lines.append(f"{name}: {summary['distinct']:,} distinct")
+            lines.extend(f"  {key:<40} {count:>12,}" for key, count in summary['top'])
+        elif 'percentiles' in summary:
+            percentiles = ' '.join(f'{key}={value:.6g}' for key, value in summary['percentiles'].items() if value is not None)
+            mean = summary['mean']
+            lines.append(f"{name}: {summary['count']:,} values, mean {mean if mean is None else f'{mean:.6g}'}, {percentiles}")
+        elif 'largest' in summary:
+            lines.append(f"{name}: {summary['count']:,} flows, largest:")
+            lines.extend(f"  {flow['a']:>22} <-> {flow['b']:<22} {flow['packets']:>9,} packets {flow['bytes']:>13,} bytes"
+                         for flow in summary['largest'])
+    return '\n'.join(lines)
+
+
+# Function to show the plots of the chosen analyzers (Matplotlib is only imported here)
+def plot_results(pcap_file, names, results):
+    for name, result in zip(names, results):
+        plot = ANALYZERS[name][2]
+        if plot is None:
+            continue  # Single numbers are compared across files by scripts D and G
+        if name == 'flows':
+            result = list(result.packets)
+        module_name, function_name = plot
+        getattr(importlib.import_module(module_name), function_name)(result, pcap_file)
+
+
+# Function to run the 'stats' subcommand
+def run_statistics(options):
+    names = options.analyzers or DEFAULT_ANALYZER_NAMES
+    analyzer_classes = [ANALYZERS[name][1] if options.sketch and ANALYZERS[name][1] else ANALYZERS[name][0]
+                        for name in names]
+    pcap_files = expand_inputs(options.inputs)
+    sampling = sampling_plan(options.sample, options.rate, options.max_packets, options.max_seconds)
+    all_analyzers = analyze_files(pcap_files, analyzer_classes, options.workers, options.backend,
+                                  use_cache=not options.no_cache, sampling=sampling)
+
+    report = {}
+    for pcap_file, analyzers in zip(pcap_files, all_analyzers):
+        results = analyzer_results(analyzers)
+        report[pcap_file] = {name: summarize_result(name, result) for name, result in zip(names, results)}
+        if sampling is not None and options.format == 'json':
+            report[pcap_file]['sampling'] = SAMPLING_REPORTS[pcap_file]  # Estimates as [value, low, high]
+        if options.plot:
+            plot_results(pcap_file, names, results)
+
+    if options.format == 'json':
+        text = json.dumps(report, indent=1)
+    else:
+        text = '\n\n'.join(format_text(pcap_file, summaries) for pcap_file, summaries in report.items())
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+# Function to build the command-line parser
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pcap_analysis', description="Network traffic analysis of PCAPNG captures.")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    stats = subcommands.add_parser('stats', help="compute the statistics of captures with the chosen analyzers")
+    stats.add_argument('inputs', nargs='*', default=['pcapng_files'], help="capture files or directories")
+    stats.add_argument('-a', '--analyzers', nargs='+', choices=list(ANALYZERS),
+                       help=f"analyzers to run (default: {' '.join(DEFAULT_ANALYZER_NAMES)})")
+    stats.add_argument('-f', '--format', choices=['text', 'json'], default='text', help="output format")
+    stats.add_argument('-o', '--output', help="output file (default: standard output)")
+    stats.add_argument('--backend', help="packet reading backend ('native', 'pyshark' or 'tshark')")
+    stats.add_argument('--workers', type=int, help="worker processes (default: one per CPU core)")
+    stats.add_argument('--sketch', action='store_true', help="fixed-memory sketches for the IP and port counts")
+    stats.add_argument('--no-cache', action='store_true', help="do not use the on-disk result cache")
+    stats.add_argument('--plot', action='store_true', help="also show the plots of the analyzers")
+    stats.add_argument('--sample', choices=['packet', 'flow'], default=SAMPLING_METHOD,
+                       help="estimate the statistics from 1 in RATE packets, or from every packet of 1 in RATE flows")
+    stats.add_argument('--rate', type=int, default=SAMPLING_RATE, help="sampling rate (default: %(default)s)")
+    stats.add_argument('--max-packets', type=int, default=MAX_PACKETS, help="stop after reading this many packets of a file")
+    stats.add_argument('--max-seconds', type=float, default=MAX_SECONDS, help="stop after reading a file for this many seconds")
+
+    for name, (module, description) in TOOLS.items():
+        tool = subcommands.add_parser(name, help=description, add_help=False)
+        tool.add_argument('arguments', nargs=argparse.REMAINDER, help=f"options of {module}.py")
+    return parser
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    if len(sys.argv) > 1 and sys.argv[1] in TOOLS:
+        # Run the tool as if it was started directly, with the remaining arguments
+        module = TOOLS[sys.argv[1]][0]
+        sys.argv = [f'{module}.py'] + sys.argv[2:]
+        runpy.run_module(module, run_name='__main__', alter_sys=True)
+    else:
+        run_statistics(build_parser().parse_args())
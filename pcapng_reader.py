@@ -0,0 +1,510 @@
+import mmap  # Import mmap to read capture files without copying them into memory
+import socket  # Import socket to format IPv6 addresses
+import struct  # Import struct to decode the binary block and header fields
+
+from packet_engine import PacketInfo  # Importing the packet record shared with the PyShark backend
+from instrumentation import METRICS_ENABLED, timed_conversion  # Importing the opt-in stage timers
+
+
+# pcapng block types (https://www.ietf.org/archive/id/draft-ietf-opsawg-pcapng-02.html)
+SECTION_HEADER_BLOCK = 0x0A0D0D0A
+INTERFACE_DESCRIPTION_BLOCK = 0x00000001
+OBSOLETE_PACKET_BLOCK = 0x00000002
+SIMPLE_PACKET_BLOCK = 0x00000003
+ENHANCED_PACKET_BLOCK = 0x00000006
+
+BYTE_ORDER_MAGIC = 0x1A2B3C4D  # Magic number of the Section Header Block, used to detect the byte order
+
+# Classic (libpcap) file magic numbers: microsecond and nanosecond resolution
+PCAP_MAGIC_MICRO = 0xA1B2C3D4
+PCAP_MAGIC_NANO = 0xA1B23C4D
+
+# Link-layer header types (https://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+RAW_IP_LINKTYPES = (LINKTYPE_RAW, 12, 14)  # DLT_RAW has a different value on some platforms
+
+# Ethertypes
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+
+# IP protocol numbers whose header starts with 16-bit source and destination ports
+TRANSPORT_PROTOCOLS = {6: 'TCP', 17: 'UDP', 33: 'DCCP', 132: 'SCTP'}
+IPV6_EXTENSION_HEADERS = (0, 43, 60, 51, 44)  # Hop-by-hop, routing, destination options, AH, fragment
+
+# Pre-compiled structs for the fields read on every packet
+U16_BE = struct.Struct('>H')
+PORTS_BE = struct.Struct('>HH')
+U32_BE = struct.Struct('>I')
+
+
+# Class holding what must be known to decode the blocks that follow a given file offset
+class ReaderState:
+    def __init__(self):
+        self.byte_order = '<'  # Byte order of the current section
+        self.interfaces = []  # (link type, timestamp divisor, timestamp offset) for every interface of the section
+        self.offset = 0  # Offset of the next block to read
+        self.last_timestamp = 0.0  # Timestamp of the last packet (Simple Packet Blocks carry no timestamp)
+
+    def copy(self):
+        state = ReaderState()
+        state.byte_order = self.byte_order
+        state.interfaces = list(self.interfaces)
+        state.offset = self.offset
+        state.last_timestamp = self.last_timestamp
+        return state
+
+
+# Function to convert a timestamp in interface ticks into seconds.
+# Like PyShark's sniff_time, the result is rounded to whole microseconds.
+def ticks_to_timestamp(ticks, divisor, ts_offset):
+    if divisor == 1000000:
+        seconds, microseconds = divmod(ticks, 1000000)
+    else:
+        timestamp = ticks / divisor
+        seconds = int(timestamp)
+        microseconds = round((timestamp - seconds) * 1e6)  # Same half-even rounding as datetime.fromtimestamp
+    return seconds + ts_offset + microseconds / 1e6
+
+
+# Function to convert a 4-byte address into its dotted string form
+def format_ipv4(data, offset):
+    return '%d.%d.%d.%d' % (data[offset], data[offset + 1], data[offset + 2], data[offset + 3])
+
+
+# Function to find the network layer of a captured frame according to its link-layer header type
+# Returns (ethertype, offset of the network header), or None for unsupported or truncated frames
+def locate_network_layer(linktype, data, start, end):
+    if linktype == LINKTYPE_ETHERNET:
+        if end - start < 14:
+            return None
+        ethertype = U16_BE.unpack_from(data, start + 12)[0]
+        offset = start + 14
+        while ethertype in VLAN_ETHERTYPES and offset + 4 <= end:  # Skip 802.1Q / 802.1ad tags
+            ethertype = U16_BE.unpack_from(data, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype == LINKTYPE_LINUX_SLL:
+        if end - start < 16:
+            return None
+        return U16_BE.unpack_from(data, start + 14)[0], start + 16
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if end - start < 20:
+            return None
+        return U16_BE.unpack_from(data, start)[0], start + 20
+    if linktype in RAW_IP_LINKTYPES or linktype == LINKTYPE_IPV4 or linktype == LINKTYPE_IPV6:
+        if end - start < 1:
+            return None
+        return (ETHERTYPE_IPV4 if data[start] >> 4 == 4 else ETHERTYPE_IPV6), start
+    if linktype == LINKTYPE_NULL:
+        if end - start < 4:
+            return None
+        family = data[start] or data[start + 3]  # The family is stored in host byte order
+        return (ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6 if family in (10, 24, 28, 30) else 0), start + 4
+    return None  # Unsupported link-layer type
+
+
+# Function to skip the IPv6 extension headers that follow the fixed header
+# Returns (upper-layer protocol, offset of its header), or None for a later fragment (no upper-layer header)
+def skip_ipv6_extensions(data, offset, end, protocol):
+    while protocol in IPV6_EXTENSION_HEADERS and offset + 8 <= end:
+        if protocol == 44:  # Fragment header
+            if U16_BE.unpack_from(data, offset + 2)[0] & 0xFFF8:
+                return None
+            next_offset = offset + 8
+        elif protocol == 51:  # Authentication header
+            next_offset = offset + (data[offset + 1] + 2) * 4
+        else:
+            next_offset = offset + (data[offset + 1] + 1) * 8
+        protocol = data[offset]
+        offset = next_offset
+    return protocol, offset
+
+
+# Function to decode the IP and transport headers of a captured frame
+# Returns (ip_version, ip_src, ip_dst, transport, src_port, dst_port), with None for missing fields
+def decode_frame(linktype, data, start, end):
+    network = locate_network_layer(linktype, data, start, end)
+    if network is None:
+        return None
+    ethertype, offset = network
+
+    # Decode the network layer
+    if ethertype == ETHERTYPE_IPV4:
+        if end - offset < 20:
+            return None
+        ip_version = 4
+        header_length = (data[offset] & 0x0F) * 4
+        protocol = data[offset + 9]
+        ip_src = format_ipv4(data, offset + 12)
+        ip_dst = format_ipv4(data, offset + 16)
+        if U16_BE.unpack_from(data, offset + 6)[0] & 0x1FFF:
+            return ip_version, ip_src, ip_dst, None, None, None  # Later fragments carry no transport header
+        offset += header_length
+    elif ethertype == ETHERTYPE_IPV6:
+        if end - offset < 40:
+            return None
+        ip_version = 6
+        ip_src = socket.inet_ntop(socket.AF_INET6, bytes(data[offset + 8:offset + 24]))
+        ip_dst = socket.inet_ntop(socket.AF_INET6, bytes(data[offset + 24:offset + 40]))
+        upper_layer = skip_ipv6_extensions(data, offset + 40, end, data[offset + 6])
+        if upper_layer is None:
+            return ip_version, ip_src, ip_dst, None, None, None
+        protocol, offset = upper_layer
+    else:
+        return None  # Not an IP packet
+
+    # Decode the transport layer ports
+    transport = TRANSPORT_PROTOCOLS.get(protocol)
+    if transport is None or end - offset < 4:
+        return ip_version, ip_src, ip_dst, None, None, None
+    src_port, dst_port = PORTS_BE.unpack_from(data, offset)
+    return ip_version, ip_src, ip_dst, transport, src_port, dst_port
+
+
+# Function to decode a TCP segment of a captured frame, including where its payload is
+# Returns (ip_src, ip_dst, src_port, dst_port, sequence number, flags, payload start, payload end), or None
+def decode_tcp_segment(linktype, data, start, end):
+    network = locate_network_layer(linktype, data, start, end)
+    if network is None:
+        return None
+    ethertype, offset = network
+
+    if ethertype == ETHERTYPE_IPV4:
+        if end - offset < 20 or data[offset + 9] != 6 or U16_BE.unpack_from(data, offset + 6)[0] & 0x1FFF:
+            return None  # Not TCP, or a later fragment
+        end = min(end, offset + U16_BE.unpack_from(data, offset + 2)[0])  # Ignore the Ethernet padding
+        ip_src = format_ipv4(data, offset + 12)
+        ip_dst = format_ipv4(data, offset + 16)
+        offset += (data[offset] & 0x0F) * 4
+    elif ethertype == ETHERTYPE_IPV6:
+        if end - offset < 40:
+            return None
+        end = min(end, offset + 40 + U16_BE.unpack_from(data, offset + 4)[0])
+        ip_src = socket.inet_ntop(socket.AF_INET6, bytes(data[offset + 8:offset + 24]))
+        ip_dst = socket.inet_ntop(socket.AF_INET6, bytes(data[offset + 24:offset + 40]))
+        upper_layer = skip_ipv6_extensions(data, offset + 40, end, data[offset + 6])
+        if upper_layer is None or upper_layer[0] != 6:
+            return None
+        offset = upper_layer[1]
+    else:
+        return None
+
+    if end - offset < 20:
+        return None  # Truncated TCP header
+    src_port, dst_port = PORTS_BE.unpack_from(data, offset)
+    sequence = U32_BE.unpack_from(data, offset + 4)[0]
+    flags = data[offset + 13]
+    payload_start = offset + (data[offset + 12] >> 4) * 4
+    return ip_src, ip_dst, src_port, dst_port, sequence, flags, min(payload_start, end), end
+
+
+# Function to read the options of an Interface Description Block
+# Returns the timestamp divisor (ticks per second) and the timestamp offset in seconds
+def parse_interface_options(data, offset, end, byte_order):
+    divisor = 10 ** 6  # Default resolution is microseconds
+    ts_offset = 0
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(byte_order + 'HH', data, offset)
+        if code == 0:  # opt_endofopt
+            break
+        value = offset + 4
+        if code == 9 and length >= 1:  # if_tsresol
+            resolution = data[value]
+            divisor = 2 ** (resolution & 0x7F) if resolution & 0x80 else 10 ** resolution
+        elif code == 14 and length >= 8:  # if_tsoffset
+            ts_offset = struct.unpack_from(byte_order + 'q', data, value)[0]
+        offset = value + ((length + 3) & ~3)  # Option values are padded to 32 bits
+    return divisor, ts_offset
+
+
+# Function to apply a Section Header Block or Interface Description Block to the reader state
+def read_section_block(data, offset, block_type, state):
+    if block_type == SECTION_HEADER_BLOCK:
+        magic = struct.unpack_from('<I', data, offset + 8)[0]
+        state.byte_order = '<' if magic == BYTE_ORDER_MAGIC else '>'
+        state.interfaces = []  # Interfaces are numbered per section
+    elif block_type == INTERFACE_DESCRIPTION_BLOCK:
+        byte_order = state.byte_order
+        block_length = struct.unpack_from(byte_order + 'I', data, offset + 4)[0]
+        linktype = struct.unpack_from(byte_order + 'H', data, offset + 8)[0]
+        divisor, ts_offset = parse_interface_options(data, offset + 16, offset + block_length - 4, byte_order)
+        state.interfaces.append((linktype, divisor, ts_offset))
+
+
+# Function to get the interface of a packet block, failing with the block offset when the capture is corrupt
+def lookup_interface(interfaces, interface_id, offset):
+    if interface_id >= len(interfaces):
+        raise ValueError(f"Malformed pcapng packet block at offset {offset}: "
+                         f"interface {interface_id} is not defined ({len(interfaces)} interfaces)")
+    return interfaces[interface_id]
+
+
+# Function to walk the pcapng blocks of a buffer and yield (timestamp, length, link type, data, start, end)
+# for every packet block between state.offset and end_offset. The state is updated as blocks are read.
+def iter_packet_blocks(data, state, end_offset=None):
+    if end_offset is None:
+        end_offset = len(data)
+    offset = state.offset
+    byte_order = state.byte_order
+    interfaces = state.interfaces
+    header = struct.Struct(byte_order + 'II')
+    epb = struct.Struct(byte_order + 'IIIII')
+
+    while offset + 12 <= end_offset:
+        block_type = header.unpack_from(data, offset)[0]
+
+        if block_type == SECTION_HEADER_BLOCK:  # A new section may change the byte order
+            read_section_block(data, offset, block_type, state)
+            byte_order = state.byte_order
+            interfaces = state.interfaces
+            header = struct.Struct(byte_order + 'II')
+            epb = struct.Struct(byte_order + 'IIIII')
+
+        block_length = header.unpack_from(data, offset)[1]
+        if block_length < 12 or offset + block_length > len(data):
+            break  # Truncated block (e.g. a capture that is still being written)
+
+        if block_type == ENHANCED_PACKET_BLOCK:
+            interface_id, ts_high, ts_low, captured_length, original_length = epb.unpack_from(data, offset + 8)
+            linktype, divisor, ts_offset = lookup_interface(interfaces, interface_id, offset)
+            timestamp = ticks_to_timestamp((ts_high << 32) | ts_low, divisor, ts_offset)
+            start = offset + 28
+            state.last_timestamp = timestamp
+            offset += block_length
+            state.offset = offset
+            yield timestamp, original_length, linktype, data, start, start + captured_length
+            continue
+        elif block_type == SIMPLE_PACKET_BLOCK:
+            original_length = header.unpack_from(data, offset + 8)[0]
+            linktype = lookup_interface(interfaces, 0, offset)[0]
+            start = offset + 12
+            captured_length = min(original_length, block_length - 16)
+            offset += block_length
+            state.offset = offset
+            yield state.last_timestamp, original_length, linktype, data, start, start + captured_length
+            continue
+        elif block_type == OBSOLETE_PACKET_BLOCK:
+            interface_id = struct.unpack_from(byte_order + 'H', data, offset + 8)[0]
+            ts_high, ts_low, captured_length, original_length = struct.unpack_from(byte_order + 'IIII', data, offset + 12)
+            linktype, divisor, ts_offset = lookup_interface(interfaces, interface_id, offset)
+            timestamp = ticks_to_timestamp((ts_high << 32) | ts_low, divisor, ts_offset)
+            start = offset + 28
+            state.last_timestamp = timestamp
+            offset += block_length
+            state.offset = offset
+            yield timestamp, original_length, linktype, data, start, start + captured_length
+            continue
+        elif block_type == INTERFACE_DESCRIPTION_BLOCK:
+            read_section_block(data, offset, block_type, state)
+
+        offset += block_length  # Skip every other block type (statistics, name resolution, ...)
+        state.offset = offset
+
+
+# Function to walk the records of a classic libpcap buffer, yielding the same tuples as iter_packet_blocks
+def iter_pcap_records(data, state, end_offset=None):
+    if end_offset is None:
+        end_offset = len(data)
+    magic = struct.unpack_from('<I', data, 0)[0]
+    byte_order = '<' if magic in (PCAP_MAGIC_MICRO, PCAP_MAGIC_NANO) else '>'
+    magic = struct.unpack_from(byte_order + 'I', data, 0)[0]
+    divisor = 10 ** 9 if magic == PCAP_MAGIC_NANO else 10 ** 6
+    linktype = struct.unpack_from(byte_order + 'I', data, 20)[0] & 0x0FFFFFFF
+    record = struct.Struct(byte_order + 'IIII')
+    offset = max(state.offset, 24)  # Records start after the 24-byte global header
+
+    while offset + 16 <= end_offset:
+        ts_sec, ts_frac, captured_length, original_length = record.unpack_from(data, offset)
+        start = offset + 16
+        if start + captured_length > len(data):
+            break  # Truncated record
+        timestamp = ticks_to_timestamp(ts_sec * divisor + ts_frac, divisor, 0)
+        offset = start + captured_length
+        state.offset = offset
+        state.last_timestamp = timestamp
+        yield timestamp, original_length, linktype, data, start, offset
+
+
+# Function to check whether a buffer holds a classic libpcap capture rather than pcapng
+def is_classic_pcap(data):
+    return len(data) >= 24 and struct.unpack_from('<I', data, 0)[0] in (
+        PCAP_MAGIC_MICRO, PCAP_MAGIC_NANO, 0xD4C3B2A1, 0x4D3CB2A1)
+
+
+# Function to turn a raw packet tuple (timestamp, length, link type, data, start, end) into a PacketInfo record
+def decode_raw_packet(raw_packet):
+    timestamp, length, linktype, frame, start, end = raw_packet
+    decoded = decode_frame(linktype, frame, start, end)
+    if decoded is None:
+        return PacketInfo(timestamp, length, None, None, None, None, None, None, None)
+    return PacketInfo(timestamp, length, *decoded, None)
+
+
+# Function to turn raw packet tuples into PacketInfo records
+# (with the metrics enabled, the block reading and the header decoding are timed separately)
+def decode_raw_packets(raw_packets):
+    if METRICS_ENABLED:
+        return timed_conversion(raw_packets, decode_raw_packet, detail='native')
+    return map(decode_raw_packet, raw_packets)
+
+
+# Function to turn the raw packet tuples of a buffer into PacketInfo records
+def iter_buffer_packets(data, state, end_offset=None):
+    blocks = iter_pcap_records if is_classic_pcap(data) else iter_packet_blocks
+    return decode_raw_packets(blocks(data, state, end_offset))
+
+
+# Function to read exactly size bytes from a stream (fewer only when the stream ends)
+def read_stream(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break  # End of the stream
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+# Function to read the raw packets of a pcapng or pcap stream (such as a pipe from dumpcap or tcpdump -w -).
+# The stream cannot be memory-mapped, so it is read one block (or record) at a time and every block
+# is passed through the same parser as a capture file.
+def iter_stream_blocks(stream):
+    magic = read_stream(stream, 4)
+    if len(magic) < 4:
+        return
+
+    if is_classic_pcap(magic + bytes(20)):
+        global_header = magic + read_stream(stream, 20)
+        byte_order = '<' if struct.unpack_from('<I', magic)[0] in (PCAP_MAGIC_MICRO, PCAP_MAGIC_NANO) else '>'
+        while True:
+            record = read_stream(stream, 16)
+            if len(record) < 16:
+                return
+            captured_length = struct.unpack_from(byte_order + 'I', record, 8)[0]
+            frame = read_stream(stream, captured_length)
+            if len(frame) < captured_length:
+                return  # The stream ended inside a record
+            yield from iter_pcap_records(global_header + record + frame, ReaderState())
+
+    state = ReaderState()
+    head = magic
+    while True:
+        head += read_stream(stream, 12 - len(head))  # Block type, block length and the first body word
+        if len(head) < 12:
+            return
+        byte_order = state.byte_order
+        if struct.unpack_from('<I', head, 0)[0] == SECTION_HEADER_BLOCK:  # The byte order magic follows the length
+            byte_order = '<' if struct.unpack_from('<I', head, 8)[0] == BYTE_ORDER_MAGIC else '>'
+        block_length = struct.unpack_from(byte_order + 'I', head, 4)[0]
+        if block_length < 12:
+            return  # Corrupt stream
+        block = head + read_stream(stream, block_length - 12)
+        if len(block) < block_length:
+            return  # The stream ended inside a block
+        state.offset = 0
+        yield from iter_packet_blocks(block, state)
+        head = b''
+
+
+# Function to read a pcapng (or pcap) stream without tshark and yield a PacketInfo record for every packet
+def iter_stream_packets(stream):
+    return decode_raw_packets(iter_stream_blocks(stream))
+
+
+# Function to memory-map a capture file (an empty file cannot be mapped, so it becomes an empty buffer)
+def open_capture_buffer(pcap_file):
+    with open(pcap_file, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b''
+
+
+# Function to read a pcapng (or pcap) file without tshark and yield a PacketInfo record for every packet.
+# A state and end offset from split_capture restrict the reading to one chunk of the file.
+def iter_packets(pcap_file, state=None, end_offset=None):
+    data = open_capture_buffer(pcap_file)
+    try:
+        yield from iter_buffer_packets(data, state or ReaderState(), end_offset)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()  # Unmap the file to release resources
+
+
+# Function to read the TCP segments of a capture file, with their payload, for stream reassembly.
+# Yields (timestamp, ip_src, ip_dst, src_port, dst_port, sequence number, flags, payload bytes).
+def iter_tcp_segments(pcap_file):
+    data = open_capture_buffer(pcap_file)
+    blocks = iter_pcap_records if is_classic_pcap(data) else iter_packet_blocks
+    try:
+        for timestamp, length, linktype, frame, start, end in blocks(data, ReaderState()):
+            segment = decode_tcp_segment(linktype, frame, start, end)
+            if segment is not None:
+                ip_src, ip_dst, src_port, dst_port, sequence, flags, payload_start, payload_end = segment
+                yield timestamp, ip_src, ip_dst, src_port, dst_port, sequence, flags, bytes(frame[payload_start:payload_end])
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()  # Unmap the file to release resources
+
+
+# Function to find the offsets where a buffer can be cut into chunks without splitting a block.
+# Only the block headers are read. Returns a list of (state at the chunk start, chunk end offset).
+def split_buffer(data, chunk_count):
+    size = len(data)
+    if chunk_count <= 1 or size == 0:
+        return [(ReaderState(), size)]
+
+    targets = [size * i // chunk_count for i in range(1, chunk_count)]  # Ideal cut positions
+    state = ReaderState()
+    chunks = []
+    chunk_start = state.copy()
+
+    if is_classic_pcap(data):
+        byte_order = '<' if struct.unpack_from('<I', data, 0)[0] in (PCAP_MAGIC_MICRO, PCAP_MAGIC_NANO) else '>'
+        captured = struct.Struct(byte_order + 'I')
+        offset = 24  # Records start after the 24-byte global header
+        while offset + 16 <= size and targets:
+            if offset >= targets[0]:
+                chunks.append((chunk_start, offset))
+                chunk_start = state.copy()
+                chunk_start.offset = offset
+                while targets and targets[0] <= offset:
+                    targets.pop(0)
+            offset += 16 + captured.unpack_from(data, offset + 8)[0]
+    else:
+        offset = 0
+        while offset + 12 <= size and targets:
+            block_type = struct.unpack_from(state.byte_order + 'I', data, offset)[0]
+            if offset >= targets[0] and block_type != SECTION_HEADER_BLOCK:
+                chunks.append((chunk_start, offset))  # Cut just before this block
+                chunk_start = state.copy()
+                chunk_start.offset = offset
+                while targets and targets[0] <= offset:
+                    targets.pop(0)
+            if block_type in (SECTION_HEADER_BLOCK, INTERFACE_DESCRIPTION_BLOCK):
+                read_section_block(data, offset, block_type, state)  # Keep track of the interfaces
+            block_length = struct.unpack_from(state.byte_order + 'I', data, offset + 4)[0]
+            if block_length < 12:
+                break  # Corrupt block, keep the rest of the file in the last chunk
+            offset += block_length
+
+    chunks.append((chunk_start, size))
+    return chunks
+
+
+# Function to split a capture file into at most chunk_count chunks aligned on block boundaries
+def split_capture(pcap_file, chunk_count):
+    data = open_capture_buffer(pcap_file)
+    try:
+        return split_buffer(data, chunk_count)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
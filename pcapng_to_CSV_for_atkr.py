@@ -1,69 +1,81 @@
-import pyshark  # Importing PyShark for network packet capture analysis
-import pandas as pd  # Importing Pandas for data manipulation
-import asyncio  # Import asyncio to handle event loop issues
+from packet_engine import DEFAULT_BACKEND, TSHARK_BACKEND, iter_packets, get_pcap_files  # Importing the shared packet reader (native pcapng or PyShark backend)
+from parallel_runner import map_files  # Importing the runner that spreads files over CPU cores
+from traffic_table import CSV_FORMAT, open_traffic_writer  # Importing the CSV/Parquet traffic table writers
 import os  # Import os to interact with the filesystem
-import glob  # Import glob to find files matching a pattern
+import sys  # Import sys to detect the platform
+import time  # Import time to measure the conversion throughput
 
 # Directories
 PCAP_DIR = 'pcapng_files'  # Directory containing .pcapng files
 CSV_DIR = 'csv_files'  # Directory where CSV files will be stored
 
-# Ensure the CSV directory exists
-os.makedirs(CSV_DIR, exist_ok=True)
+# Output format: 'csv' (text) or 'parquet' (typed and columnar, requires pyarrow)
+OUTPUT_FORMAT = os.environ.get('TRAFFIC_FORMAT', CSV_FORMAT)
 
-# Function to analyze a PCAP file and extract network traffic information
-def analyze_pcap(file_path, output_csv):
-    cap = pyshark.FileCapture(file_path, display_filter="ip")  # Open pcap file with IP filter
-    traffic_data = []  # List to store extracted packet data
 
-    for pkt in cap:
-        try:
-            timestamp = float(pkt.sniff_time.timestamp())  # Extract timestamp of the packet
-            size = int(pkt.length)  # Extract packet size in bytes
-            src_ip = pkt.ip.src if hasattr(pkt, 'ip') else "Unknown"  # Extract source IP
-            dst_ip = pkt.ip.dst if hasattr(pkt, 'ip') else "Unknown"  # Extract destination IP
+# Function to get the peak resident memory of this process in MB (None where it is not available)
+def peak_rss_mb():
+    try:
+        import resource  # Only available on Unix
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # Bytes on macOS, KB on Linux
+
 
-            # Check if the packet has a transport layer (TCP/UDP) before accessing ports
-            if hasattr(pkt, 'transport_layer') and pkt.transport_layer:
-                src_port = getattr(pkt[pkt.transport_layer], 'srcport', "Unknown")  # Extract source port
-                dst_port = getattr(pkt[pkt.transport_layer], 'dstport', "Unknown")  # Extract destination port
-            else:
-                src_port = "Unknown"  # Default to "Unknown" if no transport layer is found
-                dst_port = "Unknown"
+# Function to analyze a PCAP file and extract network traffic information.
+# Rows are streamed to the output in fixed-size batches (CSV) or row groups (Parquet), so memory stays
+# flat regardless of the capture size. Returns the row count, rows/sec and peak RSS of the conversion.
+def analyze_pcap(file_path, output_csv, backend=None, output_format=CSV_FORMAT):
+    start_time = time.perf_counter()
+    writer = open_traffic_writer(output_csv, output_format)
+    try:
+        for pkt in iter_packets(file_path, backend):
+            if pkt.ip_version != 4:
+                continue  # Keep only IP packets
 
-            # Append extracted data to the list
-            traffic_data.append([timestamp, size, src_ip, dst_ip, src_port, dst_port])
+            # Ports are None when the packet has no transport layer (TCP/UDP)
+            writer.write_row(pkt.timestamp, pkt.length, pkt.ip_src, pkt.ip_dst, pkt.src_port, pkt.dst_port)
+    finally:
+        writer.close()  # Write the last batch and close the file
 
-        except AttributeError:
-            continue  # Skip packets that do not have necessary fields
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        'rows': writer.row_count,
+        'seconds': elapsed,
+        'rows_per_sec': writer.row_count / elapsed if elapsed > 0 else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    rss = f"{stats['peak_rss_mb']:.1f} MB" if stats['peak_rss_mb'] is not None else "n/a"
+    print(f"Analysis saved to {output_csv} ({stats['rows']:,} rows, "
+          f"{stats['rows_per_sec']:,.0f} rows/sec, peak RSS {rss})")  # Notify user of saved analysis
+    return stats
 
-    # Properly close the capture
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            asyncio.ensure_future(cap.close_async())  # Schedule close asynchronously
-        else:
-            loop.run_until_complete(cap.close_async())  # Close the capture file properly
-    except RuntimeError:  # In case the event loop is already running
-        pass
 
-    # Convert extracted data to a Pandas DataFrame for analysis
-    df = pd.DataFrame(traffic_data,
-                      columns=["Timestamp", "Size", "Source IP", "Destination IP", "Source Port", "Destination Port"])
+# Function to get the output file of a pcap file in the CSV directory
+def output_path(pcap_file):
+    filename = os.path.basename(pcap_file).replace(".pcapng", f"_analysis.{OUTPUT_FORMAT}")  # Extract filename
+    os.makedirs(CSV_DIR, exist_ok=True)  # Ensure the CSV directory exists
+    return os.path.join(CSV_DIR, filename)  # Save in CSV directory
 
-    df.to_csv(output_csv, index=False)  # Save the results to a CSV file
-    print(f"Analysis saved to {output_csv}")  # Notify user of saved analysis
 
+# Function to convert one pcap file into a CSV (or Parquet) file in the CSV directory
+def convert_pcap_file(pcap_file):
+    analyze_pcap(pcap_file, output_path(pcap_file), output_format=OUTPUT_FORMAT)
 
-# Function to get all .pcapng files in the folder
-def get_pcap_files(directory):
-    return glob.glob(os.path.join(directory, "*.pcapng"))  # List all .pcapng files in the directory
 
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
 
-# Detect and process all .pcapng files in the directory
-pcap_files = get_pcap_files(PCAP_DIR)
+    # Detect and process all .pcapng files in the directory
+    pcap_files = get_pcap_files(PCAP_DIR)
 
-for pcap_file in pcap_files:
-    filename = os.path.basename(pcap_file).replace(".pcapng", "_analysis.csv")  # Extract filename
-    output_file = os.path.join(CSV_DIR, filename)  # Save in CSV directory
-    analyze_pcap(pcap_file, output_file)
\ No newline at end of file
+    if DEFAULT_BACKEND == TSHARK_BACKEND:
+        # Concurrent tshark processes feeding the writers through bounded queues (see tshark_pipeline)
+        from tshark_pipeline import convert_captures
+        output_files = [output_path(pcap_file) for pcap_file in pcap_files]
+        for output_file, rows in zip(output_files, convert_captures(pcap_files, output_files, OUTPUT_FORMAT)):
+            print(f"Analysis saved to {output_file} ({rows:,} rows)")
+    else:
+        map_files(convert_pcap_file, pcap_files)  # Convert the files in parallel, one worker per CPU core
@@ -0,0 +1,45 @@
+import argparse  # Import argparse to read the command line options
+import sys  # Import sys to write the capture to stdout
+import time  # Import time to pace the packets
+
+import pcapng_reader  # Importing the native reader to find the packet blocks and their timestamps
+
+
+# Function to write a capture file to a stream, block by block, at the pace of its packet timestamps.
+# speed=1 replays in real time, speed=10 ten times faster, and speed=0 as fast as possible.
+def replay_capture(pcap_file, output, speed=1.0):
+    data = pcapng_reader.open_capture_buffer(pcap_file)
+    state = pcapng_reader.ReaderState()
+    blocks = pcapng_reader.iter_pcap_records if pcapng_reader.is_classic_pcap(data) else pcapng_reader.iter_packet_blocks
+
+    written = 0  # Offset of the first byte not written yet
+    first_timestamp = start_time = None
+    for timestamp, *_ in blocks(data, state):
+        if speed > 0:
+            if first_timestamp is None:
+                first_timestamp, start_time = timestamp, time.monotonic()
+            delay = (timestamp - first_timestamp) / speed - (time.monotonic() - start_time)
+            if delay > 0:
+                output.flush()
+                time.sleep(delay)  # Wait until the packet is due
+        # Everything up to the end of this packet block, including the header and interface blocks before it
+        output.write(data[written:state.offset])
+        written = state.offset
+    output.write(data[written:])  # Trailing blocks (statistics, ...)
+    output.flush()
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    parser = argparse.ArgumentParser(description="Replay a capture file to stdout at its original pace")
+    parser.add_argument('pcap_files', nargs='+', help="capture files, replayed one after the other")
+    parser.add_argument('--speed', type=float, default=1.0, help="speed factor (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    try:
+        for pcap_file in args.pcap_files:
+            replay_capture(pcap_file, sys.stdout.buffer, args.speed)
+    except BrokenPipeError:
+        pass  # The reader stopped
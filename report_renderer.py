@@ -0,0 +1,159 @@
+import argparse  # Import argparse to read the command-line options
+import html  # Import html to escape the texts of the report page
+import io  # Import io to collect the messages printed by the plot functions
+import os  # Import os to interact with the filesystem
+import time  # Import time to measure the analysis and plotting stages
+from concurrent.futures import ProcessPoolExecutor  # Importing a process pool to render the figures on every CPU core
+from contextlib import redirect_stdout  # Import redirect_stdout to capture the messages of the plot functions
+from datetime import datetime  # Import datetime to name the report directories
+
+from packet_engine import get_pcap_files  # Importing the pcap file lookup
+from parallel_runner import DEFAULT_WORKERS, map_files  # Importing the runner that spreads files over CPU cores
+from instrumentation import METRICS  # Importing the stage metrics of the run
+
+
+# Report settings (can be overridden from the environment)
+REPORT_DIR = os.environ.get('PCAP_REPORT_DIR', 'reports')  # Each run writes a new directory inside it
+REPORT_FORMATS = ('png', 'svg')  # Image formats the figures can be saved in
+REPORT_DPI = 100  # Resolution of the PNG images
+
+
+# Function to switch Matplotlib to the non-interactive Agg backend: figures are drawn in memory
+# and plt.show() returns immediately instead of opening a window
+def use_headless_backend():
+    import matplotlib.pyplot as plt  # Imported here so the backend is chosen in every worker process
+    plt.switch_backend('Agg')
+
+
+# Function to run one plot function and save every figure it created.
+# task = (index, plot function, arguments); returns (image files and titles, printed messages, seconds)
+def render_plot(task, output_dir, formats):
+    import matplotlib.pyplot as plt
+    index, plot, args = task
+    start = time.perf_counter()
+    plt.close('all')
+    messages = io.StringIO()
+    with redirect_stdout(messages):  # Messages such as "No TLS data found" go into the report
+        plot(*args)
+
+    images = []
+    for number, figure_number in enumerate(plt.get_fignums()):
+        figure = plt.figure(figure_number)
+        title = next((axes.get_title() for axes in figure.axes if axes.get_title()), '')
+        files = {}
+        for image_format in formats:
+            file_name = f'figure_{index:04d}_{number}.{image_format}'
+            figure.savefig(os.path.join(output_dir, file_name), format=image_format, dpi=REPORT_DPI)
+            files[image_format] = file_name
+        images.append((title, files))
+    plt.close('all')
+    return images, messages.getvalue().strip(), time.perf_counter() - start
+
+
+# Function to render the plots in parallel worker processes, in the order of the tasks.
+# plots = list of (section, plot function, arguments); returns the render_plot results
+def render_plots(plots, output_dir, formats=('png',), workers=None):
+    tasks = [(index, plot, args) for index, (section, plot, args) in enumerate(plots)]
+    workers = min(workers or DEFAULT_WORKERS, len(tasks))
+    if workers <= 1:
+        use_headless_backend()
+        return [render_plot(task, output_dir, formats) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_headless_backend) as pool:
+        return list(pool.map(render_plot, tasks, [output_dir] * len(tasks), [formats] * len(tasks)))
+
+
+# Function to write the HTML page of the report, with one section per capture or traffic file
+def write_html_report(output_dir, plots, rendered, timings):
+    sections = {}  # Section title -> list of HTML blocks, in the order of the plots
+    for (section, plot, args), (images, messages, seconds) in zip(plots, rendered):
+        blocks = sections.setdefault(section, [])
+        if messages:
+            blocks.append(f'<pre>{html.escape(messages)}</pre>')
+        for title, files in images:
+            image_file = files.get('svg', files.get('png'))
+            links = ' '.join(f'<a href="{html.escape(name)}">{image_format}</a>' for image_format, name in files.items())
+            blocks.append(f'<figure><img src="{html.escape(image_file)}" alt="{html.escape(title)}">'
+                          f'<figcaption>{html.escape(title)} ({links})</figcaption></figure>')
+
+    timing_rows = ''.join(f'<tr><td>{html.escape(stage)}</td><td>{seconds:.2f} s</td></tr>' for stage, seconds in timings)
+    body = [f'<h1>Traffic analysis report</h1><p>Generated {datetime.now():%Y-%m-%d %H:%M:%S}</p>',
+            f'<table>{timing_rows}</table>']
+    for section, blocks in sections.items():
+        body.append(f'<h2>{html.escape(section)}</h2>')
+        body.extend(blocks)
+
+    page = ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Traffic analysis report</title>'
+            '<style>body{font-family:sans-serif;margin:2em}img{max-width:100%}figure{margin:1em 0}'
+            'td{padding:0 1em 0 0}</style></head><body>' + '\n'.join(body) + '</body></html>')
+    path = os.path.join(output_dir, 'index.html')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return path
+
+
+# Function to analyze the captures (and the converted traffic tables) and list every plot of the report
+def collect_plots(pcap_files, csv_files, backend=None, workers=None):
+    from all_statistics import compute_all_statistics, statistics_plots  # Importing the A-G statistics
+    from tls_sessions import analyze_tls_sessions, find_keylog_files  # Importing the TLS session analysis
+    from C_TLS_header_fields import plot_tls_latencies  # Importing the TLS latency plot
+
+    plots = []
+    if pcap_files:
+        all_results = compute_all_statistics(pcap_files, backend)
+        # The TLS versions (C) are counted by the session pass, so the report needs no tshark dissection
+        all_sessions = map_files(analyze_tls_sessions, pcap_files, workers, find_keylog_files())
+        for pcap_file, results, (sessions, record_sizes, record_versions) in zip(pcap_files, all_results, all_sessions):
+            results[2] = record_versions
+            plots.append((pcap_file, plot_tls_latencies, (sessions, pcap_file)))
+        plots = statistics_plots(pcap_files, all_results) + plots
+        plots.sort(key=lambda plot: plot[0] is None)  # Per-file sections first, then the comparisons (stable)
+
+    if csv_files:
+        import atkr_part_A  # Imported here because the traffic tables need pandas
+        import atkr_part_B
+        for module in (atkr_part_A, atkr_part_B):
+            for file_path, stats in zip(csv_files, map_files(module.load_statistics, csv_files, workers)):
+                plots.append((file_path, module.plot_statistics, (stats,)))
+
+    # Section titles: the file names, and a last section comparing all the captures
+    return [(os.path.basename(section) if section else 'All captures', plot, args) for section, plot, args in plots]
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    from all_statistics import PCAP_DIR  # Importing the default capture directory
+    from atkr_part_A import CSV_DIR  # Importing the default traffic table directory
+
+    parser = argparse.ArgumentParser(description="Render every statistics plot into an HTML report, without windows.")
+    parser.add_argument('--pcap-dir', default=PCAP_DIR, help="directory of the PCAPNG files")
+    parser.add_argument('--csv-dir', default=CSV_DIR, help="directory of the converted traffic tables ('' to skip them)")
+    parser.add_argument('--output', help="report directory (default: a new timestamped directory in reports/)")
+    parser.add_argument('--format', nargs='+', choices=REPORT_FORMATS, default=['png'], help="image formats")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU core)")
+    parser.add_argument('--backend', help="packet reading backend ('native', 'pyshark' or 'tshark')")
+    options = parser.parse_args()
+
+    output_dir = options.output or os.path.join(REPORT_DIR, f'report_{datetime.now():%Y%m%d_%H%M%S}')
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    from traffic_table import get_traffic_files  # Importing the traffic table lookup
+    csv_files = get_traffic_files(options.csv_dir) if options.csv_dir else []
+    plots = collect_plots(get_pcap_files(options.pcap_dir), csv_files, options.backend, options.workers)
+    analysis_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rendered = render_plots(plots, output_dir, options.format, options.workers)
+    plotting_time = time.perf_counter() - start
+    for (section, plot, args), (images, messages, seconds) in zip(plots, rendered):
+        METRICS.add('plot', plot.__name__, seconds, items=len(images))  # Time of every plot function in the workers
+
+    figure_count = sum(len(images) for images, messages, seconds in rendered)
+    timings = [('Analysis', analysis_time), ('Plotting', plotting_time),
+               ('Plotting (sum over workers)', sum(seconds for images, messages, seconds in rendered))]
+    path = write_html_report(output_dir, plots, rendered, timings)
+    print(f"Analysis: {analysis_time:.2f} s, plotting: {plotting_time:.2f} s ({figure_count} figures)")
+    print(f"Report written to {path}")
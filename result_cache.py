@@ -0,0 +1,229 @@
+import contextlib  # Import contextlib for the lock of the hash index
+import functools  # Import functools to hash every source file once per process
+import hashlib  # Import hashlib to fingerprint the file contents and build cache keys
+import importlib.util  # Import importlib to find the source files of the analyzer modules
+import json  # Import json to store the index of file hashes
+import os  # Import os to interact with the filesystem
+import pickle  # Import pickle to store the analysis results
+import sys  # Import sys to find the modules of the analyzers
+import tempfile  # Import tempfile to write cache entries atomically
+
+try:
+    import fcntl  # Import fcntl to lock the hash index (POSIX)
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt  # Import msvcrt to lock the hash index (Windows)
+except ImportError:
+    msvcrt = None
+
+
+# Cache location and size limit (can be overridden from the environment)
+CACHE_DIR = os.environ.get('PCAP_CACHE_DIR', '.analysis_cache')
+CACHE_SIZE_LIMIT = int(os.environ.get('PCAP_CACHE_SIZE', 512 * 1024 * 1024))  # Bytes
+CACHE_ENABLED = os.environ.get('PCAP_CACHE', '1') != '0'  # PCAP_CACHE=0 disables the cache
+
+HASH_INDEX_FILE = 'file_hashes.json'  # Remembers the content hash of every (path, size, mtime)
+ENTRY_SUFFIX = '.pkl'
+READER_MODULES = ['packet_engine', 'pcapng_reader', 'tshark_pipeline']  # Modules that decode the packets
+
+
+# Function to write a file atomically, so concurrent workers never read a half-written entry
+def write_atomically(path, data):
+    directory = os.path.dirname(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+# Function to compute the content hash of a file
+def hash_file(path, block_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Function to get the content hash of a source file, hashed once per process ('' when there is no file)
+@functools.lru_cache(maxsize=None)
+def source_hash(path):
+    return hash_file(path) if path and os.path.isfile(path) else ''
+
+
+# Function to get the source file of a module without importing it (None for built-in modules)
+def module_source(module_name):
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return getattr(module, '__file__', None)
+    spec = importlib.util.find_spec(module_name)
+    return spec.origin if spec is not None else None
+
+
+# Function to describe a list of analyzer classes for the cache key: their names and a hash of the source of
+# their modules and of the packet readers, so any change to the code that produces the results invalidates them
+def analyzer_signature(analyzer_classes):
+    return ([(cls.__module__, cls.__qualname__, source_hash(module_source(cls.__module__))) for cls in analyzer_classes]
+            + [(name, source_hash(module_source(name))) for name in READER_MODULES])
+
+
+# Function to hold an exclusive lock on a lock file next to the given file while the block runs
+# (other processes wait for it; where file locks are not available the block runs unlocked)
+@contextlib.contextmanager
+def locked(path):
+    with open(path + '.lock', 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Function to remove the index entries of files that no longer exist or have a different size or mtime.
+# Returns False when nothing was removed, so the index is not rewritten.
+def prune_hash_index(index):
+    stale = []
+    for path, (size, mtime_ns, _) in index.items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stale.append(path)
+            continue
+        if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+            stale.append(path)
+    for path in stale:
+        del index[path]
+    return bool(stale)
+
+
+# Class to store analysis results on disk, keyed by a fingerprint of the input file and of the analysis.
+# Entries are evicted least recently used first once the directory grows above the size limit.
+class ResultCache:
+    def __init__(self, cache_dir=CACHE_DIR, size_limit=CACHE_SIZE_LIMIT):
+        self.cache_dir = cache_dir
+        self.size_limit = size_limit
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Function to read the index of file hashes (path -> [size, mtime, content hash])
+    def read_hash_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, HASH_INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # Function to change the index of file hashes: the index is read again and rewritten under a lock,
+    # so the entries other processes added in the meantime are kept
+    def update_hash_index(self, change):
+        index_path = os.path.join(self.cache_dir, HASH_INDEX_FILE)
+        with locked(index_path):
+            index = self.read_hash_index()
+            if change(index) is not False:
+                write_atomically(index_path, json.dumps(index).encode())
+
+    # Function to get the content hash of a file; it is only recomputed when the file's size or mtime changes
+    def content_hash(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.read_hash_index().get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        content_hash = hash_file(path)  # Hashed outside the lock, so other processes are not kept waiting
+
+        def add(index):
+            index[path] = [stat.st_size, stat.st_mtime_ns, content_hash]
+        self.update_hash_index(add)
+        return content_hash
+
+    # Function to build the cache key of an analysis: file path + size + mtime + content hash + analysis description
+    def key_for(self, path, *analysis):
+        stat = os.stat(path)
+        fingerprint = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns, self.content_hash(path), analysis]
+        return hashlib.sha256(repr(fingerprint).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    # Function to get a cached result, or None when it is missing. An entry that can no longer be loaded
+    # (corrupt, or pickled from a class that was moved or changed since) is deleted and treated as missing.
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except OSError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError, ValueError):
+            self.remove(path)
+            return None
+        os.utime(path)  # Mark the entry as recently used
+        return value
+
+    # Function to store a result and evict old entries if the cache is too large
+    def put(self, key, value):
+        write_atomically(self.entry_path(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    # Function to delete the least recently used entries until the cache fits in the size limit,
+    # and to forget the hashes of files that were deleted or changed since they were hashed
+    def evict(self):
+        self.update_hash_index(prune_hash_index)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(ENTRY_SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue  # Deleted by another process
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):  # Oldest first
+            if total_size <= self.size_limit:
+                break
+            self.remove(os.path.join(self.cache_dir, name))
+            total_size -= size
+
+    # Function to delete a cache entry (another process may have deleted it already)
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # Function to return the cached result of an analysis of a file, computing and storing it on a miss
+    def get_or_compute(self, path, analysis, compute):
+        key = self.key_for(path, analysis)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+
+# Function to open the default cache, or None when caching is disabled
+def open_default_cache():
+    return ResultCache() if CACHE_ENABLED else None
+
+
+# Function to get the result of an analysis of a file through the default cache (computed directly if it is disabled)
+def cached_result(path, analysis, compute):
+    cache = open_default_cache()
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(path, analysis, compute)
@@ -0,0 +1,207 @@
+import hashlib  # Import hashlib for a hash that is the same in every worker process
+import math  # Import math to size the sketches from their error bounds
+import os  # Import os to read the sketch settings from the environment
+from array import array  # Import array to store the counters in a fixed-size typed buffer
+from functools import lru_cache  # Import lru_cache to avoid hashing the same IP address or port again
+
+
+# Sketch settings (can be overridden from the environment)
+SKETCH_ENABLED = os.environ.get('PCAP_SKETCH', '0') == '1'  # PCAP_SKETCH=1 makes scripts A and B use sketches
+SKETCH_EPSILON = float(os.environ.get('SKETCH_EPSILON', 0.001))  # Count-Min error, as a fraction of all counts
+SKETCH_DELTA = float(os.environ.get('SKETCH_DELTA', 0.01))  # Probability that a Count-Min estimate exceeds the error
+SKETCH_TOP_K = int(os.environ.get('SKETCH_TOP_K', 64))  # Number of heavy hitters tracked by Space-Saving
+SKETCH_DISTINCT_ERROR = float(os.environ.get('SKETCH_DISTINCT_ERROR', 0.02))  # HyperLogLog relative error
+
+
+HASH_BITS = 256  # Every key is hashed once; the Count-Min rows and HyperLogLog use different bits of the hash
+ROW_HASH_BITS = 24  # Bits of the hash used by each Count-Min row
+MAX_DEPTH = (HASH_BITS - 64) // ROW_HASH_BITS  # Rows available below the 64 bits used by HyperLogLog
+
+
+# Function to compute a 256-bit hash of a key (Python's hash() of strings differs between processes,
+# which would make sketches of different workers impossible to merge)
+@lru_cache(maxsize=65536)
+def hash_key(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=HASH_BITS // 8).digest(), 'little')
+
+
+# Class to estimate how often every key was seen, in a fixed number of counters.
+# An estimate is never below the true count, and exceeds it by more than epsilon * total
+# with a probability of at most delta.
+class CountMinSketch:
+    def __init__(self, epsilon=SKETCH_EPSILON, delta=SKETCH_DELTA):
+        self.width = math.ceil(math.e / epsilon)  # Counters per row
+        self.depth = min(math.ceil(math.log(1 / delta)), MAX_DEPTH)  # Rows, each with its own hash function
+        self.counters = array('Q', bytes(8 * self.width * self.depth))
+        self.total = 0  # Sum of all counts
+
+    # Function to get the counter index of a key in every row (each row uses its own bits of the hash)
+    def indexes(self, key_hash):
+        width = self.width
+        mask = (1 << ROW_HASH_BITS) - 1
+        return [row * width + (key_hash >> (row * ROW_HASH_BITS) & mask) % width for row in range(self.depth)]
+
+    def add(self, key_hash, count=1):
+        counters = self.counters
+        for index in self.indexes(key_hash):
+            counters[index] += count
+        self.total += count
+
+    def estimate(self, key_hash):
+        counters = self.counters
+        return min(counters[index] for index in self.indexes(key_hash))
+
+    def merge(self, other):
+        counters = self.counters
+        for index, count in enumerate(other.counters):
+            if count:
+                counters[index] += count
+        self.total += other.total
+
+    # Multiply every counter by the sampling factor (see packet_sampling)
+    def scale(self, factor):
+        self.counters = array('Q', (round(count * factor) for count in self.counters))
+        self.total = round(self.total * factor)
+
+
+# Class to track the k most frequent keys with the Space-Saving algorithm.
+# When a new key arrives and the table is full, it replaces the key with the smallest count and inherits
+# that count, so counts are never underestimated and any key with more than total / k occurrences is kept.
+class SpaceSaving:
+    def __init__(self, capacity=SKETCH_TOP_K):
+        self.capacity = capacity
+        self.counts = {}  # Key -> estimated count
+
+    def add(self, key, count=1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+        else:
+            smallest = min(counts, key=counts.get)
+            counts[key] = counts.pop(smallest) + count
+
+    # Function to get the smallest tracked count (the most a key that is not tracked can have been seen)
+    def floor(self):
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    # Join another summary: keys missing from one summary are counted with that summary's floor
+    def merge(self, other):
+        own_floor, other_floor = self.floor(), other.floor()
+        merged = {}
+        for key in self.counts.keys() | other.counts.keys():
+            merged[key] = self.counts.get(key, own_floor) + other.counts.get(key, other_floor)
+        self.counts = dict(sorted(merged.items(), key=lambda item: item[1], reverse=True)[:self.capacity])
+
+    def top(self, count):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def scale(self, factor):
+        self.counts = {key: round(count * factor) for key, count in self.counts.items()}
+
+
+# Class to estimate the number of distinct keys with HyperLogLog, within a relative error
+class HyperLogLog:
+    def __init__(self, error=SKETCH_DISTINCT_ERROR):
+        self.precision = min(max(math.ceil(math.log2((1.04 / error) ** 2)), 4), 18)
+        self.registers = bytearray(1 << self.precision)
+
+    def add(self, key_hash):
+        key_hash >>= HASH_BITS - 64  # The top 64 bits of the hash
+        index = key_hash >> (64 - self.precision)  # The first bits choose the register
+        rest = key_hash & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1  # Position of the first 1 bit in the remaining bits
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers)
+        estimate = alpha * registers * registers / sum(2.0 ** -rank for rank in self.registers)
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * registers and empty:
+            return round(registers * math.log(registers / empty))  # Linear counting for small cardinalities
+        return round(estimate)
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+
+# Class combining the three sketches to count keys in fixed memory:
+# Space-Saving keeps the candidate heavy hitters, Count-Min tightens their counts
+# and HyperLogLog estimates how many distinct keys were seen
+class HeavyHitters:
+    def __init__(self, epsilon=SKETCH_EPSILON, delta=SKETCH_DELTA, top_k=SKETCH_TOP_K, distinct_error=SKETCH_DISTINCT_ERROR):
+        self.count_min = CountMinSketch(epsilon, delta)
+        self.top_keys = SpaceSaving(top_k)
+        self.distinct_keys = HyperLogLog(distinct_error)
+
+    def add(self, key):
+        key_hash = hash_key(key)
+        self.count_min.add(key_hash)
+        self.top_keys.add(key)
+        self.distinct_keys.add(key_hash)
+
+    # Function to estimate the count of any key
+    def estimate(self, key):
+        return self.count_min.estimate(hash_key(key))
+
+    # Function to get the most frequent keys with their estimated counts
+    def top(self, count):
+        estimates = [(key, min(tracked, self.estimate(key))) for key, tracked in self.top_keys.top(self.top_keys.capacity)]
+        return sorted(estimates, key=lambda item: item[1], reverse=True)[:count]
+
+    def distinct(self):
+        return self.distinct_keys.count()
+
+    def merge(self, other):
+        self.count_min.merge(other.count_min)
+        self.top_keys.merge(other.top_keys)
+        self.distinct_keys.merge(other.distinct_keys)
+
+    # Multiply the counts by the sampling factor; the number of distinct keys is that of the sampled packets
+    def scale(self, factor):
+        self.count_min.scale(factor)
+        self.top_keys.scale(factor)
+
+
+# Class to count packets per IP address in fixed memory (sketch version of IPStatsAnalyzer)
+class IPStatsSketchAnalyzer:
+    def __init__(self):
+        self.ip_stats = HeavyHitters()
+
+    def process(self, packet):
+        if packet.ip_version == 4:  # Only packets with an IP layer are counted
+            self.ip_stats.add(packet.ip_src)
+            self.ip_stats.add(packet.ip_dst)
+
+    # The estimated counts of the heavy hitters, in the same form as IPStatsAnalyzer's dictionary
+    def result(self):
+        return dict(self.ip_stats.top(self.ip_stats.top_keys.capacity))
+
+    def merge(self, other):
+        self.ip_stats.merge(other.ip_stats)
+
+    def scale(self, factor):
+        self.ip_stats.scale(factor)
+
+
+# Class to count packets per TCP port in fixed memory (sketch version of TCPPortAnalyzer)
+class TCPPortSketchAnalyzer:
+    def __init__(self):
+        self.tcp_stats = HeavyHitters()
+
+    def process(self, packet):
+        if packet.transport == 'TCP':  # Only TCP packets are counted
+            self.tcp_stats.add(str(packet.src_port))  # Ports are kept as strings so they plot as labels
+            self.tcp_stats.add(str(packet.dst_port))
+
+    def result(self):
+        return dict(self.tcp_stats.top(self.tcp_stats.top_keys.capacity))
+
+    def merge(self, other):
+        self.tcp_stats.merge(other.tcp_stats)
+
+    def scale(self, factor):
+        self.tcp_stats.scale(factor)
@@ -0,0 +1,207 @@
+import argparse  # Import argparse to read the command-line options
+import random  # Import random to generate reproducible traffic from a seed
+import struct  # Import struct to encode the pcapng blocks and packet headers
+
+from pcapng_reader import (SECTION_HEADER_BLOCK, INTERFACE_DESCRIPTION_BLOCK, ENHANCED_PACKET_BLOCK,
+                           BYTE_ORDER_MAGIC, LINKTYPE_ETHERNET, ETHERTYPE_IPV4)  # Importing the pcapng constants
+
+
+# Default traffic shape
+DEFAULT_PACKETS = 100000
+DEFAULT_FLOWS = 1000
+DEFAULT_PROTOCOL_MIX = {'TCP': 0.8, 'UDP': 0.2}  # Share of the flows per transport protocol
+DEFAULT_TLS_SHARE = 0.5  # Share of the TCP flows that are TLS connections to port 443
+START_TIME = 1700000000.0  # Capture start (seconds since the epoch)
+MEAN_INTER_ARRIVAL = 0.0005  # Mean time between packets, in seconds (exponentially distributed)
+
+IP_PROTOCOLS = {'TCP': 6, 'UDP': 17}
+PLAIN_TCP_PORTS = [80, 22, 25, 8080, 3306]  # Server ports of the TCP flows that are not TLS
+UDP_PORTS = [53, 123, 443, 3478, 5353]  # Server ports of the UDP flows
+MAX_PAYLOAD = 1400  # Largest payload of a data packet (fits an Ethernet MTU)
+TLS_RECORD_VERSION = 0x0303
+
+# TCP flags
+SYN = 0x02
+PSH_ACK = 0x18
+ACK = 0x10
+SYN_ACK = 0x12
+
+ETHERNET_HEADER = struct.pack('>6s6sH', b'\x02\x00\x00\x00\x00\x02', b'\x02\x00\x00\x00\x00\x01', ETHERTYPE_IPV4)
+IPV4_HEADER = struct.Struct('>BBHHHBBH4s4s')
+TCP_HEADER = struct.Struct('>HHIIBBHHH')
+UDP_HEADER = struct.Struct('>HHHH')
+EPB_HEADER = struct.Struct('<IIIIIII')  # Block type, length, interface, timestamp high/low, captured/original length
+
+
+# Class holding the state of one synthetic flow (endpoints, and the TCP sequence numbers of each side)
+class SyntheticFlow:
+    def __init__(self, index, protocol, server_port, tls, rng):
+        self.client_ip = struct.pack('>I', 0x0A000000 + 1 + index % 0xFFFF)  # 10.0.x.y
+        self.server_ip = struct.pack('>I', 0xC0A80000 + 1 + rng.randrange(4096))  # 192.168.x.y
+        self.client_port = 1024 + index % 64000
+        self.server_port = server_port
+        self.protocol = protocol
+        self.tls = tls
+        self.sequences = [rng.getrandbits(32), rng.getrandbits(32)]  # Next sequence number per direction
+        self.stage = 0  # Packets of the TCP/TLS opening already sent
+
+    # Function to get the next packet of the flow as (direction, TCP flags, payload); direction 0 is client to server
+    def next_packet(self, rng):
+        stage = self.stage
+        self.stage += 1
+        if self.protocol == 'UDP':
+            return rng.randrange(2), 0, bytes(rng.randrange(32, MAX_PAYLOAD))
+        if stage == 0:
+            return 0, SYN, b''
+        if stage == 1:
+            return 1, SYN_ACK, b''
+        if self.tls and stage == 2:
+            return 0, PSH_ACK, tls_handshake_record(1, 508)  # ClientHello
+        if self.tls and stage == 3:
+            return 1, PSH_ACK, tls_handshake_record(2, 118)  # ServerHello
+        direction = rng.randrange(2)
+        if rng.random() < 0.3:
+            return direction, ACK, b''  # Pure acknowledgement
+        size = rng.randrange(32, MAX_PAYLOAD)
+        if self.tls:
+            return direction, PSH_ACK, tls_record(23, bytes(size - 5))  # Application data record
+        return direction, PSH_ACK, bytes(size)
+
+
+# Function to build a TLS record
+def tls_record(content_type, body):
+    return struct.pack('>BHH', content_type, TLS_RECORD_VERSION, len(body)) + body
+
+
+# Function to build a TLS handshake record holding one (zero-filled) handshake message
+def tls_handshake_record(message_type, length):
+    body = bytearray(length)
+    body[0:2] = struct.pack('>H', TLS_RECORD_VERSION)  # Legacy version, then random and the rest left empty
+    return tls_record(22, struct.pack('>I', message_type << 24 | length) + bytes(body))
+
+
+# Function to compute the IPv4 header checksum
+def ip_checksum(header):
+    total = sum(struct.unpack('>10H', header))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+# Function to build the Ethernet frame of a packet of a flow
+def build_frame(flow, direction, flags, payload):
+    source, destination = (flow.client_ip, flow.server_ip) if direction == 0 else (flow.server_ip, flow.client_ip)
+    ports = (flow.client_port, flow.server_port) if direction == 0 else (flow.server_port, flow.client_port)
+    if flow.protocol == 'TCP':
+        sequence = flow.sequences[direction]
+        transport = TCP_HEADER.pack(ports[0], ports[1], sequence, flow.sequences[1 - direction],
+                                    5 << 4, flags, 65535, 0, 0)
+        flow.sequences[direction] = (sequence + len(payload) + (1 if flags & SYN else 0)) & 0xFFFFFFFF
+    else:
+        transport = UDP_HEADER.pack(ports[0], ports[1], 8 + len(payload), 0)
+    total_length = 20 + len(transport) + len(payload)
+    header = IPV4_HEADER.pack(0x45, 0, total_length, 0, 0x4000, 64, IP_PROTOCOLS[flow.protocol], 0, source, destination)
+    header = header[:10] + struct.pack('>H', ip_checksum(header)) + header[12:]
+    return ETHERNET_HEADER + header + transport + payload
+
+
+# Function to encode a block with its padding and trailing length
+def encode_block(block_type, body):
+    padding = -len(body) % 4
+    length = 12 + len(body) + padding
+    return struct.pack('<II', block_type, length) + body + bytes(padding) + struct.pack('<I', length)
+
+
+# Function to encode an Enhanced Packet Block with a microsecond timestamp
+def encode_packet_block(timestamp, frame):
+    ticks = int(round(timestamp * 1000000))
+    padding = -len(frame) % 4
+    length = 32 + len(frame) + padding
+    return (EPB_HEADER.pack(ENHANCED_PACKET_BLOCK, length, 0, ticks >> 32, ticks & 0xFFFFFFFF, len(frame), len(frame))
+            + frame + bytes(padding) + struct.pack('<I', length))
+
+
+# Function to create the flows of a capture from the protocol mix and the TLS share
+def create_flows(flow_count, protocol_mix, tls_share, rng):
+    protocols = list(protocol_mix)
+    weights = [protocol_mix[protocol] for protocol in protocols]
+    flows = []
+    for index in range(flow_count):
+        protocol = rng.choices(protocols, weights)[0]
+        tls = protocol == 'TCP' and rng.random() < tls_share
+        if tls:
+            server_port = 443
+        else:
+            server_port = rng.choice(PLAIN_TCP_PORTS if protocol == 'TCP' else UDP_PORTS)
+        flows.append(SyntheticFlow(index, protocol, server_port, tls, rng))
+    return flows
+
+
+# Function to write a synthetic pcapng capture and return its number of packets.
+# Flow popularity follows a Zipf-like law (a few heavy flows and many small ones); with target_bytes,
+# packets are written until the file reaches that size instead of a fixed packet count.
+def write_synthetic_capture(path, packets=DEFAULT_PACKETS, flows=DEFAULT_FLOWS, protocol_mix=None,
+                            tls_share=DEFAULT_TLS_SHARE, seed=0, target_bytes=None):
+    rng = random.Random(seed)
+    all_flows = create_flows(flows, protocol_mix or DEFAULT_PROTOCOL_MIX, tls_share, rng)
+    weights = [1 / (rank + 1) for rank in range(len(all_flows))]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    written = 0
+    size = 0
+    timestamp = START_TIME
+    with open(path, 'wb') as f:
+        section = struct.pack('<IHHq', BYTE_ORDER_MAGIC, 1, 0, -1)  # Byte order magic, version 1.0, unknown length
+        interface = struct.pack('<HHI', LINKTYPE_ETHERNET, 0, 65535)  # Link type, reserved, snap length
+        f.write(encode_block(SECTION_HEADER_BLOCK, section))
+        f.write(encode_block(INTERFACE_DESCRIPTION_BLOCK, interface))
+        batch = []
+        while (written < packets) if target_bytes is None else (size < target_bytes):
+            flow = rng.choices(all_flows, cum_weights=cumulative)[0]
+            block = encode_packet_block(timestamp, build_frame(flow, *flow.next_packet(rng)))
+            batch.append(block)
+            size += len(block)
+            written += 1
+            timestamp += rng.expovariate(1 / MEAN_INTER_ARRIVAL)
+            if len(batch) >= 4096:
+                f.write(b''.join(batch))  # Write in batches to limit the number of system calls
+                batch = []
+        f.write(b''.join(batch))
+    return written
+
+
+# Function to read a protocol mix given as "TCP=0.8,UDP=0.2"
+def parse_protocol_mix(text):
+    mix = {}
+    for item in text.split(','):
+        protocol, share = item.split('=')
+        protocol = protocol.strip().upper()
+        if protocol not in IP_PROTOCOLS:
+            raise argparse.ArgumentTypeError(f"Unknown protocol: {protocol}")
+        mix[protocol] = float(share)
+    return mix
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    parser = argparse.ArgumentParser(description="Write a synthetic pcapng capture for benchmarks.")
+    parser.add_argument('output', help="pcapng file to write")
+    parser.add_argument('--packets', type=int, default=DEFAULT_PACKETS, help="number of packets")
+    parser.add_argument('--size-mb', type=float, help="write packets until the file has this size instead")
+    parser.add_argument('--flows', type=int, default=DEFAULT_FLOWS, help="number of flows")
+    parser.add_argument('--protocol-mix', type=parse_protocol_mix, default=DEFAULT_PROTOCOL_MIX,
+                        help="share of the flows per protocol, such as TCP=0.8,UDP=0.2")
+    parser.add_argument('--tls-share', type=float, default=DEFAULT_TLS_SHARE, help="share of the TCP flows that use TLS")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (the same seed gives the same capture)")
+    options = parser.parse_args()
+
+    target_bytes = int(options.size_mb * 1024 * 1024) if options.size_mb else None
+    count = write_synthetic_capture(options.output, options.packets, options.flows, options.protocol_mix,
+                                    options.tls_share, options.seed, target_bytes)
+    print(f"Wrote {count:,} packets to {options.output}")
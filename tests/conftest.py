@@ -0,0 +1,15 @@
+import atexit  # Import atexit to remove the temporary directory at the end of the tests
+import os  # Import os to locate the repository root and set the environment
+import shutil  # Import shutil to remove the temporary directory
+import sys  # Import sys to make the root-level scripts importable from the tests
+import tempfile  # Import tempfile for the directories written by the tests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # The scripts live at the repository root
+sys.path.insert(0, ROOT_DIR)
+
+# The cache, checkpoint and index directories are read from the environment when the modules are imported,
+# so they are pointed at a temporary directory before any test imports them
+TEST_DIR = tempfile.mkdtemp(prefix='pcap_tests_')
+atexit.register(shutil.rmtree, TEST_DIR, True)
+for variable, name in (('PCAP_CACHE_DIR', 'cache'), ('PCAP_CHECKPOINT_DIR', 'checkpoints'), ('PCAP_INDEX_DIR', 'index')):
+    os.environ.setdefault(variable, os.path.join(TEST_DIR, name))
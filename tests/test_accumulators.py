@@ -0,0 +1,97 @@
+import math  # Import math for the nearest ranks
+import random  # Import random to draw reproducible values
+
+import pytest  # Importing pytest for the expected errors
+
+from accumulators import RELATIVE_ACCURACY, DDSketch, LogHistogram, SizeDistribution, TimeDistribution  # Importing the accumulators
+
+QUANTILES = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999, 1]
+
+
+# Function to draw reproducible inter-arrival-like values spread over many orders of magnitude
+def spread_values(count, seed=3):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(-6, 3) for _ in range(count)]
+
+
+# Function to check every quantile of a sketch against the sorted values (the sketch returns the value of rank
+# q * (count - 1), within the relative accuracy)
+def assert_quantiles_within_accuracy(sketch, values):
+    ordered = sorted(values)
+    for q in QUANTILES:
+        exact = ordered[math.floor(q * (len(ordered) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=RELATIVE_ACCURACY * 1.0001, abs=1e-12)
+
+
+def test_ddsketch_quantiles_stay_within_relative_accuracy():
+    values = spread_values(20_000) + [0.0] * 50 + [-value for value in spread_values(200, seed=4)]
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+    assert_quantiles_within_accuracy(sketch, values)
+
+
+def test_ddsketch_merge_equals_one_sketch():
+    values = spread_values(10_000)
+    whole, first, second = DDSketch(), DDSketch(), DDSketch()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (first if index % 3 else second).add(value)
+    first.merge(second)
+    assert (first.positive, first.count) == (whole.positive, whole.count)
+    assert_quantiles_within_accuracy(first, values)
+
+
+# Beyond max_bins the buckets of the smallest values are folded together; the upper quantiles stay accurate
+def test_collapsed_ddsketch_keeps_the_upper_quantiles():
+    rng = random.Random(6)
+    values = [rng.uniform(1, 10) for _ in range(19_000)] + [10 ** rng.uniform(-9, -1) for _ in range(1_000)]
+    sketch = DDSketch(max_bins=200)
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.positive) <= 200
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99, 1):
+        assert sketch.quantile(q) == pytest.approx(ordered[math.floor(q * (len(ordered) - 1))], rel=RELATIVE_ACCURACY * 1.0001)
+
+
+def test_log_histogram_counts_and_merge():
+    values = spread_values(5_000)
+    whole, first, second = LogHistogram(), LogHistogram(), LogHistogram()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (first if index % 2 else second).add(value)
+    first.merge(second)
+    assert first.counts == whole.counts
+    assert sum(whole.counts) == len(values)
+    assert whole.counts[0] == sum(value < whole.min_value for value in values)  # Underflow bucket
+    for low, high, count in whole.buckets():
+        assert count == sum(low <= value < high for value in values)
+    with pytest.raises(ValueError):
+        whole.merge(LogHistogram(bins_per_decade=5))
+
+
+def test_time_distribution_merge_keeps_the_extremes():
+    values = spread_values(1_000)
+    first, second = TimeDistribution(), TimeDistribution()
+    for index, value in enumerate(values):
+        (first if index < 500 else second).add(value)
+    first.merge(second)
+    assert (first.count, first.minimum, first.maximum) == (len(values), min(values), max(values))
+    assert first.mean() == pytest.approx(sum(values) / len(values))
+
+
+def test_size_distribution_percentiles_are_exact_and_merge():
+    rng = random.Random(5)
+    sizes = [rng.choice([60, 66, 590, 1400, 1514]) + rng.randrange(20) for _ in range(10_000)] + [70_000, 90_000]
+    whole, first, second = SizeDistribution(), SizeDistribution(), SizeDistribution()
+    for index, size in enumerate(sizes):
+        whole.add(size)
+        (first if index % 2 else second).add(size)
+    first.merge(second)
+    assert first.values_and_counts() == whole.values_and_counts()
+    assert (first.count, first.total) == (len(sizes), sum(sizes))
+
+    ordered = sorted(sizes)
+    for percentile in (1, 50, 90, 99, 99.99, 100):
+        assert whole.percentile(percentile) == ordered[max(math.ceil(percentile / 100 * len(sizes)), 1) - 1]
@@ -0,0 +1,30 @@
+import glob  # Import glob to find the bundled captures
+import os  # Import os to build the paths of the bundled captures
+
+import pytest  # Importing pytest for the parametrized tests
+
+from conftest import ROOT_DIR  # Importing the repository root
+from all_statistics import compute_all_statistics  # Importing the single-pass statistics of scripts A-G
+from flow_table import FlowTableAnalyzer  # Importing the flow table analyzer
+from packet_engine import DEFAULT_ANALYZERS, NATIVE_BACKEND, analyze_capture  # Importing the shared packet engine
+from tls_sessions import analyze_tls_sessions  # Importing the TLS record pass
+
+
+CAPTURES = sorted(glob.glob(os.path.join(ROOT_DIR, 'pcapng_files', '*.pcapng')))
+
+
+# The combined pass must give the results of every analyzer run on its own, and the TLS versions of the native
+# TLS record pass (no tshark dissection)
+@pytest.mark.parametrize('pcap_file', CAPTURES)
+def test_combined_pass_matches_separate_analyzers(pcap_file):
+    results = compute_all_statistics([pcap_file], NATIVE_BACKEND, tls=True)[0]
+    ip_stats, tcp_stats, tls_stats, average_size, inter_arrival, packet_sizes, total_bytes, flows = results
+
+    separate = [analyze_capture(pcap_file, [analyzer_class()], NATIVE_BACKEND)[0]
+                for analyzer_class in DEFAULT_ANALYZERS + [FlowTableAnalyzer]]
+    assert (ip_stats, tcp_stats, average_size, total_bytes) == (separate[0], separate[1], separate[2], separate[5])
+    assert (inter_arrival.count, inter_arrival.percentiles()) == (separate[3].count, separate[3].percentiles())
+    assert (packet_sizes.count, packet_sizes.total) == (separate[4].count, separate[4].total)
+    assert sorted(flows.rows()) == sorted(separate[6].rows())
+    assert tls_stats == dict(analyze_tls_sessions(pcap_file, [])[2])
+    assert tls_stats  # Both captures carry TLS traffic
@@ -0,0 +1,58 @@
+import os  # Import os to build the paths of the bundled captures
+
+from capture_checkpoint import analyze_incrementally, load_checkpoint  # Importing the incremental analysis
+from conftest import ROOT_DIR  # Importing the repository root
+from flow_table import FlowTableAnalyzer  # Importing the flow table analyzer
+from packet_engine import DEFAULT_ANALYZERS, NATIVE_BACKEND, InterArrivalAnalyzer  # Importing the analyzers
+from parallel_runner import analyze_file  # Importing the whole-file analysis
+
+CAPTURE = os.path.join(ROOT_DIR, 'pcapng_files', 'firefox_traffic.pcapng')
+ANALYZERS = DEFAULT_ANALYZERS + [InterArrivalAnalyzer, FlowTableAnalyzer]
+
+
+# Function to turn the results of the analyzers into values that can be compared
+def comparable(analyzers):
+    values = []
+    for analyzer in analyzers:
+        result = analyzer.result()
+        if hasattr(result, 'percentiles'):  # Fixed-memory distributions
+            result = (result.count, result.mean(), result.percentiles())
+        elif hasattr(result, 'rows'):  # Flow records
+            result = sorted(result.rows())
+        values.append(result)
+    return values
+
+
+# Function to read a whole capture file
+def read_capture(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# A capture that grows in several steps (cut in the middle of blocks) gives the results of one full run
+def test_resumed_analysis_matches_a_full_run(tmp_path):
+    data = read_capture(CAPTURE)
+    growing = tmp_path / 'growing.pcapng'
+    checkpoints = str(tmp_path / 'checkpoints')
+    packet_counts = []
+    for end in (len(data) // 3 + 7, 2 * len(data) // 3 + 13, len(data)):
+        growing.write_bytes(data[:end])
+        analyze_incrementally(str(growing), ANALYZERS, NATIVE_BACKEND, checkpoints)
+        packet_counts.append(load_checkpoint(str(growing), checkpoints).packet_count)
+    assert packet_counts[0] < packet_counts[1] < packet_counts[2]
+
+    resumed = analyze_incrementally(str(growing), ANALYZERS, NATIVE_BACKEND, checkpoints)  # Nothing new
+    assert comparable(resumed) == comparable(analyze_file(CAPTURE, ANALYZERS, NATIVE_BACKEND))
+
+
+# A capture rewritten with other packets is analyzed again from the start
+def test_rewritten_capture_starts_again(tmp_path):
+    capture = tmp_path / 'capture.pcapng'
+    checkpoints = str(tmp_path / 'checkpoints')
+    capture.write_bytes(read_capture(CAPTURE))
+    analyze_incrementally(str(capture), ANALYZERS, NATIVE_BACKEND, checkpoints)
+
+    other = os.path.join(ROOT_DIR, 'pcapng_files', 'chromium_traffic.pcapng')
+    capture.write_bytes(read_capture(other))
+    rewritten = analyze_incrementally(str(capture), ANALYZERS, NATIVE_BACKEND, checkpoints)
+    assert comparable(rewritten) == comparable(analyze_file(other, ANALYZERS, NATIVE_BACKEND))
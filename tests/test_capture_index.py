@@ -0,0 +1,80 @@
+import os  # Import os to build the paths of the bundled captures and tables
+from collections import Counter  # Importing Counter to pick a frequent address
+
+import pytest  # Importing pytest for the parametrized tests and monkeypatch
+
+import capture_index  # Importing the index, whose chunk size is lowered for the small bundled captures
+from conftest import ROOT_DIR  # Importing the repository root
+from packet_engine import NATIVE_BACKEND, iter_packets  # Importing the native reader
+
+CAPTURES = ['chromium_traffic', 'firefox_traffic']  # Bundled captures with a reference table in csv_files
+CHUNK_SIZE = 100  # Packets (rows) per chunk, so the queries cross many chunks
+
+
+# Function to get the paths of a bundled capture and of its reference table
+def capture_files(name):
+    return (os.path.join(ROOT_DIR, 'pcapng_files', f'{name}.pcapng'),
+            os.path.join(ROOT_DIR, 'csv_files', f'{name}_analysis.csv'))
+
+
+# Function to list the queries of a capture as (start, end, ip, port): time ranges, an address, a port and mixes
+def queries(packets):
+    timestamps = sorted(packet.timestamp for packet in packets)
+    start, end = timestamps[len(timestamps) // 3], timestamps[2 * len(timestamps) // 3]
+    ip = Counter(packet.ip_src for packet in packets if packet.ip_src is not None).most_common(2)[1][0]
+    return [(start, end, None, None), (None, start, None, None), (end, None, None, None),
+            (None, None, ip, None), (None, None, None, 443), (None, None, ip, 443),
+            (start, end, ip, None), (start, end, None, 443), (start, None, '192.0.2.1', None)]
+
+
+# Function to check whether a packet (or row) matches a query
+def matches(timestamp, ips, ports, start, end, ip, port):
+    return ((start is None or timestamp >= start) and (end is None or timestamp <= end)
+            and (ip is None or ip in ips) and (port is None or port in ports))
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_capture_queries_equal_a_filtered_scan(name, monkeypatch):
+    monkeypatch.setattr(capture_index, 'CHUNK_SIZE', CHUNK_SIZE)
+    pcap_file, _ = capture_files(name)
+    packets = list(iter_packets(pcap_file, NATIVE_BACKEND))
+    index = capture_index.build_capture_index(pcap_file)
+    assert len(index.chunk_offsets) > 10
+    for start, end, ip, port in queries(packets):
+        expected = [packet for packet in packets
+                    if matches(packet.timestamp, (packet.ip_src, packet.ip_dst), (packet.src_port, packet.dst_port),
+                               start, end, ip, port)]
+        assert list(capture_index.query_capture(pcap_file, start, end, ip, port, index)) == expected
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_table_queries_equal_a_filtered_scan(name, monkeypatch):
+    pd = pytest.importorskip('pandas')
+    monkeypatch.setattr(capture_index, 'CHUNK_SIZE', CHUNK_SIZE)
+    pcap_file, csv_file = capture_files(name)
+    table = pd.read_csv(csv_file).astype(str)  # Ports are 'Unknown' for packets without a transport layer
+    index = capture_index.build_table_index(csv_file)
+    for start, end, ip, port in queries([packet for packet in iter_packets(pcap_file, NATIVE_BACKEND)
+                                         if packet.ip_version == 4]):
+        selected = [matches(float(timestamp), ips, ports, start, end, ip, None if port is None else str(port))
+                    for timestamp, ips, ports in zip(table['Timestamp'], zip(table['Source IP'], table['Destination IP']),
+                                                     zip(table['Source Port'], table['Destination Port']))]
+        expected = table[selected].reset_index(drop=True)
+        result = capture_index.query_table(csv_file, start, end, ip, port, index).astype(str)
+        assert result.values.tolist() == expected.values.tolist()
+
+
+def test_index_is_saved_and_rebuilt_when_the_file_changes(tmp_path):
+    pcap_file, _ = capture_files('firefox_traffic')
+    copy = tmp_path / 'capture.pcapng'
+    with open(pcap_file, 'rb') as f:
+        copy.write_bytes(f.read())
+    index_dir = str(tmp_path / 'index')
+    first = capture_index.load_index(str(copy), index_dir)
+    assert os.path.exists(capture_index.index_path(str(copy), index_dir))
+    assert capture_index.load_index(str(copy), index_dir).count == first.count
+
+    other, _ = capture_files('chromium_traffic')
+    with open(other, 'rb') as f:
+        copy.write_bytes(f.read())
+    assert capture_index.load_index(str(copy), index_dir).count == sum(1 for _ in iter_packets(other, NATIVE_BACKEND))
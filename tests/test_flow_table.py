@@ -0,0 +1,63 @@
+import os  # Import os to build the paths of the bundled captures
+from collections import Counter  # Importing Counter for the reference grouping
+
+from conftest import ROOT_DIR  # Importing the repository root
+from flow_table import FlowTableAnalyzer, flow_key, unpack_flow_key  # Importing the flow table
+from packet_engine import NATIVE_BACKEND, PacketInfo, iter_packets  # Importing the packet record and the reader
+
+
+CAPTURE = os.path.join(ROOT_DIR, 'pcapng_files', 'firefox_traffic.pcapng')
+
+
+# Function to build a packet of a conversation
+def packet(timestamp, src, dst, src_port, dst_port, length=100, transport='TCP'):
+    return PacketInfo(timestamp, length, 6 if ':' in src else 4, src, dst, transport, src_port, dst_port, None)
+
+
+def test_both_directions_share_one_key():
+    forward = packet(0, '10.0.0.1', '10.0.0.2', 50000, 443)
+    backward = packet(0, '10.0.0.2', '10.0.0.1', 443, 50000)
+    assert flow_key(forward) == flow_key(backward)
+    assert flow_key(forward) != flow_key(packet(0, '10.0.0.1', '10.0.0.2', 50001, 443))  # Other source port
+    assert flow_key(forward) != flow_key(packet(0, '10.0.0.1', '10.0.0.2', 50000, 443, transport='UDP'))
+
+
+def test_keys_unpack_to_the_sorted_endpoints():
+    assert unpack_flow_key(flow_key(packet(0, '10.0.0.2', '10.0.0.1', 443, 50000))) == (6, '10.0.0.1', 50000, '10.0.0.2', 443)
+    assert unpack_flow_key(flow_key(packet(0, '2001:db8::2', '2001:db8::1', 53, 40000, transport='UDP'))) == \
+        (17, '2001:db8::1', 40000, '2001:db8::2', 53)
+
+
+def test_conversation_is_one_flow_until_a_timeout():
+    analyzer = FlowTableAnalyzer(idle_timeout=15, active_timeout=60)
+    for timestamp in (0, 1, 2, 3):  # Request and answer packets of one conversation
+        if timestamp % 2:
+            analyzer.process(packet(timestamp, '10.0.0.2', '10.0.0.1', 443, 50000, length=1500))
+        else:
+            analyzer.process(packet(timestamp, '10.0.0.1', '10.0.0.2', 50000, 443, length=60))
+    analyzer.process(packet(30, '10.0.0.1', '10.0.0.2', 50000, 443))  # After the idle timeout: a new flow
+    for timestamp in range(31, 100, 5):  # Active for longer than the active timeout: cut at 60 s
+        analyzer.process(packet(timestamp, '10.0.0.1', '10.0.0.2', 50000, 443))
+
+    rows = sorted(analyzer.result().rows(), key=lambda row: row[7])
+    assert [(row[5], row[6], row[7], row[8]) for row in rows] == [
+        (4, 3120, 0, 3), (13, 1300, 30, 86), (2, 200, 91, 96)]
+
+
+# With timeouts longer than the capture, the flows are the packets grouped by their sorted endpoints
+def test_capture_flows_match_a_reference_grouping():
+    packets = [packet for packet in iter_packets(CAPTURE, NATIVE_BACKEND) if packet.ip_version is not None]
+    reference_packets, reference_bytes = Counter(), Counter()
+    for item in packets:
+        endpoints = tuple(sorted([(item.ip_src, item.src_port or 0), (item.ip_dst, item.dst_port or 0)]))
+        reference_packets[(item.transport, endpoints)] += 1
+        reference_bytes[(item.transport, endpoints)] += item.length
+
+    analyzer = FlowTableAnalyzer(idle_timeout=1e9, active_timeout=1e9)
+    for item in packets:
+        analyzer.process(item)
+    flows = analyzer.result()
+    assert len(flows) == len(reference_packets)
+    assert sorted(flows.packets) == sorted(reference_packets.values())
+    assert sum(flows.bytes) == sum(reference_bytes.values())
+    assert sorted(flows.bytes) == sorted(reference_bytes.values())
@@ -0,0 +1,117 @@
+import os  # Import os to build the paths of the bundled captures
+import random  # Import random to draw reproducible samples
+
+import pytest  # Importing pytest for the expected errors
+
+from accumulators import InterArrivalHistogramAnalyzer, PacketSizeHistogramAnalyzer  # Importing the distribution analyzers
+from conftest import ROOT_DIR  # Importing the repository root
+from flow_table import FlowTableAnalyzer  # Importing the flow table analyzer
+from packet_engine import IPStatsAnalyzer, NATIVE_BACKEND, PacketSizeDistributionAnalyzer, iter_packets  # Importing the exact analyzers and the reader
+from pcapng_reader import ReaderState, iter_packet_blocks, open_capture_buffer  # Importing the block walker
+from packet_sampling import (FLOW_SAMPLING, PACKET_SAMPLING, estimate_mean, estimate_total, format_estimate,
+                             inter_arrival_warning, sample_file, sampling_plan)  # Importing the sampling estimators
+
+
+CAPTURE = os.path.join(ROOT_DIR, 'pcapng_files', 'chromium_traffic.pcapng')
+
+
+def test_unknown_sampling_method_is_rejected():
+    with pytest.raises(ValueError):
+        sampling_plan('bytes')
+
+
+def test_full_read_is_exact():
+    estimate = estimate_total(1234, 5678.0, 1, 1.0)
+    assert estimate == (1234, 1234, 1234)
+    assert format_estimate(estimate) == '1,234'
+
+
+def test_early_stop_is_extrapolated_without_interval():
+    total = estimate_total(100, 100.0, 10, 0.25)
+    assert total.value == pytest.approx(4000)
+    assert (total.low, total.high) == (None, None)
+    mean = estimate_mean(10, 5000, {'bytes': 0, 'packets': 0, 'packets_bytes': 0}, 10, 0.25)
+    assert (mean.value, mean.low, mean.high) == (500, None, None)
+    assert 'no confidence interval' in format_estimate(total)
+
+
+# The Horvitz-Thompson interval must hold the true total in about 95% of independent 1-in-10 samples
+def test_total_interval_coverage():
+    rng = random.Random(7)
+    sizes = [rng.choice([60, 60, 60, 590, 1500]) for _ in range(2_000)]
+    true_total = sum(sizes)
+    covered = 0
+    for _ in range(400):
+        kept = [size for size in sizes if rng.random() < 0.1]
+        estimate = estimate_total(sum(kept), sum(size * size for size in kept), 10, 1.0)
+        covered += estimate.low <= true_total <= estimate.high
+    assert 0.90 <= covered / 400 <= 0.99
+
+
+# The interval of the average size must hold the true average in about 95% of independent 1-in-10 samples
+def test_mean_interval_coverage():
+    rng = random.Random(11)
+    sizes = [rng.choice([60, 60, 60, 590, 1500]) for _ in range(2_000)]
+    true_mean = sum(sizes) / len(sizes)
+    covered = 0
+    for _ in range(400):
+        kept = [size for size in sizes if rng.random() < 0.1]
+        squares = {'packets': len(kept), 'bytes': sum(size * size for size in kept), 'packets_bytes': sum(kept)}
+        estimate = estimate_mean(len(kept), sum(kept), squares, 10, 1.0)
+        covered += estimate.low <= true_mean <= estimate.high
+    assert 0.90 <= covered / 400 <= 0.99
+
+
+@pytest.mark.parametrize('method', [PACKET_SAMPLING, FLOW_SAMPLING])
+def test_sampled_capture_estimates_hold_the_true_totals(method):
+    packets = [packet for packet in iter_packets(CAPTURE, NATIVE_BACKEND) if packet.ip_version == 4]
+    analyzers, report = sample_file(CAPTURE, [IPStatsAnalyzer], sampling_plan(method, 10, 0, 0), NATIVE_BACKEND)
+    estimates = report['estimates']
+    assert estimates['packets'].low <= len(packets) <= estimates['packets'].high
+    assert estimates['bytes'].low <= sum(packet.length for packet in packets) <= estimates['bytes'].high
+    assert report['not_scaled'] == [] and report['distributions'] == []
+    scaled = analyzers[0].result()
+    assert all(count % 10 == 0 for count in scaled.values())  # Sampled counts multiplied by the rate
+
+
+def test_packet_limit_marks_the_estimates_as_extrapolated():
+    _, report = sample_file(CAPTURE, [IPStatsAnalyzer], sampling_plan(None, 1, 500, 0), NATIVE_BACKEND)
+    assert report['stopped_early'] and report['packets_read'] == 500
+    data = open_capture_buffer(CAPTURE)
+    state = ReaderState()
+    for _ in zip(range(500), iter_packet_blocks(data, state)):
+        pass
+    assert report['coverage'] == state.offset / len(data)  # Up to the end of the last packet read, not the next one
+    assert report['estimates']['packets'].low is None
+
+
+# Only the inter-arrival times are reported as unscaled distributions; the packet size histogram is scaled
+def test_report_groups_the_unscaled_analyzers():
+    analyzer_classes = [IPStatsAnalyzer, InterArrivalHistogramAnalyzer, PacketSizeHistogramAnalyzer,
+                        PacketSizeDistributionAnalyzer, FlowTableAnalyzer]
+    analyzers, report = sample_file(CAPTURE, analyzer_classes, sampling_plan(PACKET_SAMPLING, 10, 0, 0), NATIVE_BACKEND)
+    assert report['distributions'] == ['InterArrivalHistogramAnalyzer']
+    assert report['not_scaled'] == ['PacketSizeDistributionAnalyzer', 'FlowTableAnalyzer']
+    sizes = analyzers[2].result()
+    assert sizes.count == report['estimates']['packets'].value  # Scaled like the packet count
+    assert len(analyzers[3].result()) * 10 == report['estimates']['packets'].value  # Only the sampled packets
+
+
+# Packet sampling stretches the gaps between the kept packets, so its inter-arrival plot carries a warning
+def test_inter_arrival_plot_of_packet_sampling_is_marked():
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt  # Imported after choosing the headless backend
+    from E_packets_inter_arrivals import plot_inter_arrival_distribution  # Importing the inter-arrival plot
+
+    analyzers, report = sample_file(CAPTURE, [InterArrivalHistogramAnalyzer], sampling_plan(PACKET_SAMPLING, 10, 0, 0),
+                                    NATIVE_BACKEND)
+    assert '10 times' in inter_arrival_warning(report)
+    plot_inter_arrival_distribution(analyzers[0].result(), CAPTURE, report)
+    assert '1 in 10 packets sampled' in plt.gca().get_title()
+    plt.close('all')
+
+    _, flow_report = sample_file(CAPTURE, [InterArrivalHistogramAnalyzer], sampling_plan(FLOW_SAMPLING, 10, 0, 0),
+                                 NATIVE_BACKEND)
+    assert inter_arrival_warning(flow_report) is None  # Whole flows are kept, so their gaps stay valid
+
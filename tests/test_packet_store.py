@@ -0,0 +1,68 @@
+import os  # Import os to build the paths of the bundled captures and tables
+
+import pytest  # Importing pytest for the parametrized tests and the optional dependencies
+
+from conftest import ROOT_DIR  # Importing the repository root
+from packet_engine import NATIVE_BACKEND, iter_packets  # Importing the native reader
+from packet_store import PacketStore, load_packet_store  # Importing the packet store
+from traffic_table import PORT_COLUMNS, TRAFFIC_COLUMNS, load_traffic_data  # Importing the traffic table loader
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+CAPTURES = ['chromium_traffic', 'firefox_traffic']  # Bundled captures with a reference table in csv_files
+
+
+# Function to get the paths of a bundled capture and of its reference table
+def capture_files(name):
+    return (os.path.join(ROOT_DIR, 'pcapng_files', f'{name}.pcapng'),
+            os.path.join(ROOT_DIR, 'csv_files', f'{name}_analysis.csv'))
+
+
+# Function to bring a table to plain comparable columns (ports as the strings of the CSV files)
+def plain_columns(df):
+    columns = {}
+    for column in df.columns:
+        if column in PORT_COLUMNS:
+            columns[column] = [str(value) if not pd.isna(value) else 'Unknown' for value in df[column]]
+        elif column == 'Timestamp':
+            columns[column] = df[column].astype(float).tolist()
+        elif column == 'Size':
+            columns[column] = df[column].astype(int).tolist()
+        else:
+            columns[column] = df[column].astype(str).tolist()  # Categorical IP columns
+    return columns
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_store_dataframe_matches_the_loaded_tables(name):
+    pcap_file, reference_file = capture_files(name)
+    store = load_packet_store(pcap_file, NATIVE_BACKEND)
+    df = store.to_dataframe()
+    assert list(df.columns) == TRAFFIC_COLUMNS
+    for loaded in (load_traffic_data(pcap_file), load_traffic_data(reference_file)):
+        expected, actual = plain_columns(loaded), plain_columns(df)
+        assert actual['Timestamp'] == pytest.approx(expected['Timestamp'], abs=1e-6)
+        for column in TRAFFIC_COLUMNS[1:]:
+            assert actual[column] == expected[column]
+
+
+def test_dataframe_shares_the_memory_of_the_store():
+    pcap_file, _ = capture_files('firefox_traffic')
+    store = load_packet_store(pcap_file, NATIVE_BACKEND)
+    df = store.to_dataframe(['Timestamp', 'Size', 'Source Port'])
+    assert np.shares_memory(df['Timestamp'].to_numpy(), store.column('Timestamp'))
+    assert np.shares_memory(df['Size'].to_numpy(), store.column('Size'))
+    assert np.shares_memory(df['Source Port'].array._data, store.column('Source Port'))
+
+
+def test_extended_store_equals_one_store():
+    pcap_file, _ = capture_files('firefox_traffic')
+    packets = list(iter_packets(pcap_file, NATIVE_BACKEND))
+    whole, first, second = PacketStore(), PacketStore(), PacketStore()
+    whole.add_packets(packets)
+    first.add_packets(packets[:len(packets) // 2])
+    second.add_packets(packets[len(packets) // 2:])
+    first.extend(second)
+    assert plain_columns(first.to_dataframe()) == plain_columns(whole.to_dataframe())
+    assert first.endpoints == whole.endpoints
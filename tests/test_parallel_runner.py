@@ -0,0 +1,49 @@
+import glob  # Import glob to find the bundled captures
+import os  # Import os to build the paths of the bundled captures
+
+import pytest  # Importing pytest for the parametrized tests and monkeypatch
+
+import parallel_runner  # Importing the runner, whose minimum chunk size is lowered for the small bundled captures
+from conftest import ROOT_DIR  # Importing the repository root
+from packet_engine import (DEFAULT_ANALYZERS, NATIVE_BACKEND, InterArrivalAnalyzer, PacketSizeDistributionAnalyzer,
+                           iter_packets)  # Importing the analyzers of scripts A-G and the reader
+
+
+CAPTURES = sorted(glob.glob(os.path.join(ROOT_DIR, 'pcapng_files', '*.pcapng')))
+ANALYZERS = DEFAULT_ANALYZERS + [InterArrivalAnalyzer, PacketSizeDistributionAnalyzer]  # With the exact lists
+
+
+# Function to turn the results of the analyzers into values that can be compared
+def comparable(analyzers):
+    values = []
+    for result in parallel_runner.analyzer_results(analyzers):
+        if hasattr(result, 'percentiles'):  # Fixed-memory distributions
+            result = (result.count, result.mean(), result.percentiles())
+        values.append(result)
+    return values
+
+
+@pytest.mark.parametrize('pcap_file', CAPTURES)
+def test_chunked_analysis_matches_whole_file(pcap_file, monkeypatch):
+    monkeypatch.setattr(parallel_runner, 'MIN_CHUNK_SIZE', 64 * 1024)
+    tasks = parallel_runner.split_file(pcap_file, 6, NATIVE_BACKEND, ANALYZERS)
+    assert len(tasks) == 6
+
+    chunks = [parallel_runner.analyze_chunk(task, ANALYZERS, NATIVE_BACKEND) for task in tasks]
+    chunk_gaps = sum(len(analyzers[-2].result()) for analyzers in chunks)
+    stitched = parallel_runner.stitch_analyzers(chunks)
+    whole = parallel_runner.analyze_file(pcap_file, ANALYZERS, NATIVE_BACKEND)
+    assert comparable(stitched) == comparable(whole)
+
+    # Every chunk boundary adds the gap between the last packet of a chunk and the first packet of the next one
+    packet_count = sum(1 for _ in iter_packets(pcap_file, NATIVE_BACKEND))
+    assert len(stitched[-2].result()) == packet_count - 1 == chunk_gaps + len(tasks) - 1
+
+
+@pytest.mark.parametrize('pcap_file', CAPTURES)
+def test_analyze_files_splits_large_files(pcap_file, monkeypatch):
+    monkeypatch.setattr(parallel_runner, 'MIN_CHUNK_SIZE', 64 * 1024)
+    chunked = parallel_runner.analyze_files([pcap_file], ANALYZERS, workers=4, backend=NATIVE_BACKEND,
+                                            use_cache=False, sampling=None)[0]
+    whole = parallel_runner.analyze_file(pcap_file, ANALYZERS, NATIVE_BACKEND)
+    assert comparable(chunked) == comparable(whole)
@@ -0,0 +1,82 @@
+import csv  # Import csv to read the reference tables
+import os  # Import os to build the paths of the bundled captures
+import struct  # Import struct to build small pcapng buffers
+
+import pytest  # Importing pytest for the parametrized tests and the expected errors
+
+from conftest import ROOT_DIR  # Importing the repository root
+from pcapng_reader import ReaderState, iter_buffer_packets, iter_packets, split_capture  # Importing the native reader
+
+
+CAPTURES = ['chromium_traffic', 'firefox_traffic']  # Bundled captures with a reference table in csv_files
+
+
+# Function to read the reference decode of a bundled capture: the table that the original PyShark (Wireshark
+# dissector) converter wrote for every IP packet
+def reference_rows(capture):
+    with open(os.path.join(ROOT_DIR, 'csv_files', f'{capture}_analysis.csv'), newline='') as f:
+        return [(float(row[0]), int(row[1]), row[2], row[3], row[4], row[5]) for row in list(csv.reader(f))[1:]]
+
+
+# Function to turn a packet into a row of the reference table (ports are 'Unknown' without a transport layer)
+def packet_row(packet):
+    def port(value):
+        return 'Unknown' if value is None else str(value)
+    return packet.timestamp, packet.length, packet.ip_src, packet.ip_dst, port(packet.src_port), port(packet.dst_port)
+
+
+# Function to build a little-endian pcapng block (the body is padded to 32 bits)
+def block(block_type, body):
+    body += bytes(-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+
+SECTION_HEADER = block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1))
+INTERFACE = block(0x00000001, struct.pack('<HHI', 1, 0, 65535))  # Ethernet, microsecond timestamps
+
+
+@pytest.mark.parametrize('capture', CAPTURES)
+def test_native_decode_matches_reference(capture):
+    packets = [packet for packet in iter_packets(os.path.join(ROOT_DIR, 'pcapng_files', f'{capture}.pcapng'))
+               if packet.ip_version == 4]
+    expected = reference_rows(capture)
+    assert len(packets) == len(expected)
+    for packet, row in zip(packets, expected):
+        decoded = packet_row(packet)
+        assert decoded[0] == pytest.approx(row[0], abs=1e-6)
+        assert decoded[1:] == row[1:]
+
+
+@pytest.mark.parametrize('chunk_count', [2, 5])
+def test_chunks_read_the_same_packets(chunk_count):
+    pcap_file = os.path.join(ROOT_DIR, 'pcapng_files', 'firefox_traffic.pcapng')
+    chunked = [packet for state, end_offset in split_capture(pcap_file, chunk_count)
+               for packet in iter_packets(pcap_file, state, end_offset)]
+    assert chunked == list(iter_packets(pcap_file))
+
+
+def test_enhanced_packet_block_is_decoded():
+    frame = bytes(12) + b'\x08\x00' + bytes([0x45, 0, 0, 28]) + bytes(5) + bytes([17]) + bytes(2) + \
+        bytes([10, 0, 0, 1, 10, 0, 0, 2]) + struct.pack('>HH', 5353, 53) + bytes(4)
+    packet_block = block(0x00000006, struct.pack('<IIIII', 0, 0, 1_500_000, len(frame), 60) + frame)
+    packets = list(iter_buffer_packets(SECTION_HEADER + INTERFACE + packet_block, ReaderState()))
+    assert len(packets) == 1
+    assert packets[0].timestamp == pytest.approx(1.5)
+    assert (packets[0].length, packets[0].ip_src, packets[0].ip_dst) == (60, '10.0.0.1', '10.0.0.2')
+    assert (packets[0].transport, packets[0].src_port, packets[0].dst_port) == ('UDP', 5353, 53)
+
+
+@pytest.mark.parametrize('packet_block', [
+    block(0x00000006, struct.pack('<IIIII', 3, 0, 0, 0, 0)),  # Enhanced packet block of a missing interface
+    block(0x00000002, struct.pack('<HHIIII', 3, 0, 0, 0, 0, 0)),  # Obsolete packet block of a missing interface
+])
+def test_packet_block_of_unknown_interface_names_the_offset(packet_block):
+    data = SECTION_HEADER + INTERFACE + packet_block
+    with pytest.raises(ValueError, match=f'offset {len(SECTION_HEADER) + len(INTERFACE)}'):
+        list(iter_buffer_packets(data, ReaderState()))
+
+
+def test_simple_packet_block_without_interface_is_rejected():
+    with pytest.raises(ValueError, match=f'offset {len(SECTION_HEADER)}'):
+        list(iter_buffer_packets(SECTION_HEADER + block(0x00000003, struct.pack('<I', 0)), ReaderState()))
@@ -0,0 +1,78 @@
+import importlib  # Import importlib to load an analyzer module written by the test
+import os  # Import os to change and delete the cached files
+import sys  # Import sys to make the analyzer module importable
+
+from result_cache import ResultCache, analyzer_signature, source_hash  # Importing the result cache
+
+
+# Function to count how often an analysis is computed
+def counting(value, calls):
+    def compute():
+        calls.append(value)
+        return value
+    return compute
+
+
+def test_unchanged_file_is_a_hit_and_changed_file_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    capture = tmp_path / 'capture.pcapng'
+    capture.write_bytes(b'first')
+    calls = []
+    assert cache.get_or_compute(str(capture), 'analysis', counting(1, calls)) == 1
+    assert cache.get_or_compute(str(capture), 'analysis', counting(2, calls)) == 1  # Taken from the cache
+    assert calls == [1]
+
+    capture.write_bytes(b'second content')
+    os.utime(capture, ns=(0, 10 ** 18))
+    assert cache.get_or_compute(str(capture), 'analysis', counting(3, calls)) == 3
+    assert cache.get_or_compute(str(capture), 'other analysis', counting(4, calls)) == 4
+    assert calls == [1, 3, 4]
+
+
+def test_change_to_the_analyzer_source_is_a_miss(tmp_path, monkeypatch):
+    module_path = tmp_path / 'cache_test_analyzer.py'
+    module_path.write_text('class CountingAnalyzer:\n    pass\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('cache_test_analyzer')
+    try:
+        cache = ResultCache(str(tmp_path / 'cache'))
+        capture = tmp_path / 'capture.pcapng'
+        capture.write_bytes(b'packets')
+        key = cache.key_for(str(capture), analyzer_signature([module.CountingAnalyzer]))
+        assert key == cache.key_for(str(capture), analyzer_signature([module.CountingAnalyzer]))
+
+        module_path.write_text('class CountingAnalyzer:\n    counted = True\n')
+        source_hash.cache_clear()  # Source files are hashed once per process, like in a new run
+        assert key != cache.key_for(str(capture), analyzer_signature([module.CountingAnalyzer]))
+    finally:
+        sys.modules.pop('cache_test_analyzer', None)
+        source_hash.cache_clear()
+
+
+def test_unloadable_entry_is_a_miss_and_deleted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    cache.put('key', [1, 2, 3])
+    assert cache.get('key') == [1, 2, 3]
+    with open(cache.entry_path('key'), 'wb') as f:
+        f.write(b'not a pickle')
+    assert cache.get('key') is None
+    assert not os.path.exists(cache.entry_path('key'))
+
+
+def test_evict_keeps_the_size_limit_and_prunes_the_hash_index(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), size_limit=3500)  # Room for three entries
+    captures = []
+    for index in range(3):
+        capture = tmp_path / f'capture{index}.pcapng'
+        capture.write_bytes(bytes([index]) * 100)
+        captures.append(str(capture))
+        cache.put(cache.key_for(str(capture), 'analysis'), bytes(1000))
+        os.utime(cache.entry_path(cache.key_for(str(capture), 'analysis')), (index, index))  # Oldest first
+    assert len(cache.read_hash_index()) == 3
+    assert all(os.path.exists(cache.entry_path(cache.key_for(path, 'analysis'))) for path in captures)
+
+    os.remove(captures[1])
+    cache.put('newest', bytes(1000))
+    assert not os.path.exists(cache.entry_path(cache.key_for(captures[0], 'analysis')))  # Least recently used
+    assert os.path.exists(cache.entry_path('newest'))
+    assert sorted(cache.read_hash_index()) == sorted(os.path.abspath(path) for path in (captures[0], captures[2]))
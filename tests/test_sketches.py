@@ -0,0 +1,75 @@
+import math  # Import math for the HyperLogLog standard error
+import random  # Import random to draw reproducible skewed key streams
+from collections import Counter  # Importing Counter for the exact counts
+
+from packet_engine import PacketInfo  # Importing the packet record
+from sketches import CountMinSketch, HeavyHitters, HyperLogLog, IPStatsSketchAnalyzer, SpaceSaving, hash_key  # Importing the sketches
+
+
+# Function to draw a reproducible Zipf-like stream of keys (a few heavy keys and a long tail)
+def skewed_keys(count, distinct, seed=1):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, distinct + 1)]
+    return [f'10.0.{rank // 256}.{rank % 256}' for rank in rng.choices(range(distinct), weights, k=count)]
+
+
+def test_count_min_stays_within_its_error_bound():
+    keys = skewed_keys(50_000, 5_000)
+    exact = Counter(keys)
+    sketch = CountMinSketch(epsilon=0.005, delta=0.01)
+    for key in keys:
+        sketch.add(hash_key(key))
+    bound = 0.005 * sketch.total
+    errors = [sketch.estimate(hash_key(key)) - count for key, count in exact.items()]
+    assert min(errors) >= 0  # Never below the true count
+    assert sum(error > bound for error in errors) <= 0.01 * len(errors)
+
+
+def test_count_min_merge_equals_one_sketch():
+    keys = skewed_keys(10_000, 1_000)
+    whole, first, second = CountMinSketch(), CountMinSketch(), CountMinSketch()
+    for index, key in enumerate(keys):
+        whole.add(hash_key(key))
+        (first if index % 2 else second).add(hash_key(key))
+    first.merge(second)
+    assert first.counters == whole.counters
+    assert first.total == whole.total
+
+
+def test_space_saving_keeps_every_frequent_key():
+    keys = skewed_keys(50_000, 5_000)
+    exact = Counter(keys)
+    summary = SpaceSaving(capacity=64)
+    for key in keys:
+        summary.add(key)
+    for key, count in exact.items():
+        if count > len(keys) / 64:
+            assert summary.counts[key] >= count  # Kept, and never underestimated
+
+
+def test_heavy_hitters_top_keys_are_close():
+    keys = skewed_keys(50_000, 5_000)
+    exact = Counter(keys)
+    sketch = HeavyHitters(epsilon=0.001, top_k=64)
+    for key in keys:
+        sketch.add(key)
+    top = sketch.top(10)
+    assert [key for key, _ in top[:5]] == [key for key, _ in exact.most_common(5)]
+    for key, estimate in top:
+        assert 0 <= estimate - exact[key] <= 0.001 * len(keys)
+
+
+def test_hyperloglog_is_within_its_relative_error():
+    sketch = HyperLogLog(error=0.02)
+    for index in range(20_000):
+        sketch.add(hash_key(f'key-{index}'))
+    standard_error = 1.04 / math.sqrt(len(sketch.registers))
+    assert abs(sketch.count() - 20_000) <= 3 * standard_error * 20_000
+
+def test_sketch_analyzer_scales_its_counts():
+    analyzer = IPStatsSketchAnalyzer()
+    for _ in range(7):
+        analyzer.process(PacketInfo(0.0, 60, 4, '10.0.0.1', '10.0.0.2', 'UDP', 1, 2, None))
+    analyzer.scale(10)
+    assert analyzer.result() == {'10.0.0.1': 70, '10.0.0.2': 70}
+    assert analyzer.ip_stats.count_min.total == 140
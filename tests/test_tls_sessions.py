@@ -0,0 +1,85 @@
+import os  # Import os to build the paths of the bundled captures and key logs
+
+import pytest  # Importing pytest for the parametrized tests and the optional dependency
+
+from conftest import ROOT_DIR  # Importing the repository root
+from pcapng_reader import iter_tcp_segments  # Importing the TCP segments of the native reader
+from tls_sessions import analyze_tls_sessions  # Importing the TLS session analysis
+
+# Bundled captures and the key logs the browsers wrote while capturing them
+CAPTURES = ['chromium', 'firefox']
+
+
+# Function to get the paths of a bundled capture and of its key log
+def capture_files(name):
+    return (os.path.join(ROOT_DIR, 'pcapng_files', f'{name}_traffic.pcapng'),
+            os.path.join(ROOT_DIR, f'{name}_sslkeylogfile.txt'))
+
+
+# Function to keep the TLS 1.3 sessions, whose handshake after the ServerHello is encrypted
+def tls13_sessions(sessions):
+    return [session for session in sessions if session['version'] == 'TLS 1.3']
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_key_log_decrypts_the_tls13_sessions(name):
+    pytest.importorskip('cryptography')
+    pcap_file, keylog_file = capture_files(name)
+    sessions = tls13_sessions(analyze_tls_sessions(pcap_file, [keylog_file])[0])
+    with_keys = [session for session in sessions if session['keys_found']]
+    assert sessions and len(with_keys) >= len(sessions) - 1  # The key log covers the sessions of its capture
+    for session in with_keys:
+        assert session['alpn'] is not None  # Only known from the decrypted EncryptedExtensions
+    assert sum(session['decrypted_records'] > 0 for session in with_keys) >= len(with_keys) - 2
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_without_key_log_nothing_is_decrypted(name):
+    pcap_file, _ = capture_files(name)
+    sessions = tls13_sessions(analyze_tls_sessions(pcap_file, [])[0])
+    assert sessions
+    assert not any(session['keys_found'] or session['decrypted_records'] or session['alpn'] for session in sessions)
+
+
+def test_key_log_of_another_capture_does_not_match():
+    pcap_file, _ = capture_files('firefox')
+    _, other_keylog = capture_files('chromium')
+    sessions = analyze_tls_sessions(pcap_file, [other_keylog])[0]
+    assert not any(session['keys_found'] for session in sessions)
+
+
+# Function to find the first ClientHello and ServerHello segment of every connection by scanning the segments
+# (reference for the latencies: the record type is 22 and the handshake type 1 or 2)
+def hello_times(pcap_file):
+    client_hellos, server_hellos = {}, {}
+    for timestamp, ip_src, ip_dst, src_port, dst_port, _, _, payload in iter_tcp_segments(pcap_file):
+        if len(payload) > 5 and payload[0] == 22:
+            if payload[5] == 1:
+                client_hellos.setdefault((f'{ip_src}:{src_port}', f'{ip_dst}:{dst_port}'), timestamp)
+            elif payload[5] == 2:
+                server_hellos.setdefault((f'{ip_dst}:{dst_port}', f'{ip_src}:{src_port}'), timestamp)
+    return client_hellos, server_hellos
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_handshake_latencies_match_the_hello_segments(name):
+    pcap_file, keylog_file = capture_files(name)
+    sessions = analyze_tls_sessions(pcap_file, [keylog_file])[0]
+    client_hellos, server_hellos = hello_times(pcap_file)
+    assert len(sessions) == len(client_hellos)  # One session per connection that sent a ClientHello
+    for session in sessions:
+        connection = (session['client'], session['server'])
+        assert session['server_hello_latency'] == pytest.approx(server_hellos[connection] - client_hellos[connection])
+        if session['handshake_latency'] is not None:
+            assert session['handshake_latency'] >= session['server_hello_latency']
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_record_versions_need_no_key_log(name):
+    pcap_file, keylog_file = capture_files(name)
+    _, _, versions = analyze_tls_sessions(pcap_file, [keylog_file])
+    _, _, versions_without_keys = analyze_tls_sessions(pcap_file, [])
+    assert dict(versions) == dict(versions_without_keys)
+    assert set(versions) <= {'0x0301', '0x0302', '0x0303'}  # Record layer versions of TLS 1.0-1.3
+    assert versions['0x0303'] > 0
+
@@ -0,0 +1,85 @@
+import os  # Import os to build the paths of the bundled captures and tables
+
+import pytest  # Importing pytest for the parametrized tests and the optional dependencies
+
+from conftest import ROOT_DIR  # Importing the repository root
+from packet_engine import NATIVE_BACKEND, iter_packets  # Importing the native reader
+from pcapng_to_CSV_for_atkr import analyze_pcap  # Importing the converter
+from traffic_table import (CSV_FORMAT, PARQUET_FORMAT, PORT_COLUMNS, CsvTrafficWriter, ParquetTrafficWriter,
+                           load_traffic_data)  # Importing the traffic table loader
+
+pd = pytest.importorskip('pandas')
+
+CAPTURES = ['chromium_traffic', 'firefox_traffic']  # Bundled captures with a reference table in csv_files
+
+
+# Function to get the paths of a bundled capture and of its reference table
+def capture_files(name):
+    return (os.path.join(ROOT_DIR, 'pcapng_files', f'{name}.pcapng'),
+            os.path.join(ROOT_DIR, 'csv_files', f'{name}_analysis.csv'))
+
+
+# Function to bring the ports of a table to the strings of the CSV files ('Unknown' for missing ports)
+def ports_as_text(df):
+    df = df.copy()
+    for column in PORT_COLUMNS:
+        df[column] = [str(value) if not pd.isna(value) else 'Unknown' for value in df[column]]
+    return df
+
+
+@pytest.mark.parametrize('name', CAPTURES)
+def test_parquet_table_matches_the_reference_csv(name, tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    import pcapng_to_CSV_for_atkr  # Imported to give the converter a writer with small row groups
+    monkeypatch.setattr(pcapng_to_CSV_for_atkr, 'open_traffic_writer',
+                        lambda output_file, output_format: ParquetTrafficWriter(output_file, row_group_size=1000))
+    pcap_file, reference_file = capture_files(name)
+    output_file = str(tmp_path / f'{name}.parquet')
+    stats = analyze_pcap(pcap_file, output_file, NATIVE_BACKEND, PARQUET_FORMAT)
+
+    import pyarrow.parquet as pq
+    assert pq.ParquetFile(output_file).num_row_groups == -(-stats['rows'] // 1000)
+    table = ports_as_text(load_traffic_data(output_file))
+    reference = ports_as_text(load_traffic_data(reference_file))
+    assert list(table.columns) == list(reference.columns)
+    assert table['Timestamp'].tolist() == pytest.approx(reference['Timestamp'].tolist(), abs=1e-6)
+    for column in reference.columns[1:]:
+        assert table[column].astype(str).tolist() == reference[column].astype(str).tolist()
+
+
+def test_parquet_loader_reads_only_the_requested_columns(tmp_path):
+    pytest.importorskip('pyarrow')
+    pcap_file, _ = capture_files('firefox_traffic')
+    output_file = str(tmp_path / 'firefox.parquet')
+    analyze_pcap(pcap_file, output_file, NATIVE_BACKEND, PARQUET_FORMAT)
+    df = load_traffic_data(output_file, ['Size', 'Source IP'])
+    assert list(df.columns) == ['Size', 'Source IP']
+    assert df['Source IP'].iloc[0].count('.') == 3  # Packed addresses are turned back into dotted strings
+
+
+# Function to read a whole file
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# The streaming CSV writer must write the same bytes as the original DataFrame.to_csv converter
+@pytest.mark.parametrize('name', CAPTURES)
+def test_csv_table_is_identical_to_the_reference(name, tmp_path):
+    pcap_file, reference_file = capture_files(name)
+    output_file = str(tmp_path / f'{name}.csv')
+    stats = analyze_pcap(pcap_file, output_file, NATIVE_BACKEND, CSV_FORMAT)
+    assert read_file(output_file) == read_file(reference_file)
+    assert stats['rows'] == len(load_traffic_data(reference_file))
+
+
+def test_csv_batches_do_not_change_the_output(tmp_path):
+    pcap_file, reference_file = capture_files('firefox_traffic')
+    writer = CsvTrafficWriter(str(tmp_path / 'batched.csv'), batch_size=100)
+    for packet in iter_packets(pcap_file, NATIVE_BACKEND):
+        if packet.ip_version == 4:
+            writer.write_row(packet.timestamp, packet.length, packet.ip_src, packet.ip_dst, packet.src_port, packet.dst_port)
+        assert len(writer.rows) < 100  # Never more than one batch in memory
+    writer.close()
+    assert read_file(str(tmp_path / 'batched.csv')) == read_file(reference_file)
+
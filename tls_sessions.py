@@ -0,0 +1,574 @@
+import glob  # Import glob to find the key log files
+import hmac  # Import hmac for the TLS 1.3 key derivation (HKDF)
+import os  # Import os to interact with the filesystem
+import struct  # Import struct to decode the TLS record and handshake fields
+from array import array  # Import array to store the record size sequences compactly
+from collections import defaultdict  # Import defaultdict to count the TLS record versions
+
+import pcapng_reader  # Importing the native reader to get the TCP payloads
+from accumulators import SizeDistribution  # Importing the exact size counter for the record sizes
+from flow_table import pack_endpoint  # Importing the compact endpoint encoding of the flow keys
+
+
+# Key log files (NSS key log format, as written by browsers with SSLKEYLOGFILE)
+KEYLOG_DIR = os.environ.get('TLS_KEYLOG_DIR', '.')
+KEYLOG_PATTERN = '*sslkeylogfile*.txt'
+
+# TCP flags
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+
+SEQUENCE_MASK = 0xFFFFFFFF  # TCP sequence numbers wrap around at 2^32
+MAX_PENDING_SEGMENTS = 256  # Out-of-order segments kept per direction while waiting for a missing one
+MAX_RECORD_LENGTH = 2 ** 14 + 2048  # Largest valid TLS record body
+
+# Connection tracking: connections are reported and forgotten when they close (FIN from both sides or RST)
+# or after this many seconds without packets
+TLS_IDLE_TIMEOUT = float(os.environ.get('TLS_IDLE_TIMEOUT', 300.0))
+RECORD_SEQUENCE_LENGTH = int(os.environ.get('TLS_RECORD_SEQUENCE', 32))  # Application records kept in order per connection
+
+# TLS record content types
+CHANGE_CIPHER_SPEC = 20
+ALERT = 21
+HANDSHAKE = 22
+APPLICATION_DATA = 23
+
+# TLS handshake message types
+CLIENT_HELLO = 1
+SERVER_HELLO = 2
+ENCRYPTED_EXTENSIONS = 8
+FINISHED = 20
+
+# TLS extensions
+EXTENSION_SERVER_NAME = 0
+EXTENSION_ALPN = 16
+EXTENSION_SUPPORTED_VERSIONS = 43
+
+TLS_1_2 = 0x0303
+TLS_1_3 = 0x0304
+TLS_VERSIONS = {0x0300: 'SSL 3.0', 0x0301: 'TLS 1.0', 0x0302: 'TLS 1.1', TLS_1_2: 'TLS 1.2', TLS_1_3: 'TLS 1.3'}
+
+# Cipher suites: (name, AEAD algorithm, key length, hash of the key derivation)
+CIPHER_SUITES = {
+    0x1301: ('TLS_AES_128_GCM_SHA256', 'AES-GCM', 16, 'sha256'),
+    0x1302: ('TLS_AES_256_GCM_SHA384', 'AES-GCM', 32, 'sha384'),
+    0x1303: ('TLS_CHACHA20_POLY1305_SHA256', 'CHACHA20', 32, 'sha256'),
+    0xC02B: ('TLS_ECDHE_ECDSA_WITH_AES_128_GCM_SHA256', 'AES-GCM', 16, 'sha256'),
+    0xC02C: ('TLS_ECDHE_ECDSA_WITH_AES_256_GCM_SHA384', 'AES-GCM', 32, 'sha384'),
+    0xC02F: ('TLS_ECDHE_RSA_WITH_AES_128_GCM_SHA256', 'AES-GCM', 16, 'sha256'),
+    0xC030: ('TLS_ECDHE_RSA_WITH_AES_256_GCM_SHA384', 'AES-GCM', 32, 'sha384'),
+    0xCCA8: ('TLS_ECDHE_RSA_WITH_CHACHA20_POLY1305_SHA256', 'CHACHA20', 32, 'sha256'),
+    0xCCA9: ('TLS_ECDHE_ECDSA_WITH_CHACHA20_POLY1305_SHA256', 'CHACHA20', 32, 'sha256'),
+}
+
+# Bytes an encrypted application record adds to its plaintext, when it cannot be decrypted:
+# TLS 1.3 adds the AEAD tag and the inner content type (padding is unknown without the keys),
+# TLS 1.2 AES-GCM adds an explicit nonce and the tag, and ChaCha20-Poly1305 only the tag
+TLS13_RECORD_OVERHEAD = 16 + 1
+TLS12_RECORD_OVERHEAD = {'AES-GCM': 8 + 16, 'CHACHA20': 16}
+
+# Key log labels of the TLS 1.3 traffic secrets, per direction (0 = client to server, 1 = server to client)
+HANDSHAKE_SECRET_LABELS = ('CLIENT_HANDSHAKE_TRAFFIC_SECRET', 'SERVER_HANDSHAKE_TRAFFIC_SECRET')
+APPLICATION_SECRET_LABELS = ('CLIENT_TRAFFIC_SECRET_0', 'SERVER_TRAFFIC_SECRET_0')
+
+HTTP2_PREFACE = b'PRI * HTTP/2.0'  # First bytes an HTTP/2 client sends
+
+U16_BE = struct.Struct('>H')
+
+
+# Class holding the secrets of a key log, indexed by client random for O(1) lookups
+class KeyLog:
+    def __init__(self):
+        self.secrets = {}  # Client random (32 bytes) -> {label: secret}
+
+    def __len__(self):
+        return len(self.secrets)
+
+    # Add the secrets of a key log file (lines of "LABEL <client random hex> <secret hex>")
+    def load(self, path):
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 3 or fields[0].startswith('#'):
+                    continue  # Comment or malformed line
+                label, client_random, secret = fields
+                try:
+                    self.secrets.setdefault(bytes.fromhex(client_random), {})[label] = bytes.fromhex(secret)
+                except ValueError:
+                    continue  # Not hexadecimal
+
+    def lookup(self, client_random):
+        return self.secrets.get(client_random)
+
+
+# Function to find the key log files: the SSLKEYLOGFILE environment variable and the files in KEYLOG_DIR
+def find_keylog_files(directory=KEYLOG_DIR):
+    paths = sorted(glob.glob(os.path.join(directory, KEYLOG_PATTERN)))
+    if os.environ.get('SSLKEYLOGFILE'):
+        paths.append(os.environ['SSLKEYLOGFILE'])
+    return paths
+
+
+# Function to load several key log files into one index
+def load_keylogs(paths):
+    keylog = KeyLog()
+    for path in paths:
+        keylog.load(path)
+    return keylog
+
+
+# Function to check whether records can be decrypted (requires the optional cryptography package)
+def decryption_available():
+    try:
+        import cryptography.hazmat.primitives.ciphers.aead  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Function to derive a TLS 1.3 key or IV from a traffic secret (HKDF-Expand-Label, RFC 8446 section 7.1)
+def hkdf_expand_label(secret, label, length, hash_name):
+    full_label = b'tls13 ' + label
+    info = struct.pack('>HB', length, len(full_label)) + full_label + b'\x00'  # Empty context
+    output = block = b''
+    counter = 1
+    while len(output) < length:
+        block = hmac.new(secret, block + info + bytes([counter]), hash_name).digest()
+        output += block
+        counter += 1
+    return output[:length]
+
+
+# Class to decrypt the TLS 1.3 records of one direction with one traffic secret
+class RecordDecryptor:
+    def __init__(self, secret, cipher_suite):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305  # Optional dependency
+        _, algorithm, key_length, hash_name = CIPHER_SUITES[cipher_suite]
+        key = hkdf_expand_label(secret, b'key', key_length, hash_name)
+        self.iv = hkdf_expand_label(secret, b'iv', 12, hash_name)
+        self.aead = AESGCM(key) if algorithm == 'AES-GCM' else ChaCha20Poly1305(key)
+        self.sequence = 0  # Record sequence number, part of the nonce
+
+    # Function to decrypt a record; returns (inner content type, plaintext), or None if it does not decrypt
+    def decrypt(self, header, ciphertext):
+        from cryptography.exceptions import InvalidTag
+        nonce = bytes(a ^ b for a, b in zip(self.iv, self.sequence.to_bytes(12, 'big')))
+        try:
+            plaintext = self.aead.decrypt(nonce, ciphertext, header)
+        except InvalidTag:
+            return None
+        self.sequence += 1
+        plaintext = plaintext.rstrip(b'\x00')  # Remove the record padding
+        if not plaintext:
+            return None
+        return plaintext[-1], plaintext[:-1]
+
+
+# Class to reassemble one direction of a TCP connection and cut it into TLS records
+class TcpStream:
+    __slots__ = ('next_sequence', 'buffer', 'pending', 'broken')
+
+    def __init__(self):
+        self.next_sequence = None  # Sequence number of the next expected byte
+        self.buffer = bytearray()  # Bytes received in order but not yet part of a complete record
+        self.pending = {}  # Out-of-order segments: sequence number -> payload
+        self.broken = False  # True when the stream is not TLS or a segment is missing
+
+    def add(self, sequence, flags, payload):
+        if flags & TCP_SYN:
+            self.next_sequence = (sequence + 1) & SEQUENCE_MASK
+            return
+        if not payload or self.broken:
+            return
+        if self.next_sequence is None:
+            self.next_sequence = sequence  # The capture started in the middle of the connection
+
+        delta = (sequence - self.next_sequence) & SEQUENCE_MASK
+        if delta >= 2 ** 31:
+            delta -= 2 ** 32  # The segment starts before the expected byte (retransmission or overlap)
+        if delta > 0:
+            if len(self.pending) >= MAX_PENDING_SEGMENTS:
+                self.broken = True  # A segment is missing from the capture
+            else:
+                self.pending[sequence] = payload
+            return
+        if -delta >= len(payload):
+            return  # Everything was already received
+        self.append(payload[-delta:])
+
+        while self.next_sequence in self.pending:  # Segments that were waiting for this one
+            self.append(self.pending.pop(self.next_sequence))
+
+    def append(self, data):
+        self.buffer += data
+        self.next_sequence = (self.next_sequence + len(data)) & SEQUENCE_MASK
+
+    # Function to take the complete TLS records out of the buffer, as (header, body) pairs
+    def records(self):
+        buffer = self.buffer
+        records = []
+        position = 0
+        while len(buffer) - position >= 5 and not self.broken:
+            content_type = buffer[position]
+            length = U16_BE.unpack_from(buffer, position + 3)[0]
+            if not CHANGE_CIPHER_SPEC <= content_type <= APPLICATION_DATA or length > MAX_RECORD_LENGTH:
+                self.broken = True  # Not a TLS stream (or lost synchronization)
+                break
+            if len(buffer) - position < 5 + length:
+                break  # The rest of the record has not arrived yet
+            records.append((bytes(buffer[position:position + 5]), bytes(buffer[position + 5:position + 5 + length])))
+            position += 5 + length
+        del buffer[:position]
+        return records
+
+
+# Function to iterate over the TLS extensions of a hello message starting at 'position'
+def iter_extensions(body, position):
+    if position + 2 > len(body):
+        return
+    end = min(position + 2 + U16_BE.unpack_from(body, position)[0], len(body))
+    position += 2
+    while position + 4 <= end:
+        extension_type, length = struct.unpack_from('>HH', body, position)
+        yield extension_type, body[position + 4:position + 4 + length]
+        position += 4 + length
+
+
+# Function to read the protocol names of an ALPN extension
+def parse_alpn(data):
+    protocols = []
+    position = 2  # Skip the list length
+    while position < len(data):
+        length = data[position]
+        protocols.append(data[position + 1:position + 1 + length].decode('ascii', 'replace'))
+        position += 1 + length
+    return protocols
+
+
+# Function to read the host name of a server name (SNI) extension
+def parse_server_name(data):
+    if len(data) < 5 or data[2] != 0:  # Only host names are defined
+        return None
+    length = U16_BE.unpack_from(data, 3)[0]
+    return data[5:5 + length].decode('ascii', 'replace')
+
+
+# Class to follow the TLS handshake and records of one TCP connection
+# (slots instead of an instance dictionary keep the state of many concurrent connections small)
+class TlsConnection:
+    __slots__ = ('client', 'server', 'start_time', 'last_time', 'closing', 'streams', 'handshake_buffers',
+                 'change_cipher_spec', 'decryptors', 'next_decryptors', 'secrets', 'client_random', 'sni',
+                 'alpn_offered', 'alpn', 'version', 'cipher_suite', 'client_hello_time', 'server_hello_time',
+                 'handshake_done_time', 'first_data_times', 'application_records', 'application_bytes',
+                 'record_sequence', 'decrypted_records', 'record_sizes', 'record_versions')
+
+    def __init__(self, client, server, start_time):
+        self.client = client  # (IP, port) of the client
+        self.server = server  # (IP, port) of the server
+        self.start_time = start_time  # Time of the first packet (the SYN when it was captured)
+        self.last_time = start_time  # Time of the last packet, for the idle timeout
+        self.closing = [False, False]  # FIN seen per direction
+        self.streams = (TcpStream(), TcpStream())  # Client to server, server to client
+        self.handshake_buffers = (bytearray(), bytearray())  # Handshake messages can span records
+        self.change_cipher_spec = [False, False]  # TLS 1.2: the following handshake records are encrypted
+        self.decryptors = [None, None]  # Decryptor of the current traffic secret, per direction
+        self.next_decryptors = [None, None]  # Decryptor of the application traffic secret, until it is in use
+        self.secrets = None  # Key log entry of the client random
+        self.client_random = None
+        self.sni = None
+        self.alpn_offered = []
+        self.alpn = None
+        self.version = None
+        self.cipher_suite = None
+        self.client_hello_time = None
+        self.server_hello_time = None
+        self.handshake_done_time = None  # Time of the client Finished message
+        self.first_data_times = [None, None]  # Time of the first application data record per direction
+        self.application_records = [0, 0]  # Application data records per direction
+        self.application_bytes = [0, 0]  # Plaintext bytes of the application data records per direction
+        self.record_sequence = array('i')  # Sizes of the first application records, negative from the server
+        self.decrypted_records = 0
+        self.record_sizes = None  # Shared SizeDistribution of the plaintext record sizes
+        self.record_versions = None  # Shared counts of the packets per TLS record version
+
+    def add_segment(self, direction, timestamp, sequence, flags, payload, keylog):
+        self.last_time = timestamp
+        stream = self.streams[direction]
+        stream.add(sequence, flags, payload)
+        records = stream.records()
+        if records:
+            # A packet is counted once, under the version of the first record it completes
+            # (tshark shows the TLS layer in the packet that completes a reassembled record)
+            self.record_versions[f'0x{U16_BE.unpack_from(records[0][0], 1)[0]:04x}'] += 1
+        for header, body in records:
+            self.process_record(direction, timestamp, header, body, keylog)
+        if flags & TCP_FIN:
+            self.closing[direction] = True
+
+    # True once both sides sent a FIN
+    def closed(self):
+        return self.closing[0] and self.closing[1]
+
+    def process_record(self, direction, timestamp, header, body, keylog):
+        content_type = header[0]
+        if content_type == CHANGE_CIPHER_SPEC:
+            self.change_cipher_spec[direction] = True
+        elif content_type == HANDSHAKE:
+            if self.change_cipher_spec[direction] and self.version != TLS_1_3:
+                # TLS 1.2 encrypted Finished message, which completes the client's side of the handshake
+                if direction == 0 and self.handshake_done_time is None:
+                    self.handshake_done_time = timestamp
+                return
+            self.handshake_buffers[direction].extend(body)
+            self.parse_handshake(direction, timestamp, keylog)
+        elif content_type == APPLICATION_DATA:
+            if self.version == TLS_1_3:
+                self.process_tls13_record(direction, timestamp, header, body)
+            else:
+                overhead = TLS12_RECORD_OVERHEAD.get(CIPHER_SUITES.get(self.cipher_suite, (None, None))[1], 0)
+                self.count_application_record(direction, timestamp, len(body) - overhead)
+
+    # TLS 1.3 encrypts the end of the handshake too; records are decrypted when the key log has their secrets,
+    # otherwise the first client record is taken as its Finished message and the sizes are estimated
+    def process_tls13_record(self, direction, timestamp, header, body):
+        decryptor = self.decryptors[direction]
+        decrypted = decryptor.decrypt(header, body) if decryptor is not None else None
+        if decrypted is None and self.next_decryptors[direction] is not None:
+            # Some key logs lack the handshake secrets: records that do not decrypt with the application
+            # secret are handshake messages, and the first one that does starts the application data
+            decrypted = self.next_decryptors[direction].decrypt(header, body)
+            if decrypted is None:
+                if direction == 0 and self.handshake_done_time is None:
+                    self.handshake_done_time = timestamp  # The client's encrypted Finished message
+                return
+            self.switch_keys(direction)
+        if decrypted is not None:
+            inner_type, plaintext = decrypted
+            if inner_type == HANDSHAKE:
+                self.handshake_buffers[direction].extend(plaintext)
+                self.parse_handshake(direction, timestamp, None)
+            elif inner_type == APPLICATION_DATA:
+                if self.alpn is None and direction == 0 and plaintext.startswith(HTTP2_PREFACE):
+                    self.alpn = 'h2'  # The ALPN extension was in handshake messages that could not be decrypted
+                self.decrypted_records += 1
+                self.count_application_record(direction, timestamp, len(plaintext))
+            return
+
+        if self.handshake_done_time is None:
+            if direction == 0:
+                self.handshake_done_time = timestamp
+            return  # Encrypted handshake messages
+        self.count_application_record(direction, timestamp, len(body) - TLS13_RECORD_OVERHEAD)
+
+    def count_application_record(self, direction, timestamp, size):
+        size = max(size, 0)
+        if self.first_data_times[direction] is None:
+            self.first_data_times[direction] = timestamp
+        self.application_records[direction] += 1
+        self.application_bytes[direction] += size
+        if len(self.record_sequence) < RECORD_SEQUENCE_LENGTH:
+            self.record_sequence.append(size if direction == 0 else -size)
+        if self.record_sizes is not None:
+            self.record_sizes.add(size)
+
+    # Function to handle the complete handshake messages of a direction
+    def parse_handshake(self, direction, timestamp, keylog):
+        buffer = self.handshake_buffers[direction]
+        while len(buffer) >= 4:
+            message_type = buffer[0]
+            length = int.from_bytes(buffer[1:4], 'big')
+            if len(buffer) < 4 + length:
+                break  # The rest of the message is in the next record
+            body = bytes(buffer[4:4 + length])
+            del buffer[:4 + length]
+            try:
+                self.handle_handshake_message(direction, timestamp, message_type, body, keylog)
+            except (IndexError, struct.error):
+                continue  # Malformed message
+
+    def handle_handshake_message(self, direction, timestamp, message_type, body, keylog):
+        if message_type == CLIENT_HELLO and direction == 0:
+            self.client_hello_time = timestamp
+            self.client_random = body[2:34]
+            position = 35 + body[34]  # Skip the session id
+            position += 2 + U16_BE.unpack_from(body, position)[0]  # Skip the cipher suites
+            position += 1 + body[position]  # Skip the compression methods
+            for extension_type, data in iter_extensions(body, position):
+                if extension_type == EXTENSION_SERVER_NAME:
+                    self.sni = parse_server_name(data)
+                elif extension_type == EXTENSION_ALPN:
+                    self.alpn_offered = parse_alpn(data)
+        elif message_type == SERVER_HELLO and direction == 1:
+            self.server_hello_time = timestamp
+            self.version = U16_BE.unpack_from(body, 0)[0]
+            position = 35 + body[34]  # Skip the random and the session id
+            self.cipher_suite = U16_BE.unpack_from(body, position)[0]
+            for extension_type, data in iter_extensions(body, position + 3):
+                if extension_type == EXTENSION_SUPPORTED_VERSIONS:
+                    self.version = U16_BE.unpack_from(data, 0)[0]  # TLS 1.3 is negotiated in this extension
+                elif extension_type == EXTENSION_ALPN:
+                    self.alpn = parse_alpn(data)[0]
+            self.start_decryption(keylog)
+        elif message_type == ENCRYPTED_EXTENSIONS:
+            for extension_type, data in iter_extensions(body, 0):
+                if extension_type == EXTENSION_ALPN:
+                    self.alpn = parse_alpn(data)[0]  # TLS 1.3 sends the negotiated ALPN encrypted
+        elif message_type == FINISHED and self.version == TLS_1_3:
+            if direction == 0 and self.handshake_done_time is None:
+                self.handshake_done_time = timestamp
+            self.switch_keys(direction)  # The following records use the application traffic secret
+
+    # Function to set up the TLS 1.3 decryptors once the cipher suite is known
+    def start_decryption(self, keylog):
+        if keylog is not None and self.client_random is not None:
+            self.secrets = keylog.lookup(self.client_random)
+        if (self.version != TLS_1_3 or not self.secrets or self.cipher_suite not in CIPHER_SUITES
+                or not decryption_available()):
+            return
+        for direction in (0, 1):
+            self.decryptors[direction] = self.create_decryptor(HANDSHAKE_SECRET_LABELS[direction])
+            self.next_decryptors[direction] = self.create_decryptor(APPLICATION_SECRET_LABELS[direction])
+
+    # Function to create the decryptor of a traffic secret, if the key log has it
+    def create_decryptor(self, label):
+        if self.secrets and label in self.secrets:
+            return RecordDecryptor(self.secrets[label], self.cipher_suite)
+        return None
+
+    # Move a direction to its application traffic secret (after its Finished message)
+    def switch_keys(self, direction):
+        self.decryptors[direction] = self.next_decryptors[direction]
+        self.next_decryptors[direction] = None
+
+    # Function to get the report of the connection
+    def summary(self):
+        def elapsed(end):
+            return end - self.client_hello_time if end is not None and self.client_hello_time is not None else None
+
+        return {
+            'client': f'{self.client[0]}:{self.client[1]}',
+            'server': f'{self.server[0]}:{self.server[1]}',
+            'start_time': self.start_time,
+            'sni': self.sni,
+            'alpn': self.alpn,
+            'alpn_offered': self.alpn_offered,
+            'version': TLS_VERSIONS.get(self.version, hex(self.version) if self.version else None),
+            'cipher_suite': CIPHER_SUITES.get(self.cipher_suite, (hex(self.cipher_suite),))[0] if self.cipher_suite else None,
+            'keys_found': bool(self.secrets),
+            'server_hello_latency': elapsed(self.server_hello_time),  # ClientHello -> ServerHello
+            'handshake_latency': elapsed(self.handshake_done_time),  # ClientHello -> client Finished
+            'client_data_latency': elapsed(self.first_data_times[0]),  # ClientHello -> first client application record
+            'server_data_latency': elapsed(self.first_data_times[1]),  # ClientHello -> first server application record
+            'duration': self.last_time - self.start_time,
+            'client_records': self.application_records[0],
+            'client_bytes': self.application_bytes[0],
+            'server_records': self.application_records[1],
+            'server_bytes': self.application_bytes[1],
+            'decrypted_records': self.decrypted_records,
+            'record_sequence': self.record_sequence.tolist(),  # Client records positive, server records negative
+        }
+
+
+# Class to find the TLS connections of a capture and follow them while streaming through it.
+# Connections are keyed on their TCP 4-tuple; closed and idle ones are summarized and their state is dropped,
+# so memory only depends on the number of concurrent connections.
+class TlsSessionAnalyzer:
+    def __init__(self, keylog=None, idle_timeout=TLS_IDLE_TIMEOUT):
+        self.keylog = keylog
+        self.idle_timeout = idle_timeout
+        self.connections = {}  # Packed endpoints (sorted) -> TlsConnection
+        self.sessions = []  # Reports of the connections that ended
+        self.record_sizes = SizeDistribution()  # Plaintext sizes of all application data records
+        self.record_versions = defaultdict(int)  # TLS record version -> packets (as counted by C_TLS_header_fields)
+        self.next_sweep = None  # Capture time of the next scan for idle connections
+
+    def process_segment(self, timestamp, ip_src, ip_dst, src_port, dst_port, sequence, flags, payload):
+        source, destination = pack_endpoint(ip_src, src_port), pack_endpoint(ip_dst, dst_port)
+        key = source + destination if source < destination else destination + source
+        connection = self.connections.get(key)
+        if connection is None:
+            if flags & TCP_RST:
+                return  # Reset of a connection that already ended (or was never seen)
+            if flags & TCP_SYN or src_port > dst_port:  # The SYN sender, or else the ephemeral port, is the client
+                connection = TlsConnection((ip_src, src_port), (ip_dst, dst_port), timestamp)
+            else:
+                connection = TlsConnection((ip_dst, dst_port), (ip_src, src_port), timestamp)
+            connection.record_sizes = self.record_sizes
+            connection.record_versions = self.record_versions
+            self.connections[key] = connection
+        direction = 0 if (ip_src, src_port) == connection.client else 1
+        connection.add_segment(direction, timestamp, sequence, flags, payload, self.keylog)
+        if flags & TCP_RST or connection.closed():
+            self.expire(key)
+
+        # Regularly end the connections that have been idle for too long
+        if self.next_sweep is None:
+            self.next_sweep = timestamp + self.idle_timeout
+        elif timestamp >= self.next_sweep:
+            self.sweep(timestamp)
+            self.next_sweep = timestamp + self.idle_timeout
+
+    # Report a connection (if it started a TLS handshake) and drop its state
+    def expire(self, key):
+        connection = self.connections.pop(key)
+        if connection.client_hello_time is not None:
+            self.sessions.append(connection.summary())
+
+    # End the connections without packets for longer than the idle timeout
+    def sweep(self, now):
+        idle = [key for key, connection in self.connections.items() if now - connection.last_time > self.idle_timeout]
+        for key in idle:
+            self.expire(key)
+
+    # Function to get the reports of the connections that started a TLS handshake, in order of their first packet
+    def result(self):
+        sessions = self.sessions + [connection.summary() for connection in self.connections.values()
+                                    if connection.client_hello_time is not None]
+        return sorted(sessions, key=lambda session: session['start_time'])
+
+
+# Function to analyze the TLS connections of a capture file with the given key log files.
+# Returns the session reports, the application record sizes and the packets per TLS record version.
+def analyze_tls_sessions(pcap_file, keylog_files=None):
+    keylog = load_keylogs(find_keylog_files() if keylog_files is None else keylog_files)
+    analyzer = TlsSessionAnalyzer(keylog)
+    for segment in pcapng_reader.iter_tcp_segments(pcap_file):
+        analyzer.process_segment(*segment)
+    return analyzer.result(), analyzer.record_sizes, analyzer.record_versions
+
+
+# Function to format the session reports as a table
+def format_session_table(sessions):
+    lines = [f"{'server':<22} {'SNI':<32} {'version':<8} {'cipher suite':<30} {'ALPN':<9} {'keys':<4} "
+             f"{'SH ms':>7} {'HS ms':>7} {'data ms':>7} {'records':>8} {'bytes':>10}"]
+    for session in sessions:
+        def milliseconds(value):
+            return f'{value * 1000:.1f}' if value is not None else '-'
+        lines.append(
+            f"{session['server']:<22} {(session['sni'] or '-')[:32]:<32} {session['version'] or '-':<8} "
+            f"{(session['cipher_suite'] or '-')[:30]:<30} {session['alpn'] or '-':<9} {'yes' if session['keys_found'] else 'no':<4} "
+            f"{milliseconds(session['server_hello_latency']):>7} {milliseconds(session['handshake_latency']):>7} "
+            f"{milliseconds(session['server_data_latency']):>7} "
+            f"{session['client_records'] + session['server_records']:>8} {session['client_bytes'] + session['server_bytes']:>10}")
+    return '\n'.join(lines)
+
+
+# Directory containing PCAPNG files
+PCAP_DIR = 'pcapng_files'
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    from packet_engine import get_pcap_files  # Importing the pcap file lookup
+    from parallel_runner import map_files  # Importing the runner that spreads files over CPU cores
+
+    pcap_files = get_pcap_files(PCAP_DIR)
+    keylog_files = find_keylog_files()
+    print(f"Key logs: {', '.join(keylog_files) or 'none'}"
+          f"{'' if decryption_available() else ' (install cryptography to decrypt TLS 1.3 records)'}")
+
+    for pcap_file, (sessions, record_sizes, record_versions) in zip(pcap_files, map_files(analyze_tls_sessions, pcap_files, None, keylog_files)):
+        print(f"\nTLS connections of {os.path.basename(pcap_file)}")
+        print(format_session_table(sessions))
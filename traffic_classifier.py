@@ -0,0 +1,290 @@
+import argparse  # Import argparse to read the command-line options
+import json  # Import json to store the trained model
+import os  # Import os to interact with the filesystem
+
+from traffic_table import get_traffic_files, load_traffic_data  # Importing the CSV/Parquet traffic table loader
+from parallel_runner import map_files  # Importing the runner that spreads files over CPU cores
+from result_cache import write_atomically  # Importing the atomic file writer
+from instrumentation import stage  # Importing the opt-in stage timers
+
+
+# Classifier settings (can be overridden from the environment)
+MODEL_FILE = os.environ.get('PCAP_MODEL', 'traffic_model.json')
+WINDOW_SECONDS = float(os.environ.get('PCAP_CLASSIFY_WINDOW', 10))  # A flow is cut into windows of this length
+MIN_PACKETS = 3  # Windows with fewer packets carry too little information to be classified
+TEST_SHARE = 0.25  # Last part (in time) of every labeled file kept aside to measure the accuracy
+
+# Training settings of the softmax regression
+EPOCHS = 2000
+LEARNING_RATE = 1.0
+L2_PENALTY = 1e-5
+
+# Size histogram edges (bytes) and server port groups of the feature vectors
+SIZE_EDGES = [64, 128, 256, 512, 768, 1024, 1280]
+PORT_GROUPS = [
+    ('https', [443]), ('http', [80, 8080]), ('dns', [53, 5353]), ('stun', list(range(3478, 3482))),
+    ('zoom', list(range(8801, 8811))), ('spotify', [4070]), ('ssdp', [1900, 3702]), ('dhcp', [67, 68]),
+]
+FEATURE_NAMES = (['log_packets', 'log_bytes', 'mean_size', 'std_size', 'min_size', 'max_size']
+                 + [f'size_bin_{index}' for index in range(len(SIZE_EDGES) + 1)]
+                 + ['mean_log_gap', 'std_log_gap', 'log_duration', 'log_packet_rate',
+                    'upstream_packets', 'upstream_bytes']
+                 + [f'port_{name}' for name, ports in PORT_GROUPS] + ['port_other', 'port_none'])
+WINDOW_COLUMNS = ["Endpoint A", "Port A", "Endpoint B", "Port B", "Start", "Packets", "Bytes"]  # Description of a window
+
+
+# Function to get the label of a labeled traffic table from its name ("zoom_traffic_analysis.csv" -> "zoom")
+def label_of(file_path):
+    return os.path.basename(file_path).split('_')[0]
+
+
+# Function to compute one fixed-length feature vector per flow window of a traffic table.
+# A flow is the conversation between two (IP, port) endpoints; it is cut into WINDOW_SECONDS windows.
+# Every step works on whole columns (sorting, reduceat and bincount), there is no Python loop over packets or flows.
+# Returns (features as a float32 matrix, DataFrame describing every window).
+def extract_features(df, window_seconds=WINDOW_SECONDS, min_packets=MIN_PACKETS):
+    import numpy as np  # NumPy is only loaded to compute the features
+    import pandas as pd  # Pandas is only loaded to compute the features
+    if len(df) == 0:
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32), pd.DataFrame(columns=WINDOW_COLUMNS)
+
+    count = len(df)
+    timestamps = df["Timestamp"].to_numpy(dtype=np.float64)
+    sizes = df["Size"].to_numpy(dtype=np.float64)
+    src_ports = pd.to_numeric(df["Source Port"], errors="coerce").to_numpy(np.float64, na_value=-1).astype(np.int64)  # -1: no port
+    dst_ports = pd.to_numeric(df["Destination Port"], errors="coerce").to_numpy(np.float64, na_value=-1).astype(np.int64)
+
+    # Endpoint codes: (IP code, port) pairs numbered densely; a flow is the (smaller, larger) pair of codes
+    ip_codes, ips = pd.factorize(pd.concat([df["Source IP"], df["Destination IP"]], ignore_index=True).astype(str))
+    endpoint_keys = ip_codes.astype(np.int64) * 65537 + (np.concatenate([src_ports, dst_ports]) + 1)
+    endpoint_codes, endpoints = pd.factorize(endpoint_keys)
+    src_endpoints, dst_endpoints = endpoint_codes[:count].astype(np.int64), endpoint_codes[count:].astype(np.int64)
+    flows = np.minimum(src_endpoints, dst_endpoints) * len(endpoints) + np.maximum(src_endpoints, dst_endpoints)
+
+    # Group = (flow, window); packets are sorted by group, then by time
+    windows = ((timestamps - timestamps.min()) // window_seconds).astype(np.int64)
+    window_count = windows.max() + 1
+    groups, group_keys = pd.factorize(flows * window_count + windows)
+    order = np.lexsort((timestamps, groups))
+    groups, timestamps, sizes = groups[order], timestamps[order], sizes[order]
+    src_ports, dst_ports = src_ports[order], dst_ports[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    group_ids = groups[starts]  # Group of every run of sorted packets
+
+    # Per-group sums, in the order of the runs
+    def group_sum(values):
+        return np.bincount(groups, weights=values, minlength=len(group_keys))[group_ids]
+
+    packets = group_sum(np.ones(count))
+    total_bytes = group_sum(sizes)
+    mean_size = total_bytes / packets
+    std_size = np.sqrt(np.maximum(group_sum(sizes * sizes) / packets - mean_size ** 2, 0))
+    min_size = np.minimum.reduceat(sizes, starts)
+    max_size = np.maximum.reduceat(sizes, starts)
+    size_bins = np.searchsorted(SIZE_EDGES, sizes, side='right')
+    size_histogram = np.stack([group_sum((size_bins == index).astype(np.float64)) / packets
+                               for index in range(len(SIZE_EDGES) + 1)], axis=1)
+
+    # Gaps between consecutive packets of the same group, on a log scale
+    same_group = np.r_[False, groups[1:] == groups[:-1]]
+    log_gaps = np.where(same_group, np.log10(np.maximum(np.r_[0.0, np.diff(timestamps)], 0) + 1e-6), 0.0)
+    gap_counts = group_sum(same_group.astype(np.float64))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_log_gap = np.nan_to_num(group_sum(log_gaps) / gap_counts, nan=0.0)
+        std_log_gap = np.sqrt(np.maximum(np.nan_to_num(group_sum(log_gaps ** 2) / gap_counts, nan=0.0) - mean_log_gap ** 2, 0))
+    first_times = timestamps[starts]
+    last_times = np.maximum.reduceat(timestamps, starts)
+    duration = last_times - first_times
+
+    # Direction: packets sent by the endpoint with the higher port (the client's ephemeral port) are upstream
+    upstream = (src_ports > dst_ports).astype(np.float64)
+    upstream_packets = group_sum(upstream) / packets
+    upstream_bytes = group_sum(upstream * sizes) / total_bytes
+
+    # Server port of the flow (the lower of the two ports) as one-hot groups
+    server_ports = np.minimum(src_ports, dst_ports)[starts]
+    port_columns = [np.isin(server_ports, ports) for name, ports in PORT_GROUPS]
+    no_port = server_ports < 0
+    other_port = ~(np.any(port_columns, axis=0) | no_port)
+    port_features = np.stack(port_columns + [other_port, no_port], axis=1).astype(np.float64)
+
+    features = np.column_stack([
+        np.log1p(packets), np.log1p(total_bytes), mean_size, std_size, min_size, max_size, size_histogram,
+        mean_log_gap, std_log_gap, np.log1p(duration), np.log1p(packets / np.maximum(duration, 1e-3)),
+        upstream_packets, upstream_bytes, port_features,
+    ]).astype(np.float32)
+
+    # Description of every window: its flow endpoints, start time and size
+    flow_ids = group_keys[group_ids] // window_count
+    low, high = flow_ids // len(endpoints), flow_ids % len(endpoints)
+    endpoint_ips = np.asarray(ips)[endpoints // 65537]
+    endpoint_ports = endpoints % 65537 - 1
+    windows_info = pd.DataFrame(dict(zip(WINDOW_COLUMNS, [
+        endpoint_ips[low], endpoint_ports[low], endpoint_ips[high], endpoint_ports[high],
+        first_times, packets.astype(np.int64), total_bytes.astype(np.int64)])))
+    keep = packets >= min_packets
+    return features[keep], windows_info[keep].reset_index(drop=True)
+
+
+# Class for a multinomial logistic (softmax) regression trained with full-batch gradient descent on
+# standardized features: small enough to store as JSON, and scored with one matrix product
+class SoftmaxClassifier:
+    def __init__(self, classes=None, mean=None, scale=None, weights=None, bias=None):
+        self.classes = classes or []
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights  # Features x classes
+        self.bias = bias
+
+    def fit(self, features, labels, epochs=EPOCHS, learning_rate=LEARNING_RATE, l2_penalty=L2_PENALTY):
+        import numpy as np  # NumPy is only loaded to train the model
+        self.classes = sorted(set(labels))
+        targets = np.searchsorted(self.classes, labels)
+        self.mean = features.mean(axis=0)
+        self.scale = features.std(axis=0) + 1e-6
+        x = (features - self.mean) / self.scale
+        one_hot = np.eye(len(self.classes))[targets]
+        # Every class weighs the same in the loss, however many windows it has
+        sample_weights = (len(labels) / (len(self.classes) * np.bincount(targets)))[targets][:, None] / len(labels)
+        self.weights = np.zeros((x.shape[1], len(self.classes)))
+        self.bias = np.zeros(len(self.classes))
+        for epoch in range(epochs):
+            error = (self.probabilities_of(x) - one_hot) * sample_weights
+            self.weights -= learning_rate * (x.T @ error + l2_penalty * self.weights)
+            self.bias -= learning_rate * error.sum(axis=0)
+        return self
+
+    # Function to get the class probabilities of standardized features
+    def probabilities_of(self, x):
+        import numpy as np  # NumPy is only loaded to score
+        scores = x @ self.weights + self.bias
+        scores -= scores.max(axis=1, keepdims=True)  # Avoid overflows in exp
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    # Function to get the class probabilities of feature vectors (one row per window)
+    def predict_proba(self, features):
+        return self.probabilities_of((features - self.mean) / self.scale)
+
+    # Function to get the predicted class of every feature vector
+    def predict(self, features):
+        import numpy as np  # NumPy is only loaded to score
+        return np.asarray(self.classes)[self.predict_proba(features).argmax(axis=1)]
+
+    def save(self, path):
+        model = {
+            'classes': self.classes, 'features': FEATURE_NAMES, 'window_seconds': WINDOW_SECONDS,
+            'mean': self.mean.tolist(), 'scale': self.scale.tolist(),
+            'weights': self.weights.tolist(), 'bias': self.bias.tolist(),
+        }
+        write_atomically(path, json.dumps(model).encode())
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np  # NumPy is only loaded to score
+        with open(path) as f:
+            model = json.load(f)
+        if model['features'] != FEATURE_NAMES:
+            raise ValueError(f"{path} was trained with other features, train it again")
+        return cls(model['classes'], np.array(model['mean']), np.array(model['scale']),
+                   np.array(model['weights']), np.array(model['bias']))
+
+
+# Function to load a traffic table (CSV, Parquet or a capture) and compute the features of its windows
+def load_features(file_path):
+    df = load_traffic_data(file_path)
+    with stage('analyze', 'extract_features', items=len(df)):
+        return extract_features(df)
+
+
+# Function to split the windows of one labeled file in time: the last TEST_SHARE of them are kept for testing
+def split_in_time(windows, test_share=TEST_SHARE):
+    cut = windows["Start"].quantile(1 - test_share) if len(windows) else 0.0
+    return (windows["Start"] < cut).to_numpy()
+
+
+# Function to train a model on labeled traffic tables and measure its accuracy on the last part of every file.
+# Returns the model trained on all the windows, the test accuracy (share of the windows, and share of the bytes,
+# classified correctly) and the confusion matrix (DataFrame); the accuracy is None without a test part.
+def train_model(files, workers=None, test_share=TEST_SHARE):
+    import numpy as np  # NumPy is only loaded to train the model
+    import pandas as pd  # Pandas is only loaded to format the confusion matrix
+    all_features, all_labels, all_train, all_bytes = [], [], [], []
+    for file_path, (features, windows) in zip(files, map_files(load_features, files, workers)):
+        all_features.append(features)
+        all_labels.extend([label_of(file_path)] * len(features))
+        all_train.append(split_in_time(windows, test_share))
+        all_bytes.append(windows["Bytes"].to_numpy())
+    features = np.concatenate(all_features)
+    labels = np.asarray(all_labels)
+    train = np.concatenate(all_train)
+    window_bytes = np.concatenate(all_bytes)
+
+    accuracy = confusion = None
+    test = ~train
+    if test_share and test.any():
+        model = SoftmaxClassifier().fit(features[train], labels[train])
+        predicted = model.predict(features[test])
+        correct = predicted == labels[test]
+        accuracy = (float(correct.mean()), float(window_bytes[test][correct].sum() / window_bytes[test].sum()))
+        confusion = pd.crosstab(pd.Series(labels[test], name='label'), pd.Series(predicted, name='predicted'))
+    return SoftmaxClassifier().fit(features, labels), accuracy, confusion
+
+
+# Function to classify the windows of a traffic table or capture.
+# Returns the windows with their predicted application and its probability.
+def classify_file(file_path, model):
+    features, windows = load_features(file_path)
+    if len(features):
+        probabilities = model.predict_proba(features)
+        windows["Application"] = [model.classes[index] for index in probabilities.argmax(axis=1)]
+        windows["Probability"] = probabilities.max(axis=1)
+    else:
+        windows["Application"] = []
+        windows["Probability"] = []
+    return windows
+
+
+if __name__ == "__main__":
+    from instrumentation import start_run  # Importing the opt-in metrics and profiling of a run
+    start_run()
+
+    from atkr_part_A import CSV_DIR  # Importing the default traffic table directory
+
+    parser = argparse.ArgumentParser(description="Identify the application of traffic from its packet metadata.")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    train_parser = subcommands.add_parser('train', help="train a model on labeled traffic tables (label = file name prefix)")
+    train_parser.add_argument('files', nargs='*', help=f"labeled CSV/Parquet tables (default: the tables in {CSV_DIR})")
+    train_parser.add_argument('--test-share', type=float, default=TEST_SHARE,
+                              help="last part of every file used to measure the accuracy (0 to skip)")
+    score_parser = subcommands.add_parser('score', help="classify the flows of traffic tables or captures")
+    score_parser.add_argument('files', nargs='+', help="CSV/Parquet tables or .pcapng captures")
+    score_parser.add_argument('--output', help="CSV file for the prediction of every flow window")
+    for subcommand in (train_parser, score_parser):
+        subcommand.add_argument('--model', default=MODEL_FILE, help="model file")
+        subcommand.add_argument('--workers', type=int, help="worker processes (default: one per CPU core)")
+    options = parser.parse_args()
+
+    if options.command == 'train':
+        files = options.files or sorted(get_traffic_files(CSV_DIR))
+        if not files:
+            parser.error(f"no labeled traffic tables found in {CSV_DIR}")
+        model, accuracy, confusion = train_model(files, options.workers, options.test_share)
+        if accuracy is not None:
+            print(f"Accuracy on the last {options.test_share:.0%} of every file: {accuracy[0]:.1%} of the flow windows, "
+                  f"{accuracy[1]:.1%} of the bytes")
+            print(confusion.to_string())
+        model.save(options.model)
+        print(f"Model ({', '.join(model.classes)}) saved to {options.model}")
+    else:
+        import pandas as pd  # Importing Pandas to collect the predictions
+        model = SoftmaxClassifier.load(options.model)
+        all_windows = map_files(classify_file, options.files, options.workers, model)
+        for file_path, windows in zip(options.files, all_windows):
+            shares = windows.groupby("Application")["Bytes"].sum().sort_values(ascending=False) / max(windows["Bytes"].sum(), 1)
+            summary = ', '.join(f'{application} {share:.0%}' for application, share in shares.items())
+            print(f"{os.path.basename(file_path)}: {len(windows):,} flow windows, bytes by application: {summary or '-'}")
+        if options.output:
+            pd.concat([windows.assign(File=file_path) for file_path, windows in zip(options.files, all_windows)],
+                      ignore_index=True).to_csv(options.output, index=False)
+            print(f"Predictions written to {options.output}")
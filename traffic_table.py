@@ -0,0 +1,163 @@
+import csv  # Import csv to write the CSV traffic tables incrementally
+import os  # Import os to interact with the filesystem
+import glob  # Import glob to find files matching a pattern
+import socket  # Import socket to pack IPv4 addresses into integers
+import struct  # Import struct to convert packed addresses into integers
+
+from instrumentation import stage  # Importing the opt-in stage timers
+
+
+# Column names shared by the CSV and Parquet traffic tables
+TRAFFIC_COLUMNS = ["Timestamp", "Size", "Source IP", "Destination IP", "Source Port", "Destination Port"]
+IP_COLUMNS = ["Source IP", "Destination IP"]
+PORT_COLUMNS = ["Source Port", "Destination Port"]
+
+# Output formats of pcapng_to_CSV_for_atkr
+CSV_FORMAT = 'csv'
+PARQUET_FORMAT = 'parquet'
+
+ROW_GROUP_SIZE = 64 * 1024  # Number of rows written per Parquet row group
+CSV_BATCH_SIZE = 10 * 1024  # Number of rows buffered before they are written to a CSV file
+
+U32_BE = struct.Struct('>I')
+
+
+# Function to convert a dotted IPv4 address into a 32-bit integer
+def ip_to_int(ip):
+    return U32_BE.unpack(socket.inet_aton(ip))[0]
+
+
+# Function to get the Arrow schema of a Parquet traffic table
+def parquet_schema():
+    import pyarrow as pa  # Optional dependency, only needed for the Parquet format
+    return pa.schema([
+        ("Timestamp", pa.float64()),  # Seconds since the epoch
+        ("Size", pa.uint32()),  # Packet size in bytes (can exceed 65535 with segmentation offload)
+        ("Source IP", pa.uint32()),  # IPv4 address packed into an integer
+        ("Destination IP", pa.uint32()),
+        ("Source Port", pa.uint16()),  # Null when the packet has no transport layer
+        ("Destination Port", pa.uint16()),
+    ])
+
+
+# Class to write traffic rows into a Parquet file, one row group at a time, so memory stays bounded
+class ParquetTrafficWriter:
+    def __init__(self, output_file, row_group_size=ROW_GROUP_SIZE):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("The Parquet output format requires pyarrow (pip install pyarrow)")
+        self.schema = parquet_schema()
+        self.writer = pq.ParquetWriter(output_file, self.schema)
+        self.row_group_size = row_group_size
+        self.rows = self.new_row_group()  # Rows of the row group being filled, in typed columns
+        self.row_count = 0  # Number of rows written so far
+
+    # Function to get an empty store for the rows of the next row group
+    def new_row_group(self):
+        from packet_store import PacketStore  # Imported here because packet_store imports this module
+        return PacketStore()
+
+    # Add one packet (ports may be None)
+    def write_row(self, timestamp, size, src_ip, dst_ip, src_port, dst_port):
+        self.rows.write_row(timestamp, size, src_ip, dst_ip, src_port, dst_port)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    # Write the buffered rows as one row group (the columns are handed to Arrow as NumPy views;
+    # IPs are converted to integers once per distinct address)
+    def flush(self):
+        rows = self.rows
+        if not len(rows):
+            return
+        import pyarrow as pa
+        with stage('serialize', 'parquet', items=len(rows)):
+            arrays = []
+            for name, field in zip(TRAFFIC_COLUMNS, self.schema):
+                if name in IP_COLUMNS:
+                    arrays.append(pa.array(rows.ip_integers(name), type=field.type))
+                elif name in PORT_COLUMNS:
+                    arrays.append(pa.array(rows.column(name), mask=rows.port_missing(name), type=field.type))
+                else:
+                    arrays.append(pa.array(rows.column(name), type=field.type))
+            self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.row_count += len(rows)
+        self.rows = self.new_row_group()  # A new store, since Arrow may still hold views of the old one
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+# Class to write traffic rows into a CSV file in fixed-size batches, so memory stays bounded.
+# The output is the same as DataFrame.to_csv: ports of packets without a transport layer are "Unknown".
+class CsvTrafficWriter:
+    def __init__(self, output_file, batch_size=CSV_BATCH_SIZE):
+        self.file = open(output_file, 'w', newline='')
+        self.writer = csv.writer(self.file, lineterminator='\n')
+        self.writer.writerow(TRAFFIC_COLUMNS)  # Header line
+        self.batch_size = batch_size
+        self.rows = []  # Rows waiting to be written
+        self.row_count = 0  # Number of rows written so far
+
+    # Add one packet (ports may be None)
+    def write_row(self, timestamp, size, src_ip, dst_ip, src_port, dst_port):
+        self.rows.append((timestamp, size, src_ip, dst_ip,
+                          src_port if src_port is not None else "Unknown",
+                          dst_port if dst_port is not None else "Unknown"))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    # Write the buffered rows
+    def flush(self):
+        with stage('serialize', 'csv', items=len(self.rows)):
+            self.writer.writerows(self.rows)
+        self.row_count += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# Function to open the writer of the given output format
+def open_traffic_writer(output_file, output_format=CSV_FORMAT):
+    if output_format == PARQUET_FORMAT:
+        return ParquetTrafficWriter(output_file)
+    if output_format == CSV_FORMAT:
+        return CsvTrafficWriter(output_file)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+
+# Function to convert a column of packed IPv4 integers back into dotted strings
+def int_to_ip_column(values):
+    values = values.astype('int64')
+    octets = [(values // 2 ** shift % 256).astype(str) for shift in (24, 16, 8, 0)]
+    return octets[0] + '.' + octets[1] + '.' + octets[2] + '.' + octets[3]
+
+
+# Function to load a traffic table (CSV or Parquet) into a DataFrame, reading only the requested columns.
+# A capture (.pcapng) is read directly into a packet store, without writing a traffic table first.
+def load_traffic_data(file_path, columns=None):
+    import pandas as pd  # Importing Pandas for data analysis
+    if file_path.endswith('.pcapng'):
+        from packet_store import load_packet_store  # Imported here because packet_store imports this module
+        store = load_packet_store(file_path)
+        with stage('read', 'traffic_table'):  # DataFrame build
+            return store.to_dataframe(columns)
+    with stage('read', 'traffic_table'):  # DataFrame build
+        if file_path.endswith('.parquet'):
+            import pyarrow as pa  # Optional dependency, only needed for the Parquet format
+            import pyarrow.parquet as pq
+            df = pq.read_table(file_path, columns=columns).to_pandas(
+                types_mapper={pa.uint16(): pd.UInt16Dtype()}.get)  # Ports stay integers, with <NA> for missing ports
+            for column in IP_COLUMNS:
+                if column in df:
+                    df[column] = int_to_ip_column(df[column])  # Same IP strings as in the CSV files
+            return df
+        return pd.read_csv(file_path, usecols=columns)  # Read only the needed columns from the CSV
+
+
+# Function to get all traffic tables (.csv and .parquet files) in the folder
+def get_traffic_files(directory):
+    return glob.glob(os.path.join(directory, "*.csv")) + glob.glob(os.path.join(directory, "*.parquet"))
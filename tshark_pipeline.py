@@ -0,0 +1,224 @@
+import asyncio  # Import asyncio to run the tshark processes and the pipeline stages concurrently
+import os  # Import os to read the settings from the environment
+import shutil  # Import shutil to find the tshark executable
+import subprocess  # Import subprocess for the synchronous tshark reader
+import sys  # Import sys to report malformed tshark lines on stderr
+import tempfile  # Import tempfile to collect the stderr of the synchronous tshark reader
+
+from packet_engine import PacketInfo, DEFAULT_ANALYZERS  # Importing the packet record and the analyzers of scripts A-G
+from instrumentation import stage  # Importing the opt-in stage timers
+
+
+# Pipeline settings (can be overridden from the environment)
+TSHARK_PATH = os.environ.get('TSHARK_PATH') or shutil.which('tshark') or 'tshark'
+TSHARK_PROCESSES = int(os.environ.get('PCAP_TSHARK_PROCESSES', os.cpu_count() or 1))  # tshark processes at a time
+QUEUE_SIZE = int(os.environ.get('PCAP_PIPELINE_QUEUE', 8))  # Batches waiting between two stages of a file
+BATCH_SIZE = 1024  # Packets handed from one stage to the next at a time
+TERMINATE_TIMEOUT = 5  # Seconds a tshark process gets to exit after being asked to stop, before it is killed
+
+# Fields printed by tshark for every packet, in the order of parse_fields_line
+# (-E occurrence=f keeps the first occurrence, the outer layer of a tunnel, as PyShark's packet.ip does)
+TSHARK_FIELDS = ['frame.time_epoch', 'frame.len', 'ip.src', 'ip.dst', 'ipv6.src', 'ipv6.dst',
+                 'tcp.srcport', 'tcp.dstport', 'udp.srcport', 'udp.dstport', 'tls.record.version']
+
+
+# Function to get the tshark command printing the fields of every packet of a capture, one tab-separated line each
+def tshark_command(pcap_file):
+    command = [TSHARK_PATH, '-r', pcap_file, '-n', '-T', 'fields', '-E', 'separator=/t', '-E', 'occurrence=f']
+    for field in TSHARK_FIELDS:
+        command += ['-e', field]
+    return command
+
+
+# Function to turn one line of tshark fields into a PacketInfo record (the same record as decode_pyshark_packet).
+# Raises ValueError on a line that does not have the expected fields.
+def parse_fields_line(line):
+    fields = line.rstrip(b'\r\n').decode(errors='replace').split('\t')
+    if len(fields) != len(TSHARK_FIELDS):
+        raise ValueError(f"expected {len(TSHARK_FIELDS)} tshark fields, got {len(fields)}")
+    (epoch, length, ip_src, ip_dst, ipv6_src, ipv6_dst,
+     tcp_src, tcp_dst, udp_src, udp_dst, tls_version) = fields
+    ip_version = 4 if ip_src else 6 if ipv6_src else None
+    if ip_version == 6:
+        ip_src, ip_dst = ipv6_src, ipv6_dst
+    transport = src_port = dst_port = None
+    if tcp_src:
+        transport, src_port, dst_port = 'TCP', int(tcp_src), int(tcp_dst)
+    elif udp_src:
+        transport, src_port, dst_port = 'UDP', int(udp_src), int(udp_dst)
+    return PacketInfo(round(float(epoch), 6), int(length), ip_version, ip_src or None, ip_dst or None,
+                      transport, src_port, dst_port, tls_version or None)  # Times rounded to microseconds like PyShark
+
+
+# Function to parse the lines of tshark fields of a capture, skipping the lines that cannot be parsed
+# (counted in skipped[0], so they can be reported once the capture is read)
+def parse_fields_lines(lines, skipped):
+    packets = []
+    for line in lines:
+        try:
+            packets.append(parse_fields_line(line))
+        except ValueError:
+            skipped[0] += 1
+    return packets
+
+
+# Function to report the tshark lines of a capture that could not be parsed
+def report_skipped(pcap_file, skipped):
+    if skipped[0]:
+        print(f"Skipped {skipped[0]:,} malformed tshark lines of {pcap_file}", file=sys.stderr)
+
+
+# Function to read a capture with tshark without PyShark and yield a PacketInfo record for every packet.
+# stderr goes to a temporary file, so tshark cannot block on a full stderr pipe while stdout is read.
+# The process is always stopped and reaped, even when the caller stops iterating early.
+def iter_tshark_packets(pcap_file):
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(tshark_command(pcap_file), stdout=subprocess.PIPE, stderr=errors)
+    skipped = [0]
+    try:
+        for line in process.stdout:
+            yield from parse_fields_lines([line], skipped)
+        if process.wait() != 0:
+            errors.seek(0)
+            raise RuntimeError(f"tshark failed on {pcap_file}: {errors.read().decode(errors='replace').strip()}")
+        report_skipped(pcap_file, skipped)
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(TERMINATE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        process.stdout.close()
+        errors.close()
+
+
+# Function to stop a tshark process that is still running and wait for it, so no zombie process is left
+async def reap(process):
+    if process.returncode is None:
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            pass  # It exited in the meantime
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+# Decode stage: run tshark on a capture and put batches of PacketInfo records into the queue, then None.
+# When the queue is full, the stage stops reading, the pipe fills up and tshark waits: that is the backpressure.
+# At most 'limiter' tshark processes run at the same time.
+async def decode_stage(pcap_file, queue, limiter):
+    async with limiter:
+        process = await asyncio.create_subprocess_exec(*tshark_command(pcap_file), stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        errors = asyncio.ensure_future(process.stderr.read())  # Read apart, so a full stderr pipe cannot block tshark
+        skipped = [0]
+        try:
+            lines = []
+            async for line in process.stdout:
+                lines.append(line)
+                if len(lines) >= BATCH_SIZE:
+                    await queue.put(parse_fields_lines(lines, skipped))
+                    lines = []
+            if lines:
+                await queue.put(parse_fields_lines(lines, skipped))
+            if await process.wait() != 0:
+                raise RuntimeError(f"tshark failed on {pcap_file}: {(await errors).decode(errors='replace').strip()}")
+            report_skipped(pcap_file, skipped)
+        finally:
+            errors.cancel()
+            await reap(process)
+    await queue.put(None)  # End of the capture
+
+
+# Analyze stage: feed every batch to the analyzers, then pass it on to the next stage (if any)
+async def analyze_stage(queue, analyzers, output_queue=None):
+    while True:
+        batch = await queue.get()
+        if batch is None:
+            break
+        with stage('analyze', 'pipeline', items=len(batch)):
+            for packet in batch:
+                for analyzer in analyzers:
+                    analyzer.process(packet)
+        if output_queue is not None:
+            await output_queue.put(batch)
+    if output_queue is not None:
+        await output_queue.put(None)
+
+
+# Function to write the IPv4 packets of a batch as traffic rows (run in a thread, so disk writes overlap the decoding)
+def write_batch(writer, batch):
+    for pkt in batch:
+        if pkt.ip_version == 4:  # Keep only IP packets, like pcapng_to_CSV_for_atkr
+            writer.write_row(pkt.timestamp, pkt.length, pkt.ip_src, pkt.ip_dst, pkt.src_port, pkt.dst_port)
+
+
+# Write stage: write every batch with a traffic table writer (the writer is closed by convert_captures)
+async def write_stage(queue, writer):
+    while True:
+        batch = await queue.get()
+        if batch is None:
+            break
+        await asyncio.to_thread(write_batch, writer, batch)
+
+
+# Function to run coroutines together; when one fails (or the pipeline is cancelled), the others are cancelled
+# and awaited, so their tshark processes are reaped before the error propagates
+async def run_stages(coroutines):
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        raise  # gather already cancelled every task (cancelling again would interrupt their cleanup)
+    except BaseException:
+        for task in tasks:
+            task.cancel()  # No effect on the tasks that already finished
+        raise
+    finally:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Function to run the pipeline of one capture: decode -> analyze (-> write). Returns the filled analyzers.
+async def run_capture(pcap_file, limiter, analyzer_classes, writer=None):
+    analyzers = [analyzer_class() for analyzer_class in analyzer_classes]
+    decoded = asyncio.Queue(QUEUE_SIZE)
+    stages = [decode_stage(pcap_file, decoded, limiter)]
+    if writer is None:
+        stages.append(analyze_stage(decoded, analyzers))
+    else:
+        analyzed = asyncio.Queue(QUEUE_SIZE)
+        stages += [analyze_stage(decoded, analyzers, analyzed), write_stage(analyzed, writer)]
+    await run_stages(stages)
+    return analyzers
+
+
+# Function to run the pipelines of several captures concurrently, with at most 'processes' tshark processes
+async def run_captures(pcap_files, analyzer_classes, writers=None, processes=None):
+    limiter = asyncio.Semaphore(processes or TSHARK_PROCESSES)
+    writers = writers or [None] * len(pcap_files)
+    return await run_stages([run_capture(pcap_file, limiter, analyzer_classes, writer)
+                             for pcap_file, writer in zip(pcap_files, writers)])
+
+
+# Function to analyze captures with tshark through the pipeline, returning one list of filled analyzers per file
+def analyze_captures(pcap_files, analyzer_classes=DEFAULT_ANALYZERS, processes=None):
+    return asyncio.run(run_captures(list(pcap_files), analyzer_classes, processes=processes))
+
+
+# Function to convert captures into traffic tables with tshark through the pipeline.
+# Returns the number of rows written to every output file.
+def convert_captures(pcap_files, output_files, output_format, processes=None):
+    from traffic_table import open_traffic_writer  # Importing the CSV/Parquet traffic table writers
+    writers = [open_traffic_writer(output_file, output_format) for output_file in output_files]
+    try:
+        asyncio.run(run_captures(list(pcap_files), [], writers, processes))
+    finally:
+        for writer in writers:
+            writer.close()  # Write the last batch, also when a pipeline failed or was cancelled
+    return [writer.row_count for writer in writers]
+